@@ -4,22 +4,46 @@ Stone WebApp Store - Balenciaga-style минимализм
 """
 
 import asyncio
-import aiohttp
-import aiohttp_jinja2
-import jinja2
 from aiohttp import web
 from pathlib import Path
-import sqlite3
-import json
 import os
 import logging
 from datetime import datetime
-from functools import wraps
-import uuid
 from dotenv import load_dotenv
 
-# Загрузка переменных окружения
-load_dotenv()
+from api.admin import ADMIN_TOKEN_KEY, api_admin_import, api_admin_profile
+from api.cart import api_cart, api_cart_add, api_cart_merge, api_cart_remove, api_cart_update
+from api.export import api_export_orders, api_export_products
+from api.orders import api_checkout, api_order, api_order_cancel, api_order_confirm
+from api.products import CATALOG_MAX_LIMIT, api_catalog, api_product, api_search
+from api.stream import api_stream
+from api.widgets import (
+    api_webapp_widget_create, api_webapp_widget_delete, api_webapp_widget_update, api_webapp_widgets, api_widgets
+)
+from core.apicache import API_CACHE_KEY, setup_api_cache
+from core.assets import ASSETS_KEY, setup_assets
+from core.catalog import CATALOG_KEY, encode_products, setup_catalog
+from core.carts import CARTS_KEY, setup_carts
+from core.changes import CHANGES_KEY, setup_changes
+from core.counters import VIEWS_KEY, setup_views
+from core.db import DB_KEY, connect, setup_db
+from core.details import setup_details
+from core.events import EVENTS_KEY, setup_events
+from core.facets import SORTS
+from core.http import bad_request, cached_response
+from core.images import serve_image_variant, setup_images
+from core.importer import import_file
+from core.metrics import metrics_handler, setup_metrics
+from core.migrations import apply_migrations, latest_version, schema_version
+from core.orders import ORDERS_KEY, setup_orders
+from core.pagecache import PAGE_CACHE_KEY, setup_page_cache
+from core.profiler import setup_profiler
+from core.search import setup_search
+from core.telegram import BOT_TOKEN_KEY
+from core.templates import TEMPLATES_KEY, setup_templates
+from core.seed import seed_demo_data
+from core.widgets import WIDGETS_KEY, setup_widgets
+from core.workers import serve
 
 # Настройка логгера
 logging.basicConfig(
@@ -30,26 +54,82 @@ logger = logging.getLogger(__name__)
 
 # Конфигурация
 BASE_DIR = Path(__file__).parent
-DB_PATH = os.path.join(BASE_DIR, 'data', 'shop.db')
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 STATIC_DIR = os.path.join(BASE_DIR, 'static')
-WEBAPP_DIR = os.path.join(BASE_DIR, 'webapp')
+WEBAPP_DIR = os.path.join(BASE_DIR, 'WebApp')
+
+CONFIG_KEY = web.AppKey('config', dict)
+# Логическое имя в манифесте статики; URL с отпечатком - ASSETS_KEY.url / asset_url
+PLACEHOLDER_IMAGE = 'static/images/placeholder.jpg'
+
+
+def load_config():
+    """Настройки магазина из переменных окружения (.env)"""
+    load_dotenv()
+    return {
+        'host': os.getenv('STORE_HOST', '0.0.0.0'),
+        'port': int(os.getenv('STORE_PORT', 8000)),
+        'workers': int(os.getenv('STORE_WORKERS', 1)),
+        'shutdown_timeout': float(os.getenv('STORE_SHUTDOWN_TIMEOUT', 30)),
+        'db_path': os.getenv('DB_PATH', os.path.join(BASE_DIR, 'data', 'shop.db')),
+        'db_pool_size': int(os.getenv('DB_POOL_SIZE', 4)),
+        'auto_migrate': os.getenv('AUTO_MIGRATE', '1') == '1',
+        'image_cache_dir': os.getenv('IMAGE_CACHE_DIR', os.path.join(BASE_DIR, 'data', 'img_cache')),
+        'image_cache_mb': int(os.getenv('IMAGE_CACHE_MB', 256)),
+        'image_workers': int(os.getenv('IMAGE_WORKERS', 2)),
+        'views_flush_interval': float(os.getenv('VIEWS_FLUSH_INTERVAL', 5)),
+        'views_flush_events': int(os.getenv('VIEWS_FLUSH_EVENTS', 1000)),
+        'cart_ttl_days': float(os.getenv('CART_TTL_DAYS', 30)),
+        'cart_snapshot_interval': float(os.getenv('CART_SNAPSHOT_INTERVAL', 10)),
+        'order_reservation_minutes': float(os.getenv('ORDER_RESERVATION_MINUTES', 15)),
+        'order_batch_size': int(os.getenv('ORDER_BATCH_SIZE', 256)),
+        'telegram_bot_token': os.getenv('TELEGRAM_BOT_TOKEN', ''),
+        'admin_token': os.getenv('ADMIN_TOKEN', ''),
+        'slow_query_ms': float(os.getenv('SLOW_QUERY_MS', 100)),
+        'template_mode': os.getenv('TEMPLATE_MODE', 'development'),
+        'template_cache_dir': os.getenv('TEMPLATE_CACHE_DIR', os.path.join(BASE_DIR, 'data', 'template_cache')),
+        'stream_queue_size': int(os.getenv('STREAM_QUEUE_SIZE', 64)),
+        'stream_heartbeat': float(os.getenv('STREAM_HEARTBEAT', 15)),
+        'stream_max_clients': int(os.getenv('STREAM_MAX_CLIENTS', 10000)),
+        'templates_dir': TEMPLATES_DIR,
+        'static_dir': STATIC_DIR,
+        'webapp_dir': WEBAPP_DIR,
+    }
+
+
+# ============== ПОДГОТОВКА ФАЙЛОВ ==============
+
+# Увеличивается, когда меняется набор создаваемых файлов и папок
+PROVISION_VERSION = '1'
+
+PLACEHOLDER_JPEG = "/9j/4AAQSkZJRgABAQEAYABgAAD/2wBDAAgGBgcGBQgHBwcJCQgKDBQNDAsLDBkSEw8UHRofHh0aHBwgJC4nICIsIxwcKDcpLDAxNDQ0Hyc5PTgyPC4zNDL/2wBDAQkJCQwLDBgNDRgyIRwhMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjL/wAARCAABAAEDASIAAhEBAxEB/8QAFQABAQAAAAAAAAAAAAAAAAAAAAv/xAAUEAEAAAAAAAAAAAAAAAAAAAAA/8QAFQEBAQAAAAAAAAAAAAAAAAAAAAX/xAAUEQEAAAAAAAAAAAAAAAAAAAAA/9oADAMBAAIRAxEAPwCdABmX/9k="
+
+FALLBACK_DESIGN = """
+        <!DOCTYPE html>
+        <html>
+        <head><title>STONE</title></head>
+        <body>
+            <h1>STONE Design Page</h1>
+            <p>Шаблон загружен успешно!</p>
+        </body>
+        </html>
+        """
+
+_provisioned = set()
 
 
-# Создаем необходимые директории
-def create_directories():
+def create_directories(config):
     """Создает необходимые директории если их нет"""
     directories = [
-        TEMPLATES_DIR,
-        STATIC_DIR,
-        WEBAPP_DIR,
-        os.path.join(WEBAPP_DIR, 'css'),
-        os.path.join(WEBAPP_DIR, 'js'),
-        os.path.join(WEBAPP_DIR, 'components'),
-        os.path.join(WEBAPP_DIR, 'images'),
-        os.path.dirname(DB_PATH),  # папка data
-        os.path.join(BASE_DIR, 'api'),
-        os.path.join(STATIC_DIR, 'images'),  # Убедимся что папка images существует
+        config['templates_dir'],
+        config['static_dir'],
+        config['webapp_dir'],
+        os.path.join(config['webapp_dir'], 'css'),
+        os.path.join(config['webapp_dir'], 'js'),
+        os.path.join(config['webapp_dir'], 'components'),
+        os.path.join(config['webapp_dir'], 'images'),
+        os.path.dirname(config['db_path']),  # папка data
+        os.path.join(config['static_dir'], 'images'),  # Убедимся что папка images существует
     ]
 
     for directory in directories:
@@ -57,274 +137,195 @@ def create_directories():
         logger.info(f"📁 Папка проверена/создана: {directory}")
 
 
-# Создаем директории перед запуском
-create_directories()
+def provision(config):
+    """
+    Однократная подготовка файлов: папки, placeholder, запасной design.html.
 
-# Убедимся что placeholder изображение существует
-placeholder_path = os.path.join(STATIC_DIR, 'images', 'placeholder.jpg')
-if not os.path.exists(placeholder_path):
-    # Создаем простой placeholder
-    import base64
+    После успешной подготовки рядом с БД пишется маркер, и последующие
+    запуски (воркеры, тесты) ограничиваются проверкой его наличия.
+    """
+    marker = os.path.join(os.path.dirname(config['db_path']), '.provisioned')
+    if marker in _provisioned:
+        return
+    try:
+        with open(marker, encoding='utf-8') as f:
+            if f.read().strip() == PROVISION_VERSION:
+                _provisioned.add(marker)
+                return
+    except FileNotFoundError:
+        pass
 
-    placeholder_base64 = "/9j/4AAQSkZJRgABAQEAYABgAAD/2wBDAAgGBgcGBQgHBwcJCQgKDBQNDAsLDBkSEw8UHRofHh0aHBwgJC4nICIsIxwcKDcpLDAxNDQ0Hyc5PTgyPC4zNDL/2wBDAQkJCQwLDBgNDRgyIRwhMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjIyMjL/wAARCAABAAEDASIAAhEBAxEB/8QAFQABAQAAAAAAAAAAAAAAAAAAAAv/xAAUEAEAAAAAAAAAAAAAAAAAAAAA/8QAFQEBAQAAAAAAAAAAAAAAAAAAAAX/xAAUEQEAAAAAAAAAAAAAAAAAAAAA/9oADAMBAAIRAxEAPwCdABmX/9k="
-    image_data = base64.b64decode(placeholder_base64)
-    with open(placeholder_path, 'wb') as f:
-        f.write(image_data)
-    logger.info(f"✅ Создан placeholder: {placeholder_path}")
+    create_directories(config)
 
-# Убедимся что templates существует
-if not os.path.exists(TEMPLATES_DIR):
-    os.makedirs(TEMPLATES_DIR, exist_ok=True)
-    logger.info(f"Создана папка templates: {TEMPLATES_DIR}")
+    # Убедимся что placeholder изображение существует
+    placeholder_path = os.path.join(config['static_dir'], 'images', 'placeholder.jpg')
+    if not os.path.exists(placeholder_path):
+        import base64
 
-# Создаем базовый design.html если его нет
-design_template_path = os.path.join(TEMPLATES_DIR, 'design.html')
-if not os.path.exists(design_template_path):
-    with open(design_template_path, 'w', encoding='utf-8') as f:
-        f.write("""
-        <!DOCTYPE html>
-        <html>
-        <head><title>STONE</title></head>
-        <body>
-            <h1>STONE Design Page</h1>
-            <p>Шаблон загружен успешно!</p>
-        </body>
-        </html>
-        """)
-    logger.info(f"Создан базовый шаблон: {design_template_path}")
+        with open(placeholder_path, 'wb') as f:
+            f.write(base64.b64decode(PLACEHOLDER_JPEG))
+        logger.info(f"✅ Создан placeholder: {placeholder_path}")
 
-# Создаем приложение
-app = web.Application(client_max_size=20 * 1024 * 1024)
+    # Создаем базовый design.html если его нет
+    design_template_path = os.path.join(config['templates_dir'], 'design.html')
+    if not os.path.exists(design_template_path):
+        with open(design_template_path, 'w', encoding='utf-8') as f:
+            f.write(FALLBACK_DESIGN)
+        logger.info(f"Создан базовый шаблон: {design_template_path}")
 
-# Настройка Jinja2
-env = aiohttp_jinja2.setup(
-    app,
-    loader=jinja2.FileSystemLoader(TEMPLATES_DIR)
-)
+    with open(marker, 'w', encoding='utf-8') as f:
+        f.write(PROVISION_VERSION)
+    _provisioned.add(marker)
 
 
 # ============== БАЗА ДАННЫХ ==============
 
-def get_db_connection():
-    """Создает соединение с БД"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
-def init_store_db():
-    """Инициализация БД для магазина"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
+def migrate(db_path, seed=True):
+    """Явный шаг миграции: схема по версиям и демо-данные для пустых таблиц"""
+    conn = connect(db_path)
     try:
-        # Таблица веб-виджетов
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS web_widgets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                widget_type VARCHAR(50) NOT NULL,
-                title VARCHAR(255),
-                content TEXT,
-                config TEXT,
-                is_active BOOLEAN DEFAULT TRUE,
-                position INTEGER DEFAULT 0,
-                sort_order INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Таблица категорий
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name VARCHAR(100) NOT NULL,
-                slug VARCHAR(100) UNIQUE,
-                parent_id INTEGER DEFAULT NULL,
-                sort_order INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Таблица товаров
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name VARCHAR(255) NOT NULL,
-                slug VARCHAR(255) UNIQUE,
-                description TEXT,
-                price DECIMAL(10, 2) NOT NULL,
-                compare_at_price DECIMAL(10, 2),
-                image_url TEXT,
-                gallery TEXT,  -- JSON array of images
-                category_id INTEGER,
-                brand VARCHAR(100),
-                sku VARCHAR(100),
-                color VARCHAR(50),
-                size VARCHAR(50),
-                material VARCHAR(100),
-                discount_percent INTEGER DEFAULT 0,
-                quantity INTEGER DEFAULT 0,
-                is_featured BOOLEAN DEFAULT FALSE,
-                is_active BOOLEAN DEFAULT TRUE,
-                views INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (category_id) REFERENCES categories (id)
-            )
-        """)
-
-        # Таблица карусели
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS carousel_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title VARCHAR(255),
-                subtitle VARCHAR(255),
-                image_url TEXT NOT NULL,
-                link_url VARCHAR(500),
-                button_text VARCHAR(100),
-                is_active BOOLEAN DEFAULT TRUE,
-                sort_order INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Добавляем тестовые виджеты если таблица пуста
-        cursor.execute("SELECT COUNT(*) FROM web_widgets")
-        if cursor.fetchone()[0] == 0:
-            test_widgets = [
-                ('marquee', None, 'STONE | PREMIUM SNEAKERS | BETWEEN 11/20/2025 AND 12/15/2025 MAY BE RETURNED',
-                 '{"speed": 30, "color": "#000000", "bgColor": "#ffffff"}', 1, 0),
-                ('hero', 'STONE', 'between 11/20/2025 and 12/15/2025 may be returned', '{}', 2, 0),
-                ('info', 'INFORMATION #LINDON', 'money model options, four, savings', '{}', 3, 0),
-                ('collection', 'New Collection',
-                 'Explore our carefully curated selection of premium sneakers. Each pair is designed with meticulous attention to detail and crafted from the finest materials.',
-                 '{"buttonText": "VIEW COLLECTION"}', 4, 0)
-            ]
-
-            cursor.executemany("""
-                INSERT INTO web_widgets (widget_type, title, content, config, position, sort_order)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, test_widgets)
-            logger.info("✅ Добавлены тестовые виджеты")
-
-        # Добавляем тестовые категории
-        cursor.execute("SELECT COUNT(*) FROM categories")
-        if cursor.fetchone()[0] == 0:
-            categories = [
-                ('Sneakers', 'sneakers', None),
-                ('Boots', 'boots', None),
-                ('Sandals', 'sandals', None),
-                ('Accessories', 'accessories', None)
-            ]
-
-            cursor.executemany("""
-                INSERT INTO categories (name, slug, parent_id)
-                VALUES (?, ?, ?)
-            """, categories)
-            logger.info("✅ Добавлены тестовые категории")
-
-        # Добавляем тестовые товары
-        cursor.execute("SELECT COUNT(*) FROM products")
-        if cursor.fetchone()[0] == 0:
-            products = [
-                ('KPOCCOBKM', 'kpoccobkm-1', 'Premium sneakers with unique design', 120.00, 150.00,
-                 '/static/images/placeholder.jpg', '["/static/images/placeholder.jpg"]', 1, 'STONE', 'STN-001', 'Black',
-                 '42', 'Leather', 20, 10, True),
-                ('KPOCCOBKM Pro', 'kpoccobkm-pro', 'Advanced version with better materials', 140.00, 180.00,
-                 '/static/images/placeholder.jpg', '["/static/images/placeholder.jpg"]', 1, 'STONE', 'STN-002', 'White',
-                 '40-45', 'Suede', 22, 8, True),
-                ('KPOCCOBKM Lite', 'kpoccobkm-lite', 'Lightweight version for everyday wear', 130.00, None,
-                 '/static/images/placeholder.jpg', '["/static/images/placeholder.jpg"]', 1, 'STONE', 'STN-003', 'Gray',
-                 '39-44', 'Mesh', 0, 15, True),
-                ('KPOCCOBKM Ultra', 'kpoccobkm-ultra', 'Ultimate performance sneakers', 150.00, 200.00,
-                 '/static/images/placeholder.jpg', '["/static/images/placeholder.jpg"]', 1, 'STONE', 'STN-004',
-                 'Black/White', '41-43', 'Leather/Mesh', 25, 5, True)
-            ]
-
-            cursor.executemany("""
-                INSERT INTO products (name, slug, description, price, compare_at_price, image_url, gallery, category_id, brand, sku, color, size, material, discount_percent, quantity, is_featured)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, products)
-            logger.info("✅ Добавлены тестовые товары")
-
-        # Добавляем карусель
-        cursor.execute("SELECT COUNT(*) FROM carousel_items")
-        if cursor.fetchone()[0] == 0:
-            carousel_items = [
-                ('New Collection 2024', 'Discover the latest designs', '/static/images/placeholder.jpg', '/catalog',
-                 'SHOP NOW'),
-                ('Limited Edition', 'Exclusive items available', '/static/images/placeholder.jpg',
-                 '/catalog?filter=limited', 'VIEW'),
-                ('Summer Sale', 'Up to 50% off selected items', '/static/images/placeholder.jpg',
-                 '/catalog?filter=sale', 'SHOP SALE')
-            ]
-
-            cursor.executemany("""
-                INSERT INTO carousel_items (title, subtitle, image_url, link_url, button_text)
-                VALUES (?, ?, ?, ?, ?)
-            """, carousel_items)
-            logger.info("✅ Добавлены карусельные элементы")
-
-        conn.commit()
-        logger.info("✅ База данных магазина инициализирована")
-
+        version = apply_migrations(conn)
+        if seed:
+            seed_demo_data(conn)
+            conn.commit()
+        logger.info(f"✅ База данных магазина инициализирована (схема v{version})")
     except Exception as e:
         logger.error(f"❌ Ошибка инициализации БД: {e}")
         conn.rollback()
+        raise
     finally:
         conn.close()
 
 
-# ============== ВИДЖЕТЫ ==============
-
-async def get_web_widgets():
-    """Получает активные виджеты для магазина"""
+def check_schema(db_path, auto_migrate=True):
+    """При старте: одна проверка PRAGMA user_version, миграции - только если схема отстала"""
+    conn = connect(db_path)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT widget_type, title, content, config, position
-            FROM web_widgets 
-            WHERE is_active = TRUE 
-            ORDER BY position, sort_order
-        """)
-
-        widgets = []
-        for row in cursor.fetchall():
-            widget = dict(row)
-            if widget.get('config'):
-                try:
-                    widget['config'] = json.loads(widget['config'])
-                except:
-                    widget['config'] = {}
-            widgets.append(widget)
-
-        return widgets
-    except Exception as e:
-        logger.error(f"Ошибка получения виджетов: {e}")
-        return []
+        if schema_version(conn) >= latest_version():
+            return
+        if not auto_migrate:
+            raise RuntimeError("Схема БД устарела - выполните: python StoneWeb.py migrate")
+        apply_migrations(conn)
     finally:
         conn.close()
 
 
+# ============== ПРИЛОЖЕНИЕ ==============
+
+def create_app(config=None):
+    """Собирает приложение; config дополняет настройки из окружения"""
+    config = {**load_config(), **(config or {})}
+    provision(config)
+
+    app = web.Application(client_max_size=20 * 1024 * 1024)
+    app[CONFIG_KEY] = config
+    app[BOT_TOKEN_KEY] = config['telegram_bot_token']
+    app[ADMIN_TOKEN_KEY] = config['admin_token']
+
+    # Jinja2: асинхронный рендер; в production - байткод на диске и компиляция при старте
+    env = setup_templates(
+        app,
+        config['templates_dir'],
+        mode=config['template_mode'],
+        cache_dir=config['template_cache_dir']
+    )
+
+    # Схема проверяется до открытия пула и загрузки каталога
+    async def ensure_schema(app):
+        await asyncio.to_thread(check_schema, config['db_path'], config['auto_migrate'])
+
+    app.on_startup.append(ensure_schema)
+
+    # Пул соединений с БД (открывается при старте приложения)
+    setup_db(app, config['db_path'], pool_size=config['db_pool_size'])
+
+    # Метрики Prometheus: задержки маршрутов и время запросов к БД
+    setup_metrics(app, slow_query_ms=config['slow_query_ms'])
+
+    # Профилирование по запросу (/api/admin/profile)
+    setup_profiler(app)
+
+    # Наблюдатель изменений и каталог в памяти
+    setup_changes(app)
+    setup_catalog(app)
+    setup_search(app)
+    setup_details(app)
+
+    # Просмотры товаров: счетчик в памяти, запись в БД пакетами
+    setup_views(
+        app,
+        interval=config['views_flush_interval'],
+        max_pending=config['views_flush_events']
+    )
+
+    # Корзины: в памяти, снимки в БД пакетами; при нескольких воркерах - запись сразу
+    setup_carts(
+        app,
+        ttl=config['cart_ttl_days'] * 24 * 3600,
+        snapshot_interval=config['cart_snapshot_interval'],
+        write_through=config['workers'] > 1
+    )
+
+    # Заказы: единственный писатель с пакетной фиксацией
+    setup_orders(
+        app,
+        reservation_ttl=config['order_reservation_minutes'] * 60,
+        max_batch=config['order_batch_size']
+    )
+
+    # Виджеты: проверенная конфигурация и заранее отрендеренные фрагменты
+    setup_widgets(app)
+
+    # Рассылка изменений каталога и виджетов открытым WebApp (/api/stream)
+    setup_events(
+        app,
+        queue_size=config['stream_queue_size'],
+        heartbeat=config['stream_heartbeat'],
+        max_clients=config['stream_max_clients']
+    )
+
+    # Кэш отрендеренных страниц
+    setup_page_cache(app)
+    setup_api_cache(app)
+
+    # Манифест статики с отпечатками и хелпер asset_url для шаблонов
+    setup_assets(
+        app,
+        {'static': config['static_dir'], 'webapp': config['webapp_dir']},
+        placeholder=PLACEHOLDER_IMAGE,
+        jinja_env=env
+    )
+
+    # Уменьшенные варианты изображений (/img/<w>x<h>/...); IMAGE_CACHE_MB делится между воркерами
+    setup_images(
+        app,
+        config['image_cache_dir'],
+        max_bytes=config['image_cache_mb'] * 1024 * 1024 // config['workers'],
+        workers=config['image_workers'],
+        per_process=config['workers'] > 1,
+        jinja_env=env
+    )
+
+    setup_routes(app)
+    return app
+
+
 # ============== СТАТИЧЕСКИЕ ФАЙЛЫ ==============
 
 async def serve_static(request):
     """Отдает статические файлы из webapp"""
-    filename = request.match_info.get('filename', 'index.html')
-    file_path = os.path.join(WEBAPP_DIR, filename)
+    filename = request.match_info.get('filename') or 'index.html'
+    manifest = request.app[ASSETS_KEY]
 
-    # Проверяем существование файла
-    if not os.path.exists(file_path):
+    # Файлы ищутся в манифесте, собранном при старте
+    found = manifest.resolve('webapp', filename)
+    if found is None and filename.endswith('.html'):
         # Если файл не найден, пробуем index.html
-        if filename.endswith('.html'):
-            file_path = os.path.join(WEBAPP_DIR, 'index.html')
-        else:
-            raise web.HTTPNotFound()
+        found = manifest.resolve('webapp', 'index.html')
+    if found is None:
+        raise web.HTTPNotFound()
 
-    return web.FileResponse(file_path)
+    return manifest.respond(request, *found)
 
 
 # ============== API ЭНДПОИНТЫ ==============
@@ -332,75 +333,66 @@ async def serve_static(request):
 async def api_products(request):
     """API для получения товаров"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        catalog = request.app[CATALOG_KEY]
+        if not catalog.loaded:
+            await catalog.reload()
 
         # Получаем параметры запроса
-        limit = int(request.query.get('limit', 12))
-        offset = int(request.query.get('offset', 0))
+        try:
+            limit = min(CATALOG_MAX_LIMIT, max(1, int(request.query.get('limit', 12))))
+            offset = max(0, int(request.query.get('offset', 0)))
+        except ValueError:
+            return bad_request()
         category = request.query.get('category')
         featured = request.query.get('featured')
+        featured = bool(featured and featured.lower() == 'true')
+        after = request.query.get('after')
+        # sort=popular и другие порядки /api/catalog; без sort - выдача по умолчанию с курсорами
+        sort = request.query.get('sort')
+        if sort not in SORTS:
+            sort = None
+
+        async def build():
+            # Товары отдаются из памяти с уже посчитанными полями
+            if sort is not None:
+                products = await catalog.query_sorted(
+                    sort,
+                    category=category,
+                    featured=featured,
+                    limit=limit,
+                    offset=offset
+                )
+                next_cursor = None
+            else:
+                products, next_cursor = catalog.query(
+                    category=category,
+                    featured=featured,
+                    limit=limit,
+                    offset=offset,
+                    after=after
+                )
+            return {
+                'success': True,
+                'products': encode_products(products),
+                'total': len(products),
+                'limit': limit,
+                'offset': offset,
+                'next_cursor': next_cursor
+            }
+
+        key = (
+            'products', catalog.version, catalog.views_version if sort == 'popular' else 0,
+            category, featured, limit, offset, after, sort
+        )
+        try:
+            cached = await request.app[API_CACHE_KEY].get(key, build)
+        except ValueError as e:
+            return web.json_response({
+                'success': False,
+                'error': str(e)
+            }, status=400)
 
-        # Базовый запрос
-        query = """
-            SELECT p.id, p.name, p.slug, p.description, p.price, p.compare_at_price, 
-                   p.image_url, p.gallery, p.brand, p.discount_percent, p.quantity,
-                   p.color, p.size, p.material, p.is_featured,
-                   c.name as category_name
-            FROM products p
-            LEFT JOIN categories c ON p.category_id = c.id
-            WHERE p.is_active = TRUE AND p.quantity > 0
-        """
-
-        params = []
-
-        if category:
-            query += " AND c.slug = ?"
-            params.append(category)
-
-        if featured and featured.lower() == 'true':
-            query += " AND p.is_featured = TRUE"
-
-        query += " ORDER BY p.is_featured DESC, p.created_at DESC LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
-
-        cursor.execute(query, params)
-
-        products = []
-        for row in cursor.fetchall():
-            product = dict(row)
-
-            # Обработка изображений - используем placeholder если нет изображения
-            if not product.get('image_url') or product['image_url'] == 'None':
-                product['image_url'] = '/static/images/placeholder.jpg'
-
-            # Основное изображение
-            product['main_image'] = product.get('image_url', '/static/images/placeholder.jpg')
-
-            # Форматируем цены
-            price = float(product.get('price', 0))
-            product['price_formatted'] = f"${price:.0f}"
-
-            if product.get('compare_at_price'):
-                compare_price = float(product['compare_at_price'])
-                product['compare_price_formatted'] = f"${compare_price:.0f}"
-
-                # Рассчитываем скидку
-                if compare_price > price:
-                    discount = ((compare_price - price) / compare_price) * 100
-                    product['discount_percent'] = int(discount)
-
-            products.append(product)
-
-        conn.close()
-
-        return web.json_response({
-            'success': True,
-            'products': products,
-            'total': len(products),
-            'limit': limit,
-            'offset': offset
-        })
+        return cached_response(request, cached)
 
     except Exception as e:
         logger.error(f"Ошибка API товаров: {e}")
@@ -410,45 +402,54 @@ async def api_products(request):
         }, status=500)
 
 
-async def api_widgets(request):
-    """API для получения виджетов"""
-    try:
-        widgets = await get_web_widgets()
-        return web.json_response({
-            'success': True,
-            'widgets': widgets
-        })
-    except Exception as e:
-        logger.error(f"Ошибка API виджетов: {e}")
-        return web.json_response({
-            'success': False,
-            'error': str(e)
-        })
-
-
 async def api_categories(request):
-    """API для получения категорий"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    """
+    API для получения категорий (дерево в порядке обхода).
 
-        cursor.execute("""
-            SELECT id, name, slug, parent_id 
-            FROM categories 
-            ORDER BY sort_order, name
-        """)
-
-        categories = []
-        for row in cursor.fetchall():
-            category = dict(row)
-            categories.append(category)
-
-        conn.close()
+    ?category=slug - только эта категория с подкатегориями. У каждой
+    категории - глубина, хлебные крошки и число товаров с учетом подкатегорий.
+    """
+    try:
+        catalog = request.app[CATALOG_KEY]
+        if not catalog.loaded:
+            await catalog.reload()
+        category = request.query.get('category')
 
-        return web.json_response({
-            'success': True,
-            'categories': categories
-        })
+        async def build():
+            tree = catalog.tree
+            if category:
+                top = tree.get(category)
+                if top is None:
+                    raise ValueError('Категория не найдена')
+                nodes = tree.order[top.enter:top.leave]
+            else:
+                nodes = tree.order
+            return {
+                'success': True,
+                'categories': [
+                    {
+                        'id': node.id,
+                        'name': node.name,
+                        'slug': node.slug,
+                        'parent_id': node.parent_id,
+                        'depth': node.depth,
+                        'breadcrumbs': tree.breadcrumbs(node.slug),
+                        'product_count': catalog.count(node.slug)
+                    }
+                    for node in nodes
+                ]
+            }
+
+        # Версия каталога меняется и при изменении категорий
+        key = ('categories', catalog.version, category)
+        try:
+            cached = await request.app[API_CACHE_KEY].get(key, build)
+        except ValueError as e:
+            return web.json_response({
+                'success': False,
+                'error': str(e)
+            }, status=404)
+        return cached_response(request, cached)
 
     except Exception as e:
         logger.error(f"Ошибка API категорий: {e}")
@@ -461,31 +462,30 @@ async def api_categories(request):
 async def api_carousel(request):
     """API для получения карусели"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT title, subtitle, image_url, link_url, button_text
-            FROM carousel_items 
-            WHERE is_active = TRUE 
-            ORDER BY sort_order
-            LIMIT 5
-        """)
-
-        items = []
-        for row in cursor.fetchall():
-            item = dict(row)
-            # Используем placeholder если нет изображения
-            if not item.get('image_url') or item['image_url'] == 'None':
-                item['image_url'] = '/static/images/placeholder.jpg'
-            items.append(item)
-
-        conn.close()
-
-        return web.json_response({
-            'success': True,
-            'items': items
-        })
+        async def build():
+            rows = await request.app[DB_KEY].fetch_all("""
+                SELECT title, subtitle, image_url, link_url, button_text
+                FROM carousel_items 
+                WHERE is_active = TRUE 
+                ORDER BY sort_order
+                LIMIT 5
+            """)
+
+            items = []
+            for item in rows:
+                # Используем placeholder если нет изображения
+                if not item.get('image_url') or item['image_url'] == 'None':
+                    item['image_url'] = request.app[ASSETS_KEY].url(PLACEHOLDER_IMAGE)
+                items.append(item)
+
+            return {
+                'success': True,
+                'items': items
+            }
+
+        key = ('carousel', request.app[CHANGES_KEY].version('carousel_items'))
+        cached = await request.app[API_CACHE_KEY].get(key, build)
+        return cached_response(request, cached)
 
     except Exception as e:
         logger.error(f"Ошибка API карусели: {e}")
@@ -497,72 +497,65 @@ async def api_carousel(request):
 
 # ============== ГЛАВНАЯ СТРАНИЦА ==============
 
+async def render_home_page(request):
+    """Рендерит главную страницу в строку"""
+    # Получаем данные для страницы
+    db = request.app[DB_KEY]
+
+    # Виджеты - проверенные, с готовыми HTML-фрагментами (widget.html)
+    registry = request.app[WIDGETS_KEY]
+    await registry.ensure_loaded()
+    widgets = registry.active
+
+    # Популярные товары
+    rows = await db.fetch_all("""
+        SELECT id, name, price, image_url, discount_percent, brand
+        FROM products 
+        WHERE is_active = TRUE AND quantity > 0
+        ORDER BY is_featured DESC, created_at DESC
+        LIMIT 4
+    """)
+    placeholder = request.app[ASSETS_KEY].url(PLACEHOLDER_IMAGE)
+    featured_products = []
+    for product in rows:
+        # Используем placeholder если нет изображения
+        if not product.get('image_url') or product['image_url'] == 'None':
+            product['image_url'] = placeholder
+        featured_products.append(product)
+
+    # Карусель
+    rows = await db.fetch_all("""
+        SELECT title, subtitle, image_url, link_url, button_text
+        FROM carousel_items 
+        WHERE is_active = TRUE 
+        ORDER BY sort_order
+        LIMIT 3
+    """)
+    carousel_items = []
+    for item in rows:
+        if not item.get('image_url') or item['image_url'] == 'None':
+            item['image_url'] = placeholder
+        carousel_items.append(item)
+
+    context = {
+        'widgets': widgets,
+        'featured_products': featured_products,
+        'carousel_items': carousel_items,
+        'current_year': datetime.now().year,
+        'range': range  # добавляем функцию range в контекст
+    }
+
+    return await request.app[TEMPLATES_KEY].render('design.html', context)
+
+
 async def home_page(request):
     """Главная страница магазина с дизайном Balenciaga"""
     try:
-        # Получаем данные для страницы
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Виджеты
-        cursor.execute("""
-            SELECT widget_type, title, content, config
-            FROM web_widgets 
-            WHERE is_active = TRUE 
-            ORDER BY position, sort_order
-        """)
-        widgets = [dict(row) for row in cursor.fetchall()]
-
-        # Популярные товары
-        cursor.execute("""
-            SELECT id, name, price, image_url, discount_percent, brand
-            FROM products 
-            WHERE is_active = TRUE AND quantity > 0
-            ORDER BY is_featured DESC, created_at DESC
-            LIMIT 4
-        """)
-        featured_products = []
-        for row in cursor.fetchall():
-            product = dict(row)
-            # Используем placeholder если нет изображения
-            if not product.get('image_url') or product['image_url'] == 'None':
-                product['image_url'] = '/static/images/placeholder.jpg'
-            featured_products.append(product)
-
-        # Карусель
-        cursor.execute("""
-            SELECT title, subtitle, image_url, link_url, button_text
-            FROM carousel_items 
-            WHERE is_active = TRUE 
-            ORDER BY sort_order
-            LIMIT 3
-        """)
-        carousel_items = []
-        for row in cursor.fetchall():
-            item = dict(row)
-            if not item.get('image_url') or item['image_url'] == 'None':
-                item['image_url'] = '/static/images/placeholder.jpg'
-            carousel_items.append(item)
-
-        conn.close()
-
-        # Подготавливаем данные
-        for widget in widgets:
-            if widget.get('config'):
-                try:
-                    widget['config'] = json.loads(widget['config'])
-                except:
-                    widget['config'] = {}
-
-        context = {
-            'widgets': widgets,
-            'featured_products': featured_products,
-            'carousel_items': carousel_items,
-            'current_year': datetime.now().year,
-            'range': range  # добавляем функцию range в контекст
-        }
-
-        return aiohttp_jinja2.render_template('design.html', request, context)
+        # Страница меняется только вместе с виджетами, товарами и каруселью
+        cache = request.app[PAGE_CACHE_KEY]
+        key = cache.key('design.html', datetime.now().year)
+        page = await cache.get(key, lambda: render_home_page(request))
+        return cached_response(request, page)
 
     except Exception as e:
         logger.error(f"Ошибка рендеринга главной страницы: {e}")
@@ -588,6 +581,10 @@ async def catalog_page(request):
 
 async def product_page(request):
     """Страница товара"""
+    product_id = request.match_info['id']
+    if product_id.isdigit():
+        # Просмотр учитывается в памяти и попадет в БД пакетом
+        request.app[VIEWS_KEY].hit(int(product_id))
     return await serve_static(request)
 
 
@@ -609,31 +606,21 @@ async def design_page(request):
 # ============== СТАТИЧЕСКИЕ ФАЙЛЫ С ОБРАБОТКОЙ ОШИБОК ==============
 
 async def serve_static_file(request):
-    """Отдает статические файлы с обработкой ошибок"""
-    try:
-        # Получаем путь к файлу
-        path = request.match_info.get('path', '')
-        file_path = os.path.join(STATIC_DIR, path)
-
-        # Проверяем существование файла
-        if not os.path.exists(file_path) or not os.path.isfile(file_path):
-            # Если это изображение, возвращаем placeholder
-            if path.endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                file_path = os.path.join(STATIC_DIR, 'images', 'placeholder.jpg')
-                if not os.path.exists(file_path):
-                    raise web.HTTPNotFound()
-            else:
-                raise web.HTTPNotFound()
+    """Отдает статические файлы (по логическому имени или URL с отпечатком)"""
+    path = request.match_info.get('path', '')
+    manifest = request.app[ASSETS_KEY]
 
-        return web.FileResponse(file_path)
-    except Exception as e:
-        logger.error(f"Ошибка отдачи статического файла: {e}")
+    # Отсутствующие изображения заменяются placeholder внутри resolve
+    found = manifest.resolve('static', path)
+    if found is None:
         raise web.HTTPNotFound()
 
+    return manifest.respond(request, *found)
+
 
 # ============== РЕГИСТРАЦИЯ РОУТОВ ==============
 
-def setup_routes():
+def setup_routes(app):
     # Главная страница (новый дизайн)
     app.router.add_get('/', home_page)
 
@@ -647,43 +634,106 @@ def setup_routes():
     app.router.add_get('/checkout', checkout_page)
 
     # Статические файлы из webapp
-    app.router.add_get('/webapp/{filename}', serve_static)
+    app.router.add_get('/webapp/{filename:.*}', serve_static)
     app.router.add_get('/webapp/', serve_static)
 
     # API эндпоинты
     app.router.add_get('/api/products', api_products)
     app.router.add_get('/api/widgets', api_widgets)
+    app.router.add_get('/api/stream', api_stream)
+    app.router.add_get('/api/webapp/widgets', api_webapp_widgets)
+    app.router.add_post('/api/webapp/widgets', api_webapp_widget_create)
+    app.router.add_put('/api/webapp/widgets/{widget_id}', api_webapp_widget_update)
+    app.router.add_delete('/api/webapp/widgets/{widget_id}', api_webapp_widget_delete)
     app.router.add_get('/api/categories', api_categories)
     app.router.add_get('/api/carousel', api_carousel)
+    app.router.add_get('/api/catalog', api_catalog)
+    app.router.add_get('/api/search', api_search)
+    app.router.add_get('/api/product/{id}', api_product)
+
+    # Корзина
+    app.router.add_get('/api/cart', api_cart)
+    app.router.add_post('/api/cart/items', api_cart_add)
+    app.router.add_patch('/api/cart/items/{product_id}', api_cart_update)
+    app.router.add_delete('/api/cart/items/{product_id}', api_cart_remove)
+    app.router.add_post('/api/cart/merge', api_cart_merge)
+
+    # Заказы
+    app.router.add_post('/api/checkout', api_checkout)
+    app.router.add_get('/api/orders/{order_id}', api_order)
+    app.router.add_post('/api/orders/{order_id}/confirm', api_order_confirm)
+    app.router.add_post('/api/orders/{order_id}/cancel', api_order_cancel)
+
+    # Служебные
+    app.router.add_post('/api/admin/import', api_admin_import)
+    app.router.add_post('/api/admin/profile', api_admin_profile)
+    app.router.add_get('/api/export/products', api_export_products)
+    app.router.add_get('/api/export/orders', api_export_orders)
 
     # Health check
     app.router.add_get('/health', lambda r: web.Response(text='OK'))
+    app.router.add_get('/metrics', metrics_handler)
+    app.router.add_get('/health/db', lambda r: web.json_response(r.app[DB_KEY].stats()))
+    app.router.add_get('/health/views', lambda r: web.json_response(r.app[VIEWS_KEY].stats()))
+    app.router.add_get('/health/carts', lambda r: web.json_response(r.app[CARTS_KEY].stats()))
+    app.router.add_get('/health/orders', lambda r: web.json_response(r.app[ORDERS_KEY].stats()))
+    app.router.add_get('/health/widgets', lambda r: web.json_response(r.app[WIDGETS_KEY].stats()))
+    app.router.add_get('/health/stream', lambda r: web.json_response(r.app[EVENTS_KEY].stats()))
+    app.router.add_get('/health/templates', lambda r: web.json_response(r.app[TEMPLATES_KEY].stats()))
 
     # Статические файлы (css, js, images) с обработкой ошибок
     app.router.add_get('/static/{path:.*}', serve_static_file)
 
+    # Уменьшенные копии изображений
+    app.router.add_get(r'/img/{width:\d+}x{height:\d+}/{path:.+}', serve_image_variant)
+
     # Редирект для favicon
     app.router.add_get('/favicon.ico', lambda r: web.HTTPFound('/static/images/placeholder.jpg'))
 
 
+def worker_app():
+    """Приложение воркера: собирается в процессе воркера с текущими настройками"""
+    return create_app(load_config())
+
+
 # ============== ЗАПУСК СЕРВЕРА ==============
 
 if __name__ == '__main__':
-    # Инициализация БД
-    init_store_db()
-
-    # Настройка роутов
-    setup_routes()
+    import sys
+
+    config = load_config()
+
+    # Явный шаг миграции (схема + демо-данные) выполняется один раз до запуска воркеров
+    migrate(config['db_path'])
+    if sys.argv[1:2] == ['migrate']:
+        sys.exit(0)
+
+    # Импорт фидов: python StoneWeb.py import feed.csv [feed.jsonl ...]
+    if sys.argv[1:2] == ['import']:
+        for feed_path in sys.argv[2:]:
+            report = import_file(config['db_path'], feed_path)
+            logger.info(
+                f"📥 {feed_path}: {report['rows']} строк, новых {report['inserted']}, обновлено "
+                f"{report['updated']}, без изменений {report['unchanged']}, ошибок {report['errors']} "
+                f"за {report['elapsed']} с ({report['rows_per_sec']} строк/с)"
+            )
+            for error in report['error_samples']:
+                logger.warning(f"⚠️ строка {error['line']}: {error['error']}")
+        sys.exit(0)
 
     # Запуск сервера
-    host = os.getenv('STORE_HOST', '0.0.0.0')
-    port = int(os.getenv('STORE_PORT', 8000))
+    host = config['host']
+    port = config['port']
 
     logger.info(f"🚀 Запуск Stone WebApp Store на {host}:{port}")
-    logger.info(f"📁 WebApp директория: {WEBAPP_DIR}")
-    logger.info(f"🗄️ База данных: {DB_PATH}")
+    logger.info(f"📁 WebApp директория: {config['webapp_dir']}")
+    logger.info(f"🗄️ База данных: {config['db_path']}")
     logger.info(f"🎨 Balenciaga дизайн: http://{host}:{port}/")
     logger.info(f"📱 Telegram WebApp: http://{host}:{port}/webapp/")
     logger.info(f"🛍️ API товаров: http://{host}:{port}/api/products")
 
-    web.run_app(app, host=host, port=port, access_log=logger)
\ No newline at end of file
+    if config['workers'] > 1:
+        # Несколько процессов на одном порту (SO_REUSEPORT), SIGHUP - плавный перезапуск
+        serve(worker_app, host, port, config['workers'], shutdown_timeout=config['shutdown_timeout'], access_log=logger)
+    else:
+        web.run_app(create_app(config), host=host, port=port, access_log=logger, shutdown_timeout=config['shutdown_timeout'])
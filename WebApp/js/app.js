@@ -26,6 +26,36 @@ class StoneStore {
 
         // Setup router
         this.setupRouter();
+
+        // Server pushes widget and stock changes - no polling needed
+        this.subscribeUpdates();
+    }
+
+    subscribeUpdates() {
+        if (!window.EventSource) return;
+
+        const source = new EventSource('/api/stream');
+        source.addEventListener('products', (event) => {
+            const data = JSON.parse(event.data);
+            (data.products || []).forEach(update => {
+                const product = (this.products || []).find(p => p.id === update.id);
+                if (!product) return;
+                if (update.in_stock) {
+                    product.price = update.price;
+                    product.quantity = update.quantity;
+                } else {
+                    product.quantity = 0;
+                }
+            });
+        });
+        source.addEventListener('widgets', () => {
+            if (this.currentPage === '/' || this.currentPage === '/webapp/') {
+                this.loadHomeWidgets();
+            }
+        });
+        // Too many changes or missed events - reload everything
+        source.addEventListener('catalog', () => this.loadInitialData());
+        source.addEventListener('reset', () => this.loadInitialData());
     }
 
     async loadInitialData() {
@@ -141,4 +141,11 @@ class WidgetRenderer {
 document.addEventListener('DOMContentLoaded', () => {
     const renderer = new WidgetRenderer();
     renderer.loadWidgets();
+
+    // Сервер сообщает об изменении виджетов - перечитываем только тогда
+    if (window.EventSource) {
+        const source = new EventSource('/api/stream');
+        source.addEventListener('widgets', () => renderer.loadWidgets());
+        source.addEventListener('reset', () => renderer.loadWidgets());
+    }
 });
\ No newline at end of file
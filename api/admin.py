@@ -0,0 +1,143 @@
+"""
+Служебные эндпоинты магазина.
+
+Доступны только с заголовком Authorization: Bearer <ADMIN_TOKEN>; если
+токен не задан, эндпоинты выключены.
+"""
+
+import asyncio
+import hmac
+import logging
+
+from aiohttp import web
+
+from core.changes import CHANGES_KEY
+from core.db import DB_KEY
+from core.http import bad_request
+from core.importer import FEED_FORMATS, import_stream, text_stream
+from core.profiler import (
+    MAX_SECONDS, MIN_INTERVAL, PROFILE_MODES, PROFILER_KEY, ProfilerBusy, pstats_dump, pstats_text, route_codes
+)
+
+logger = logging.getLogger(__name__)
+
+ADMIN_TOKEN_KEY = web.AppKey('admin_token', str)
+
+
+def admin_denied(request):
+    """Ответ 403, если запрос не от администратора, иначе None"""
+    token = request.app.get(ADMIN_TOKEN_KEY)
+    header = request.headers.get('Authorization', '')
+    if token and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+        return None
+    return web.json_response({
+        'success': False,
+        'error': 'Доступ запрещен'
+    }, status=403)
+
+
+async def api_admin_import(request):
+    """
+    POST /api/admin/import?format=csv|jsonl - тело запроса - фид целиком.
+
+    Тело читается потоком прямо в импорт, не загружаясь в память.
+    """
+    denied = admin_denied(request)
+    if denied is not None:
+        return denied
+
+    fmt = request.query.get('format') or ('jsonl' if 'json' in request.content_type else 'csv')
+    if fmt not in FEED_FORMATS:
+        return bad_request(f'Неизвестный формат фида: {fmt}')
+
+    try:
+        stream = text_stream(request.content, asyncio.get_running_loop())
+        report = await asyncio.to_thread(import_stream, request.app[DB_KEY].path, stream, fmt)
+        # Модель каталога и кэши видят изменения сразу, не дожидаясь опроса
+        await request.app[CHANGES_KEY].check()
+        logger.info(
+            f"📥 Импорт фида: {report['rows']} строк, новых {report['inserted']}, "
+            f"обновлено {report['updated']}, ошибок {report['errors']} ({report['rows_per_sec']} строк/с)"
+        )
+        return web.json_response({
+            'success': True,
+            'report': report
+        })
+
+    except Exception as e:
+        logger.error(f"Ошибка импорта фида: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+async def api_admin_profile(request):
+    """
+    POST /api/admin/profile - профилирование этого воркера на окно времени.
+
+    ?mode=sample|cprofile (по умолчанию sample), ?seconds= (до MAX_SECONDS),
+    ?interval_ms= - период выборки, ?route=/api/products - только стеки
+    обработчика маршрута (шаблон пути), ?threads=all - и потоки пула.
+    ?format=: для sample - collapsed (текст для flamegraph) или json,
+    для cprofile - text (отчет pstats) или pstats (дамп для snakeviz).
+    """
+    denied = admin_denied(request)
+    if denied is not None:
+        return denied
+
+    mode = request.query.get('mode', 'sample')
+    try:
+        seconds = float(request.query.get('seconds', 10))
+        interval = float(request.query.get('interval_ms', 5)) / 1000
+    except ValueError:
+        return bad_request()
+    if mode not in PROFILE_MODES or not 0 < seconds <= MAX_SECONDS or interval < MIN_INTERVAL:
+        return bad_request()
+
+    route = request.query.get('route')
+    codes = None
+    if route:
+        if mode != 'sample':
+            return bad_request('Маршрут можно указать только для mode=sample')
+        codes = route_codes(request.app, route)
+        if not codes:
+            return bad_request(f'Маршрут не найден: {route}')
+
+    profiler = request.app[PROFILER_KEY]
+    fmt = request.query.get('format')
+    try:
+        if mode == 'sample':
+            sampler = await profiler.sample(
+                seconds, interval, codes=codes, all_threads=request.query.get('threads') == 'all')
+            if fmt == 'json':
+                return web.json_response({
+                    'success': True,
+                    'samples': sampler.samples,
+                    'matched': sum(sampler.stacks.values()),
+                    'top': sampler.top(),
+                    'collapsed': sampler.collapsed()
+                })
+            return web.Response(text=sampler.collapsed(), content_type='text/plain')
+
+        stats = await profiler.cprofile(seconds)
+        if fmt == 'pstats':
+            return web.Response(
+                body=pstats_dump(stats),
+                content_type='application/octet-stream',
+                headers={'Content-Disposition': 'attachment; filename="stone.pstats"'}
+            )
+        return web.Response(text=pstats_text(stats, sort=request.query.get('sort', 'cumulative')),
+                            content_type='text/plain')
+
+    except ProfilerBusy as e:
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=409)
+    except Exception as e:
+        logger.error(f"Ошибка профилирования: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
@@ -0,0 +1,189 @@
+"""
+API корзины.
+
+Владелец корзины - пользователь Telegram (подписанная initData в заголовке
+X-Telegram-Init-Data) или, для обычного браузера, токен сессии в cookie.
+"""
+
+import logging
+import secrets
+
+from aiohttp import web
+
+from core.carts import CARTS_KEY, CartError
+from core.catalog import CATALOG_KEY
+from core.http import bad_request, read_json
+from core.telegram import BOT_TOKEN_KEY, INIT_DATA_HEADER, verify_init_data
+
+logger = logging.getLogger(__name__)
+
+SESSION_COOKIE = 'stone_session'
+SESSION_MAX_AGE = 30 * 24 * 3600
+
+
+def telegram_user(request):
+    """Проверенный пользователь Telegram или None"""
+    return verify_init_data(request.headers.get(INIT_DATA_HEADER), request.app.get(BOT_TOKEN_KEY))
+
+
+def _session_token(request):
+    token = request.cookies.get(SESSION_COOKIE, '')
+    return token if 16 <= len(token) <= 64 and token.replace('-', '').replace('_', '').isalnum() else None
+
+
+def cart_owner(request):
+    """
+    (владелец, новый токен сессии или None).
+
+    Новый токен нужно вернуть клиенту в cookie - см. cart_response.
+    """
+    user = telegram_user(request)
+    if user is not None:
+        return f"tg:{user['id']}", None
+    token = _session_token(request)
+    if token is not None:
+        return f"s:{token}", None
+    token = secrets.token_urlsafe(24)
+    return f"s:{token}", token
+
+
+def remember_session(response, new_token):
+    """Отдает клиенту новый токен сессии (если он был выдан)"""
+    if new_token is not None:
+        response.set_cookie(SESSION_COOKIE, new_token, max_age=SESSION_MAX_AGE, httponly=True, samesite='Lax')
+    return response
+
+
+def cart_response(request, cart, new_token=None):
+    return remember_session(web.json_response({
+        'success': True,
+        'cart': request.app[CARTS_KEY].describe(cart)
+    }), new_token)
+
+
+async def _ensure_catalog(request):
+    catalog = request.app[CATALOG_KEY]
+    if not catalog.loaded:
+        await catalog.reload()
+
+
+async def api_cart(request):
+    """GET /api/cart - корзина с актуальными ценами"""
+    try:
+        await _ensure_catalog(request)
+        owner, new_token = cart_owner(request)
+        cart = await request.app[CARTS_KEY].get(owner)
+        return cart_response(request, cart, new_token)
+
+    except Exception as e:
+        logger.error(f"Ошибка API корзины: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+async def api_cart_add(request):
+    """POST /api/cart/items {product_id, quantity}"""
+    try:
+        await _ensure_catalog(request)
+        data = await read_json(request)
+        try:
+            product_id = int(data['product_id'])
+            quantity = int(data.get('quantity', 1))
+        except (TypeError, KeyError, ValueError):
+            return bad_request()
+
+        owner, new_token = cart_owner(request)
+        try:
+            cart = await request.app[CARTS_KEY].add(owner, product_id, quantity)
+        except CartError as e:
+            return web.json_response({'success': False, 'error': str(e)}, status=409)
+        return cart_response(request, cart, new_token)
+
+    except Exception as e:
+        logger.error(f"Ошибка добавления в корзину: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+async def api_cart_update(request):
+    """PATCH /api/cart/items/{product_id} {quantity} (0 - удалить)"""
+    try:
+        await _ensure_catalog(request)
+        data = await read_json(request)
+        try:
+            product_id = int(request.match_info['product_id'])
+            quantity = int(data['quantity'])
+        except (TypeError, KeyError, ValueError):
+            return bad_request()
+
+        owner, new_token = cart_owner(request)
+        try:
+            cart = await request.app[CARTS_KEY].update(owner, product_id, quantity)
+        except CartError as e:
+            return web.json_response({'success': False, 'error': str(e)}, status=409)
+        return cart_response(request, cart, new_token)
+
+    except Exception as e:
+        logger.error(f"Ошибка изменения корзины: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+async def api_cart_remove(request):
+    """DELETE /api/cart/items/{product_id}"""
+    try:
+        await _ensure_catalog(request)
+        try:
+            product_id = int(request.match_info['product_id'])
+        except ValueError:
+            return bad_request()
+
+        owner, new_token = cart_owner(request)
+        cart = await request.app[CARTS_KEY].remove(owner, product_id)
+        return cart_response(request, cart, new_token)
+
+    except Exception as e:
+        logger.error(f"Ошибка удаления из корзины: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+async def api_cart_merge(request):
+    """
+    POST /api/cart/merge {items: [{id, quantity}]}
+
+    Переносит локальную корзину клиента на сервер. Если запрос подписан
+    Telegram, в корзину пользователя переносится и корзина сессии браузера.
+    """
+    try:
+        await _ensure_catalog(request)
+        data = await read_json(request)
+        if data is None:
+            return bad_request()
+        try:
+            items = [(int(item['id']), int(item.get('quantity', 1))) for item in data.get('items') or []]
+        except (TypeError, KeyError, ValueError, AttributeError):
+            return bad_request()
+
+        owner, new_token = cart_owner(request)
+        source = None
+        if owner.startswith('tg:') and _session_token(request) is not None:
+            source = f"s:{_session_token(request)}"
+
+        cart = await request.app[CARTS_KEY].merge(owner, items, source=source)
+        return cart_response(request, cart, new_token)
+
+    except Exception as e:
+        logger.error(f"Ошибка объединения корзин: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
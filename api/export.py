@@ -0,0 +1,162 @@
+"""
+Выгрузка каталога и заказов в NDJSON (одна JSON-запись на строку) для ERP.
+
+Ответ отдается потоком (chunked): строки читаются курсором пачками по
+EXPORT_BATCH на отдельном соединении, кодируются в потоке БД и пишутся
+в ответ по мере готовности. await response.write ждет, пока клиент
+заберет данные, поэтому память не зависит от размера выгрузки.
+
+?updated_since= (unix time или ISO 8601) - только изменившиеся записи для
+инкрементальной синхронизации. Записи идут по возрастанию updated_at:
+следующий запрос можно начинать с updated_at последней полученной строки
+(граница включается - повторы возможны, пропусков нет).
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+from api.admin import admin_denied
+from core.catalog import PRODUCT_SELECT
+from core.db import DB_KEY, connect
+from core.http import bad_request
+from core.jsonenc import RawJSON, encode_json
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH = 500
+
+ORDERS_SELECT = """
+    SELECT o.id, o.owner, o.status, o.total, o.customer, o.created_at, o.expires_at, o.updated_at,
+           (SELECT json_group_array(json_object('product_id', oi.product_id,
+                                                'quantity', oi.quantity,
+                                                'price', oi.price))
+            FROM shop_order_items oi WHERE oi.order_id = o.id) AS items
+    FROM shop_orders o
+"""
+
+
+def _since(value):
+    """updated_since -> datetime (UTC) или None; ValueError при ошибке"""
+    if not value:
+        return None
+    try:
+        return datetime.fromtimestamp(float(value), timezone.utc)
+    except ValueError:
+        pass
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    # Сравнение идет со временем UTC из БД - смещение нужно пересчитать
+    return moment.astimezone(timezone.utc)
+
+
+def _product_line(row):
+    product = dict(row)
+    try:
+        product['gallery'] = json.loads(product['gallery']) if product['gallery'] else []
+    except ValueError:
+        product['gallery'] = []
+    product['is_featured'] = bool(product['is_featured'])
+    product['is_active'] = bool(product['is_active'])
+    return encode_json(product)
+
+
+def _order_line(row):
+    order = dict(row)
+    order['items'] = RawJSON(order['items'].encode())
+    order['customer'] = RawJSON(order['customer'].encode()) if order['customer'] else None
+    return encode_json(order)
+
+
+def _encode_batch(cursor, encode):
+    """Следующая пачка строк NDJSON одним куском bytes (b'' - конец)"""
+    rows = cursor.fetchmany(EXPORT_BATCH)
+    if not rows:
+        return b''
+    return b'\n'.join(encode(row) for row in rows) + b'\n'
+
+
+async def stream_ndjson(request, sql, params, encode, filename):
+    """Отдает результат запроса потоком NDJSON"""
+    response = web.StreamResponse(headers={
+        'Content-Type': 'application/x-ndjson; charset=utf-8',
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+    })
+    response.enable_compression()
+    response.enable_chunked_encoding()
+
+    # Отдельное соединение: курсор живет всю выгрузку и не должен занимать пул
+    conn = await asyncio.to_thread(connect, request.app[DB_KEY].path)
+    rows = 0
+    try:
+        cursor = await asyncio.to_thread(conn.execute, sql, params)
+        await response.prepare(request)
+        while True:
+            chunk = await asyncio.to_thread(_encode_batch, cursor, encode)
+            if not chunk:
+                break
+            rows += chunk.count(b'\n')
+            await response.write(chunk)
+        await response.write_eof()
+
+    except ConnectionResetError:
+        logger.warning(f"⚠️ Выгрузка {filename} прервана клиентом после {rows} записей")
+        return response
+    except Exception as e:
+        logger.error(f"Ошибка выгрузки {filename}: {e}")
+        if response.prepared:
+            # Заголовки уже отправлены - остается оборвать ответ
+            raise
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+    finally:
+        await asyncio.to_thread(conn.close)
+
+    logger.info(f"📤 Выгрузка {filename}: {rows} записей")
+    return response
+
+
+async def api_export_products(request):
+    """GET /api/export/products[?updated_since=] - все товары, включая неактивные"""
+    denied = admin_denied(request)
+    if denied is not None:
+        return denied
+    try:
+        since = _since(request.query.get('updated_since'))
+    except ValueError:
+        return bad_request()
+
+    sql = PRODUCT_SELECT
+    params = ()
+    if since is not None:
+        # updated_at товаров - CURRENT_TIMESTAMP SQLite (UTC, с точностью до секунды)
+        sql += " WHERE p.updated_at >= ?"
+        params = (since.strftime('%Y-%m-%d %H:%M:%S'),)
+    sql += " ORDER BY p.updated_at, p.id"
+    return await stream_ndjson(request, sql, params, _product_line, 'products.ndjson')
+
+
+async def api_export_orders(request):
+    """GET /api/export/orders[?updated_since=] - заказы с позициями"""
+    denied = admin_denied(request)
+    if denied is not None:
+        return denied
+    try:
+        since = _since(request.query.get('updated_since'))
+    except ValueError:
+        return bad_request()
+
+    sql = ORDERS_SELECT
+    params = ()
+    if since is not None:
+        sql += " WHERE o.updated_at >= ?"
+        params = (since.timestamp(),)
+    sql += " ORDER BY o.updated_at, o.id"
+    return await stream_ndjson(request, sql, params, _order_line, 'orders.ndjson')
@@ -0,0 +1,166 @@
+"""
+API оформления заказов.
+
+Покупатель определяется так же, как для корзины (api.cart.cart_owner).
+"""
+
+import logging
+
+from aiohttp import web
+
+from api.cart import cart_owner, remember_session
+from core.carts import CARTS_KEY, MAX_CART_ITEMS, MAX_ITEM_QUANTITY
+from core.http import bad_request, read_json
+from core.orders import ORDERS_KEY, OrderError, OrderNotFound, OrdersUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Контакты покупателя хранятся в заказе как есть - ограничиваем размер
+MAX_CUSTOMER_FIELDS = 20
+
+
+def _order_lines(items):
+    """[(product_id, quantity)] без повторов; ValueError при некорректных данных"""
+    merged = {}
+    for item in items:
+        product_id = int(item['id'])
+        quantity = int(item.get('quantity', 1))
+        if quantity < 1:
+            raise ValueError(quantity)
+        merged[product_id] = merged.get(product_id, 0) + quantity
+    if not merged or len(merged) > MAX_CART_ITEMS or max(merged.values()) > MAX_ITEM_QUANTITY:
+        raise ValueError(len(merged))
+    return list(merged.items())
+
+
+def _customer(data):
+    customer = data.get('customer') or data.get('user')
+    if not isinstance(customer, dict):
+        return None
+    return {str(key)[:50]: str(value)[:200] for key, value in list(customer.items())[:MAX_CUSTOMER_FIELDS]}
+
+
+def _order_id(request):
+    return int(request.match_info['order_id'])
+
+
+def _order_error(e):
+    if isinstance(e, OrdersUnavailable):
+        # Сервер останавливается: клиент повторит запрос на другом процессе
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=503, headers={'Retry-After': '1'})
+    return web.json_response({
+        'success': False,
+        'error': str(e)
+    }, status=404 if isinstance(e, OrderNotFound) else 409)
+
+
+async def api_checkout(request):
+    """
+    POST /api/checkout {cart: {items: [{id, quantity}]}, customer | user}
+
+    Без позиций в теле оформляется серверная корзина покупателя. Товар
+    резервируется сразу; заказ нужно подтвердить до expires_at.
+    """
+    try:
+        data = await read_json(request)
+        if data is None:
+            return bad_request()
+
+        owner, new_token = cart_owner(request)
+        carts = request.app[CARTS_KEY]
+        from_server_cart = False
+        cart = data.get('cart')
+        items = cart.get('items') if isinstance(cart, dict) else data.get('items')
+        if not items:
+            items = [{'id': pid, 'quantity': qty} for pid, qty in (await carts.get(owner)).items.items()]
+            from_server_cart = True
+        try:
+            lines = _order_lines(items)
+        except (TypeError, KeyError, ValueError, AttributeError):
+            return bad_request('Корзина пуста или содержит некорректные позиции')
+
+        try:
+            order = await request.app[ORDERS_KEY].place(owner, lines, _customer(data))
+        except OrderError as e:
+            return _order_error(e)
+
+        if from_server_cart:
+            await carts.clear(owner)
+        logger.info(f"🧾 Заказ #{order['id']} на {order['total']} зарезервирован")
+        # Без cookie сессии гость не увидит свой заказ
+        return remember_session(web.json_response({
+            'success': True,
+            'order': order
+        }), new_token)
+
+    except Exception as e:
+        logger.error(f"Ошибка оформления заказа: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+async def api_order(request):
+    """GET /api/orders/{order_id}"""
+    try:
+        try:
+            order_id = _order_id(request)
+        except ValueError:
+            return bad_request()
+
+        owner, _ = cart_owner(request)
+        try:
+            order = await request.app[ORDERS_KEY].get(owner, order_id)
+        except OrderError as e:
+            return _order_error(e)
+        return web.json_response({
+            'success': True,
+            'order': order
+        })
+
+    except Exception as e:
+        logger.error(f"Ошибка API заказа: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+async def api_order_confirm(request):
+    """POST /api/orders/{order_id}/confirm - резерв становится заказом"""
+    return await _change_status(request, 'confirm')
+
+
+async def api_order_cancel(request):
+    """POST /api/orders/{order_id}/cancel - товар возвращается на склад"""
+    return await _change_status(request, 'cancel')
+
+
+async def _change_status(request, action):
+    try:
+        try:
+            order_id = _order_id(request)
+        except ValueError:
+            return bad_request()
+
+        owner, _ = cart_owner(request)
+        orders = request.app[ORDERS_KEY]
+        try:
+            order = await getattr(orders, action)(owner, order_id)
+        except OrderError as e:
+            return _order_error(e)
+        return web.json_response({
+            'success': True,
+            'order': order
+        })
+
+    except Exception as e:
+        logger.error(f"Ошибка изменения заказа: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
@@ -0,0 +1,170 @@
+"""
+API каталога товаров
+"""
+
+import logging
+
+from aiohttp import web
+
+from core.apicache import API_CACHE_KEY
+from core.catalog import CATALOG_KEY, encode_products
+from core.details import DETAILS_KEY
+from core.facets import FACETS
+from core.http import cached_response
+from core.search import SEARCH_KEY
+
+logger = logging.getLogger(__name__)
+
+CATALOG_MAX_LIMIT = 100
+SEARCH_MAX_LIMIT = 50
+
+
+def _split(value):
+    """'a,b' -> ['a', 'b']"""
+    return [item for item in (value or '').split(',') if item]
+
+
+def _price(value):
+    return float(value) if value not in (None, '') else None
+
+
+async def api_catalog(request):
+    """Каталог с фильтрами, фасетами и точным количеством товаров"""
+    try:
+        catalog = request.app[CATALOG_KEY]
+        if not catalog.loaded:
+            await catalog.reload()
+
+        try:
+            page = max(1, int(request.query.get('page', 1)))
+            limit = min(CATALOG_MAX_LIMIT, max(1, int(request.query.get('limit', 24))))
+            min_price = _price(request.query.get('min_price'))
+            max_price = _price(request.query.get('max_price'))
+        except ValueError:
+            return web.json_response({
+                'success': False,
+                'error': 'Некорректные параметры запроса'
+            }, status=400)
+
+        filters = {facet: _split(request.query.get(facet)) for facet in FACETS}
+        sort_by = request.query.get('sort_by')
+
+        key = (
+            'catalog', catalog.version, catalog.views_version if sort_by == 'popular' else 0,
+            page, limit, min_price, max_price, sort_by,
+            tuple(tuple(sorted(filters[facet])) for facet in FACETS)
+        )
+        cached = await request.app[API_CACHE_KEY].get(
+            key, lambda: _catalog_payload(catalog, filters, min_price, max_price, sort_by, page, limit)
+        )
+        return cached_response(request, cached)
+
+    except Exception as e:
+        logger.error(f"Ошибка API каталога: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+async def _catalog_payload(catalog, filters, min_price, max_price, sort_by, page, limit):
+    """Страница каталога вместе с фасетами"""
+    index = await catalog.facets()
+    mask, counts = index.search(filters, min_price, max_price)
+    total = mask.bit_count()
+    views = index.page(mask, sort_by=sort_by, offset=(page - 1) * limit, limit=limit)
+
+    return {
+        'success': True,
+        'products': encode_products(views),
+        'pagination': {
+            'page': page,
+            'pages': -(-total // limit),
+            'total': total,
+            'limit': limit
+        },
+        'filters': {
+            'categories': [
+                {'slug': slug, 'name': index.labels.get(slug) or slug,
+                 'parent': catalog.tree.parent(slug), 'count': count}
+                for slug, count in sorted(counts['category'].items())
+            ],
+            'brands': [
+                {'brand': brand, 'count': count}
+                for brand, count in sorted(counts['brand'].items())
+            ],
+            'colors': [
+                {'color': color, 'count': count}
+                for color, count in sorted(counts['color'].items())
+            ],
+            'sizes': [
+                {'size': size, 'count': count}
+                for size, count in sorted(counts['size'].items())
+            ],
+            'materials': [
+                {'material': material, 'count': count}
+                for material, count in sorted(counts['material'].items())
+            ],
+            'price_range': index.price_range()
+        }
+    }
+
+
+async def api_search(request):
+    """Полнотекстовый поиск товаров (в т.ч. подсказки по мере ввода)"""
+    try:
+        catalog = request.app[CATALOG_KEY]
+        if not catalog.loaded:
+            await catalog.reload()
+
+        query = request.query.get('q', '').strip()
+        try:
+            limit = min(SEARCH_MAX_LIMIT, max(1, int(request.query.get('limit', 10))))
+        except ValueError:
+            limit = 10
+
+        async def build():
+            products = await request.app[SEARCH_KEY].search(query, limit=limit)
+            return {
+                'success': True,
+                'query': query,
+                'products': encode_products(products),
+                'total': len(products)
+            }
+
+        key = ('search', catalog.version, query, limit)
+        cached = await request.app[API_CACHE_KEY].get(key, build)
+        return cached_response(request, cached)
+
+    except Exception as e:
+        logger.error(f"Ошибка поиска: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+async def api_product(request):
+    """Карточка товара: полная строка, галерея, категория, цены и похожие товары"""
+    try:
+        catalog = request.app[CATALOG_KEY]
+        if not catalog.loaded:
+            await catalog.reload()
+
+        try:
+            product_id = int(request.match_info['id'])
+        except ValueError:
+            return web.json_response({
+                'success': False,
+                'error': 'Некорректные параметры запроса'
+            }, status=400)
+
+        status, cached = await request.app[DETAILS_KEY].get(product_id)
+        return cached_response(request, cached, status=status)
+
+    except Exception as e:
+        logger.error(f"Ошибка API карточки товара: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
@@ -0,0 +1,68 @@
+"""
+Поток изменений для WebApp: GET /api/stream (Server-Sent Events).
+
+События:
+- products - {version, products: [{id, price, quantity, in_stock}]};
+- catalog - {version, reload: true} - изменилось слишком много, перечитать;
+- widgets - {version, changed: [id], removed: [id]};
+- reset - пропущенные события уже недоступны, перечитать все.
+Раз в heartbeat секунд приходит комментарий ": ping", чтобы прокси не
+закрывали простаивающее соединение.
+"""
+
+import asyncio
+import logging
+
+from aiohttp import web
+
+from core.events import EVENTS_KEY, sse_frame
+
+logger = logging.getLogger(__name__)
+
+RETRY_MS = 3000
+PING = b': ping\n\n'
+
+
+async def api_stream(request):
+    """GET /api/stream - подписка на изменения виджетов и каталога"""
+    hub = request.app[EVENTS_KEY]
+    subscriber = hub.subscribe()
+    if subscriber is None:
+        return web.json_response({
+            'success': False,
+            'error': 'Слишком много подключений'
+        }, status=503, headers={'Retry-After': str(RETRY_MS // 1000)})
+
+    # Без await между подпиской и replay: ни одно событие не потеряется и не повторится
+    backlog = [f'retry: {RETRY_MS}\n\n'.encode()]
+    last_id = request.headers.get('Last-Event-ID') or request.query.get('last_event_id')
+    if last_id:
+        frames = hub.replay(last_id)
+        if frames is None:
+            event_id = hub.event_id(hub.last_id)
+            backlog.append(sse_frame('reset', {'last_id': event_id}, event_id))
+        else:
+            backlog.extend(frames)
+
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        # nginx не должен буферизовать поток
+        'X-Accel-Buffering': 'no',
+    })
+    try:
+        await response.prepare(request)
+        await response.write(b''.join(backlog))
+        while True:
+            try:
+                frame = await asyncio.wait_for(subscriber.queue.get(), hub.heartbeat)
+            except asyncio.TimeoutError:
+                frame = PING
+            if frame is None:
+                break
+            await response.write(frame)
+    except ConnectionResetError:
+        pass
+    finally:
+        hub.unsubscribe(subscriber)
+    return response
@@ -0,0 +1,160 @@
+"""
+API виджетов витрины.
+
+Ответы склеиваются из JSON-фрагментов реестра (core.widgets), у каждого
+виджета есть готовый HTML в поле html. Изменение виджетов - только для
+администратора; конфигурация проверяется по схеме типа виджета.
+"""
+
+import logging
+
+from aiohttp import web
+
+from api.admin import admin_denied
+from core.apicache import API_CACHE_KEY
+from core.http import bad_request, cached_response, read_json
+from core.widgets import WIDGETS_KEY, WidgetError
+
+logger = logging.getLogger(__name__)
+
+
+async def api_widgets(request):
+    """API для получения виджетов"""
+    try:
+        registry = request.app[WIDGETS_KEY]
+        await registry.ensure_loaded()
+
+        async def build():
+            return {
+                'success': True,
+                'widgets': registry.encode()
+            }
+
+        key = ('widgets', registry.version)
+        cached = await request.app[API_CACHE_KEY].get(key, build)
+        return cached_response(request, cached)
+    except Exception as e:
+        logger.error(f"Ошибка API виджетов: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+async def api_webapp_widgets(request):
+    """
+    GET /api/webapp/widgets - виджеты для WebApp: JSON и готовый HTML.
+
+    Администратор (?all=1) получает и неактивные виджеты, и список строк,
+    не прошедших проверку.
+    """
+    try:
+        registry = request.app[WIDGETS_KEY]
+        await registry.ensure_loaded()
+
+        if request.query.get('all'):
+            denied = admin_denied(request)
+            if denied is not None:
+                return denied
+
+            async def build():
+                return {
+                    'success': True,
+                    'widgets': registry.encode(active_only=False),
+                    'invalid': registry.invalid
+                }
+            key = ('webapp_widgets_all', registry.version)
+        else:
+            async def build():
+                return {
+                    'success': True,
+                    'widgets': registry.encode(),
+                    'html': str(registry.html())
+                }
+            key = ('webapp_widgets', registry.version)
+
+        cached = await request.app[API_CACHE_KEY].get(key, build)
+        return cached_response(request, cached)
+    except Exception as e:
+        logger.error(f"Ошибка API виджетов WebApp: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+def _widget_id(request):
+    try:
+        return int(request.match_info['widget_id'])
+    except ValueError:
+        return None
+
+
+async def _save(request, widget_id=None):
+    denied = admin_denied(request)
+    if denied is not None:
+        return denied
+    data = await read_json(request)
+    if data is None:
+        return bad_request()
+
+    try:
+        saved = await request.app[WIDGETS_KEY].save(data, widget_id)
+    except WidgetError as e:
+        return bad_request(str(e))
+    except Exception as e:
+        logger.error(f"Ошибка сохранения виджета: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    if saved is None:
+        return web.json_response({
+            'success': False,
+            'error': 'Виджет не найден'
+        }, status=404)
+    widget = next((w for w in request.app[WIDGETS_KEY].widgets if w.id == saved), None)
+    return web.json_response({
+        'success': True,
+        'widget': widget.payload() if widget is not None else {'id': saved}
+    }, status=201 if widget_id is None else 200)
+
+
+async def api_webapp_widget_create(request):
+    """POST /api/webapp/widgets - новый виджет {widget_type, title, content, config, ...}"""
+    return await _save(request)
+
+
+async def api_webapp_widget_update(request):
+    """PUT /api/webapp/widgets/{widget_id} - замена виджета целиком"""
+    widget_id = _widget_id(request)
+    if widget_id is None:
+        return bad_request()
+    return await _save(request, widget_id)
+
+
+async def api_webapp_widget_delete(request):
+    """DELETE /api/webapp/widgets/{widget_id}"""
+    denied = admin_denied(request)
+    if denied is not None:
+        return denied
+    widget_id = _widget_id(request)
+    if widget_id is None:
+        return bad_request()
+
+    try:
+        deleted = await request.app[WIDGETS_KEY].delete(widget_id)
+    except Exception as e:
+        logger.error(f"Ошибка удаления виджета: {e}")
+        return web.json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    if not deleted:
+        return web.json_response({
+            'success': False,
+            'error': 'Виджет не найден'
+        }, status=404)
+    return web.json_response({'success': True})
@@ -0,0 +1,113 @@
+"""
+Нагрузочный тест оформления заказов: распродажа нескольких товаров.
+
+Несколько процессов (как воркеры SO_REUSEPORT), в каждом свой писатель
+OrderService; покупатели одновременно оформляют заказы на --hot
+популярных товаров с остатком --stock. После прогона проверяется, что
+остатки не ушли в минус и списано ровно столько, сколько лежит в заказах.
+
+Запуск: python benchmarks/bench_checkout.py [--procs 4] [--buyers 2000] [--concurrency 200]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from synthetic import make_catalog
+
+from core.db import Database  # noqa: E402
+from core.orders import OrderError, OrderService  # noqa: E402
+
+
+async def _buy(path, worker, buyers, concurrency, hot, max_batch):
+    db = Database(path, pool_size=2)
+    db.open()
+    orders = OrderService(db, max_batch=max_batch)
+    orders.start()
+    rnd = random.Random(worker)
+    placed = rejected = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def buyer(index):
+        nonlocal placed, rejected
+        lines = {rnd.randint(1, hot): rnd.randint(1, 2) for _ in range(rnd.randint(1, 3))}
+        async with semaphore:
+            try:
+                await orders.place(f"bench:{worker}:{index}", list(lines.items()))
+                placed += 1
+            except OrderError:
+                rejected += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[buyer(i) for i in range(buyers)])
+    elapsed = time.perf_counter() - started
+    await orders.stop()
+    await db.close()
+    return placed, rejected, elapsed, orders.stats()
+
+
+def _worker(args):
+    return asyncio.run(_buy(*args))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--procs', type=int, default=4)
+    parser.add_argument('--buyers', type=int, default=2000, help='покупателей на процесс')
+    parser.add_argument('--concurrency', type=int, default=200, help='одновременных заказов на процесс')
+    parser.add_argument('--hot', type=int, default=5, help='товаров в распродаже')
+    parser.add_argument('--stock', type=int, default=1000, help='остаток каждого товара')
+    parser.add_argument('--batch', type=int, default=256, help='максимум операций в транзакции')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'shop.db')
+        conn = make_catalog(path, 100)
+        conn.execute("UPDATE products SET quantity = ?, is_active = TRUE WHERE id <= ?", (args.stock, args.hot))
+        conn.commit()
+
+        jobs = [(path, worker, args.buyers, args.concurrency, args.hot, args.batch) for worker in range(args.procs)]
+        started = time.perf_counter()
+        with multiprocessing.get_context('spawn').Pool(args.procs) as pool:
+            results = pool.map(_worker, jobs)
+        wall = time.perf_counter() - started
+
+        placed = sum(r[0] for r in results)
+        rejected = sum(r[1] for r in results)
+        elapsed = max(r[2] for r in results)
+        batches = sum(r[3]['batches'] for r in results)
+        operations = sum(r[3]['operations'] for r in results)
+
+        stock = dict(conn.execute("SELECT id, quantity FROM products WHERE id <= ?", (args.hot,)).fetchall())
+        sold = dict(conn.execute("""
+            SELECT oi.product_id, SUM(oi.quantity)
+            FROM shop_order_items oi JOIN shop_orders o ON o.id = oi.order_id
+            WHERE o.status = 'reserved'
+            GROUP BY oi.product_id
+        """).fetchall())
+        orders_in_db = conn.execute("SELECT COUNT(*) FROM shop_orders").fetchone()[0]
+        conn.close()
+
+    print(f"Процессов: {args.procs}, покупателей: {args.procs * args.buyers}, "
+          f"товаров: {args.hot} x {args.stock} шт.")
+    print(f"Заказов: {placed} оформлено, {rejected} отклонено (нет остатка)")
+    print(f"Пропускная способность: {(placed + rejected) / elapsed:8.0f} операций/с, "
+          f"{placed / elapsed:8.0f} заказов/с (всего {wall:.2f} с)")
+    print(f"Транзакций: {batches}, в среднем {operations / max(batches, 1):.1f} операций на транзакцию")
+
+    oversold = {pid: qty for pid, qty in stock.items() if qty < 0}
+    mismatch = {pid: (args.stock - stock[pid], sold.get(pid, 0))
+                for pid in stock if args.stock - stock[pid] != sold.get(pid, 0)}
+    print(f"Остатки после распродажи: {stock}")
+    if oversold or mismatch or orders_in_db != placed:
+        print(f"ОШИБКА: минус {oversold}, расхождение {mismatch}, заказов в БД {orders_in_db} != {placed}")
+        raise SystemExit(1)
+    print("Перепродаж нет: списано ровно столько, сколько в заказах")
+
+
+if __name__ == '__main__':
+    main()
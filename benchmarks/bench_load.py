@@ -0,0 +1,195 @@
+"""
+Нагрузочный тест: пропускная способность и задержки основных маршрутов.
+
+Приложение поднимается в этом же процессе на локальном порту поверх
+детерминированного синтетического каталога (см. synthetic.cached_catalog),
+затем --concurrency асинхронных клиентов в течение --duration секунд по
+кругу запрашивают маршруты. Клиенты делят процесс с сервером, поэтому
+абсолютные числа занижены, но для сравнения коммитов между собой на
+одной машине этого достаточно.
+
+Результат - JSON (rps и p50/p95/p99 по каждому маршруту); с --baseline
+рядом выводится разница с прошлым прогоном.
+
+Запуск:
+  python benchmarks/bench_load.py --products 100000 --output before.json
+  python benchmarks/bench_load.py --products 100000 --baseline before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from synthetic import cached_catalog
+
+import StoneWeb  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = (
+    '/',
+    '/api/products',
+    '/api/products?category=sneakers&limit=24',
+    '/api/categories',
+    '/api/widgets',
+    '/static/css/main.css',
+    '/webapp/js/app.js',
+)
+
+
+def percentile(sorted_values, q):
+    """Перцентиль по ближайшему рангу (sorted_values отсортирован)"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def drive(base_url, routes, concurrency, duration):
+    """Гоняет маршруты duration секунд; возвращает {route: (latencies, errors)}"""
+    latencies = {route: [] for route in routes}
+    errors = dict.fromkeys(routes, 0)
+    deadline = time.perf_counter() + duration
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(base_url, connector=connector) as session:
+        async def client(offset):
+            n = offset
+            while time.perf_counter() < deadline:
+                route = routes[n % len(routes)]
+                n += 1
+                started = time.perf_counter()
+                try:
+                    async with session.get(route) as response:
+                        await response.read()
+                        ok = response.status < 400
+                except aiohttp.ClientError:
+                    ok = False
+                if ok:
+                    latencies[route].append(time.perf_counter() - started)
+                else:
+                    errors[route] += 1
+
+        await asyncio.gather(*[client(i) for i in range(concurrency)])
+    return {route: (latencies[route], errors[route]) for route in routes}
+
+
+async def run(args, db_path, image_dir):
+    app = StoneWeb.create_app({'db_path': db_path, 'image_cache_dir': image_dir})
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', args.port)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    base_url = f"http://{host}:{port}"
+    try:
+        # Прогрев: модель каталога, кэши ответов, манифест статики
+        await drive(base_url, args.routes, min(args.concurrency, 4), args.warmup)
+        started = time.perf_counter()
+        raw = await drive(base_url, args.routes, args.concurrency, args.duration)
+        elapsed = time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+
+    routes = {route: summarize(latencies, errors, elapsed) for route, (latencies, errors) in raw.items()}
+    total = summarize(
+        [value for latencies, _ in raw.values() for value in latencies],
+        sum(errors for _, errors in raw.values()),
+        elapsed
+    )
+    return {
+        'meta': {
+            'revision': git_revision(),
+            'products': args.products,
+            'seed': args.seed,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'python': platform.python_version(),
+            'aiohttp': aiohttp.__version__,
+            'timestamp': int(time.time()),
+        },
+        'total': total,
+        'routes': routes,
+    }
+
+
+def compare(result, baseline):
+    """Таблица изменений относительно прошлого прогона"""
+    def delta(new, old):
+        return f"{(new - old) / old * 100:+6.1f}%" if old else '     -'
+
+    print(f"\nСравнение с {baseline['meta'].get('revision')} ({baseline['meta'].get('products')} товаров):")
+    print(f"{'маршрут':<45} {'rps':>10} {'p95':>9} {'p99':>9}")
+    rows = [('ВСЕГО', result['total'], baseline['total'])]
+    rows += [(route, stats, baseline['routes'][route])
+             for route, stats in result['routes'].items() if route in baseline.get('routes', {})]
+    for route, new, old in rows:
+        print(f"{route:<45} {delta(new['rps'], old['rps']):>10} "
+              f"{delta(new['p95_ms'], old['p95_ms']):>9} {delta(new['p99_ms'], old['p99_ms']):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=1000, help='размер каталога: 1000, 100000, 1000000')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0, help='секунд замера')
+    parser.add_argument('--warmup', type=float, default=2.0, help='секунд прогрева')
+    parser.add_argument('--port', type=int, default=0, help='0 - свободный порт')
+    parser.add_argument('--routes', nargs='+', default=list(ROUTES))
+    parser.add_argument('--output', help='куда записать JSON (по умолчанию - stdout)')
+    parser.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    db_path = cached_catalog(args.products, args.seed)
+    print(f"Каталог {args.products} товаров: {db_path} ({time.perf_counter() - started:.1f} с)", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = asyncio.run(run(args, db_path, os.path.join(tmp, 'img')))
+
+    report = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            compare(result, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
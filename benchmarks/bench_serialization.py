@@ -0,0 +1,59 @@
+"""
+Сериализация страницы /api/products.
+
+Сравнивает три пути на страницах 12/24/100 товаров:
+  legacy    - dict(row) + доработка полей + json.dumps на каждый запрос
+  payload   - готовые словари модели каталога + json.dumps на каждый запрос
+  fragments - склейка заранее закодированных фрагментов ProductView
+
+Запуск: python benchmarks/bench_serialization.py
+"""
+
+import json
+import timeit
+
+from synthetic import make_catalog
+
+from core.catalog import PRODUCT_SELECT, ProductView, build_payload, encode_products
+from core.jsonenc import encode_json
+
+PAGE_SIZES = (12, 24, 100)
+REPEAT = 5
+
+
+def envelope(products, limit):
+    return {'success': True, 'products': products, 'total': limit, 'limit': limit, 'offset': 0,
+            'next_cursor': None}
+
+
+def main():
+    conn = make_catalog(':memory:', 500)
+    rows = conn.execute(PRODUCT_SELECT + " ORDER BY p.id LIMIT 100").fetchall()
+    views = [ProductView(dict(row)) for row in rows]
+
+    print(f"{'items':>5} {'legacy, мкс':>12} {'payload, мкс':>13} {'fragments, мкс':>15} {'ускорение':>10}")
+    for size in PAGE_SIZES:
+        page_rows = rows[:size]
+        page_views = views[:size]
+
+        # Результаты должны совпадать по содержимому
+        assert json.loads(encode_json(envelope(encode_products(page_views), size))) == \
+            json.loads(json.dumps(envelope([build_payload(dict(row)) for row in page_rows], size)))
+
+        cases = {
+            'legacy': lambda: json.dumps(envelope([build_payload(dict(row)) for row in page_rows], size)).encode(),
+            'payload': lambda: json.dumps(envelope([view.payload for view in page_views], size)).encode(),
+            'fragments': lambda: encode_json(envelope(encode_products(page_views), size)),
+        }
+        results = {}
+        for name, fn in cases.items():
+            number = max(50, 20000 // size)
+            best = min(timeit.repeat(fn, number=number, repeat=REPEAT))
+            results[name] = best / number * 1e6
+
+        print(f"{size:>5} {results['legacy']:>12.1f} {results['payload']:>13.1f} {results['fragments']:>15.1f} "
+              f"{results['legacy'] / results['fragments']:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
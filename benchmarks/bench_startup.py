@@ -0,0 +1,72 @@
+"""
+Время старта приложения.
+
+Каждый замер - отдельный процесс Python:
+  import      - import StoneWeb (без побочных эффектов)
+  create_app  - сборка приложения (подготовка файлов уже отмечена маркером)
+  first_req   - create_app + хуки старта (проверка схемы, пул БД, каталог,
+                манифест статики) + первый ответ /api/products
+
+Запуск: python benchmarks/bench_startup.py [--products 1000] [--runs 7]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from synthetic import make_catalog
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import StoneWeb
+t1 = time.perf_counter()
+app = StoneWeb.create_app({'db_path': sys.argv[1], 'image_cache_dir': sys.argv[2]})
+t2 = time.perf_counter()
+
+from aiohttp.test_utils import TestClient, TestServer
+
+async def first_request():
+    async with TestClient(TestServer(app)) as client:
+        response = await client.get('/api/products')
+        assert response.status == 200
+        return time.perf_counter()
+
+t3 = asyncio.run(first_request())
+print(json.dumps({'import': t1 - t0, 'create_app': t2 - t1, 'first_req': t3 - t1}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--runs', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'shop.db')
+        make_catalog(db_path, args.products).close()
+
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        samples = {'import': [], 'create_app': [], 'first_req': []}
+        for _ in range(args.runs):
+            out = subprocess.run(
+                [sys.executable, '-c', PROBE, db_path, os.path.join(tmp, 'img')],
+                cwd=ROOT, env=env, capture_output=True, text=True, check=True
+            ).stdout
+            for name, value in json.loads(out.strip().splitlines()[-1]).items():
+                samples[name].append(value * 1000)
+
+    print(f"Товаров: {args.products}, запусков: {args.runs}")
+    for name, values in samples.items():
+        print(f"{name:>11}: медиана {statistics.median(values):7.1f} мс, мин {min(values):7.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
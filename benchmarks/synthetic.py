@@ -0,0 +1,136 @@
+"""
+Синтетический каталог для бенчмарков.
+
+Данные детерминированы: один и тот же count и seed дают одинаковую БД,
+поэтому результаты разных коммитов сравнимы между собой.
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.db import connect  # noqa: E402
+from core.migrations import apply_migrations  # noqa: E402
+
+CATEGORIES = ('sneakers', 'boots', 'sandals', 'accessories')
+SUBCATEGORIES = ('running', 'lifestyle', 'limited')
+BRANDS = ('STONE', 'Nike', 'Adidas', 'Puma', 'New Balance', 'Reebok')
+COLORS = ('Black', 'White', 'Gray', 'Red', 'Blue', 'Black/White')
+SIZES = ('39', '40', '41', '42', '43', '44', '40-45')
+MATERIALS = ('Leather', 'Suede', 'Mesh', 'Leather/Mesh', 'Textile')
+WORDS = ('кроссовки', 'ботинки', 'premium', 'ultra', 'lite', 'кожаные', 'беговые', 'зимние', 'classic')
+WIDGET_TYPES = ('marquee', 'hero', 'info', 'collection')
+
+# Сколько строк вставляется за один executemany (1M товаров не держим в памяти)
+INSERT_CHUNK = 10000
+
+
+def category_rows():
+    """(name, slug, parent_id, sort_order): корневые категории, затем подкатегории"""
+    rows = [(slug.capitalize(), slug, None, index) for index, slug in enumerate(CATEGORIES)]
+    for parent_id, parent in enumerate(CATEGORIES, start=1):
+        for index, sub in enumerate(SUBCATEGORIES):
+            rows.append((f"{parent.capitalize()} {sub}", f"{parent}-{sub}", parent_id, index))
+    return rows
+
+
+def product_rows(count, seed=42, categories=len(CATEGORIES)):
+    """Строки для INSERT INTO products (как в init_store_db)"""
+    rnd = random.Random(seed)
+    for i in range(1, count + 1):
+        price = rnd.randrange(40, 400)
+        compare = price + rnd.randrange(0, 150) if rnd.random() < 0.4 else None
+        name = ' '.join(rnd.sample(WORDS, 2)).capitalize() + f" {i}"
+        yield (
+            name, f"product-{i}", f"Описание товара {i}: " + ' '.join(rnd.sample(WORDS, 4)),
+            price, compare, '/static/images/placeholder.jpg', '["/static/images/placeholder.jpg"]',
+            rnd.randrange(1, categories + 1), rnd.choice(BRANDS), f"SYN-{i:06d}",
+            rnd.choice(COLORS), rnd.choice(SIZES), rnd.choice(MATERIALS),
+            int((compare - price) / compare * 100) if compare else 0,
+            rnd.randrange(0, 50), rnd.random() < 0.05,
+        )
+
+
+def widget_rows(count, seed=42):
+    rnd = random.Random(seed)
+    for i in range(1, count + 1):
+        widget_type = WIDGET_TYPES[(i - 1) % len(WIDGET_TYPES)]
+        yield (
+            widget_type, f"Widget {i}", ' '.join(rnd.sample(WORDS, 5)),
+            '{"speed": 30}' if widget_type == 'marquee' else '{}', i, 0,
+        )
+
+
+def carousel_rows(count):
+    for i in range(1, count + 1):
+        image = f"/static/images/carousel{(i - 1) % 3 + 1}.jpg"
+        yield (f"Slide {i}", f"Подзаголовок {i}", image, '/catalog', 'SHOP NOW', i)
+
+
+def _chunks(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= INSERT_CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def make_catalog(path, count, seed=42, widgets=8, carousel=5):
+    """Создает БД по миграциям и заполняет count товарами; возвращает соединение"""
+    conn = connect(path)
+    apply_migrations(conn)
+    categories = category_rows()
+    conn.executemany(
+        "INSERT INTO categories (name, slug, parent_id, sort_order) VALUES (?, ?, ?, ?)", categories
+    )
+    for chunk in _chunks(product_rows(count, seed, len(categories))):
+        conn.executemany("""
+            INSERT INTO products (name, slug, description, price, compare_at_price, image_url, gallery, category_id,
+                                  brand, sku, color, size, material, discount_percent, quantity, is_featured)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, chunk)
+    conn.executemany("""
+        INSERT INTO web_widgets (widget_type, title, content, config, position, sort_order)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, widget_rows(widgets, seed))
+    conn.executemany("""
+        INSERT INTO carousel_items (title, subtitle, image_url, link_url, button_text, sort_order)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, carousel_rows(carousel))
+    conn.commit()
+    return conn
+
+
+def cached_catalog(count, seed=42, directory=None):
+    """
+    Путь к готовой БД с count товарами.
+
+    Большие каталоги строятся долго, поэтому БД сохраняется во временной
+    папке и переиспользуется; при повторном открытии докатываются новые
+    миграции.
+    """
+    directory = directory or os.path.join(tempfile.gettempdir(), 'stone-bench')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"catalog-{count}-{seed}.db")
+    if os.path.exists(path):
+        conn = connect(path)
+        apply_migrations(conn)
+        conn.close()
+        return path
+
+    building = path + '.building'
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(building + suffix):
+            os.remove(building + suffix)
+    conn = make_catalog(building, count, seed)
+    # Сливаем WAL в основной файл, чтобы переименовать одну БД
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+    os.replace(building, path)
+    return path
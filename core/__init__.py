@@ -0,0 +1,3 @@
+"""
+Инфраструктура Stone WebApp Store: база данных, кэши, служебные подсистемы
+"""
@@ -0,0 +1,59 @@
+"""
+Кэш JSON-ответов API.
+
+Ответ хранится уже закодированным (JSON + gzip-вариант + ETag), поэтому
+повторный запрос не тратит время ни на сериализацию, ни на сжатие.
+Ключ записи включает версию данных (версию модели каталога или счетчик
+из table_versions), так что после изменения данных старые записи просто
+перестают запрашиваться и вытесняются LRU.
+"""
+
+import asyncio
+
+from aiohttp import web
+
+from core.cache import LRUCache
+from core.http import json_body
+
+
+class ApiCache:
+    """Закодированные ответы API по ключу (эндпоинт, версия данных, параметры)"""
+
+    def __init__(self, maxsize=1024):
+        self.cache = LRUCache(maxsize)
+        self._building = {}
+
+    async def get(self, key, build):
+        """Возвращает CachedBody; build() - корутина, возвращающая payload"""
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Одновременные промахи ждут одну сборку ответа
+        future = self._building.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._build(key, build))
+            self._building[key] = future
+            future.add_done_callback(lambda _: self._building.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _build(self, key, build):
+        cached = json_body(await build())
+        self.cache.set(key, cached)
+        return cached
+
+    def stats(self):
+        return {
+            'size': len(self.cache),
+            'hits': self.cache.hits,
+            'misses': self.cache.misses,
+        }
+
+
+API_CACHE_KEY = web.AppKey('api_cache', ApiCache)
+
+
+def setup_api_cache(app, maxsize=1024):
+    cache = ApiCache(maxsize=maxsize)
+    app[API_CACHE_KEY] = cache
+    return cache
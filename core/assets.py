@@ -0,0 +1,165 @@
+"""
+Манифест статических файлов.
+
+При старте обходятся каталоги static/ и WebApp/: для каждого файла
+считается хэш содержимого и строится URL с отпечатком
+(/static/css/main.css -> /static/css/main.3fa2c1d9e0.css). Небольшие файлы
+держатся в памяти вместе с заранее сжатыми gzip/br вариантами, поэтому
+запрос разрешается поиском в словаре без обращений к файловой системе.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+
+from aiohttp import web
+
+from core.http import accepts_gzip, encoded_etag, not_modified
+
+try:
+    import brotli
+except ImportError:  # brotli - необязательная зависимость
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Файлы больше этого размера отдаются с диска через FileResponse
+MAX_MEMORY_SIZE = 512 * 1024
+
+# Сжимаем только текстовые форматы - изображения уже сжаты
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 512
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+class Asset:
+    """Файл из манифеста"""
+
+    __slots__ = ('logical', 'url', 'path', 'content_type', 'etag', 'body', 'gzip', 'br')
+
+    def __init__(self, logical, url, path, content_type, digest, body=None):
+        self.logical = logical
+        self.url = url
+        self.path = path
+        self.content_type = content_type
+        self.etag = f'"{digest}"'
+        self.body = body
+        self.gzip = None
+        self.br = None
+
+        if body is not None and len(body) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            self.gzip = gzip.compress(body, 9)
+            if brotli is not None:
+                self.br = brotli.compress(body)
+
+
+def fingerprint(path, digest):
+    """css/main.css + 3fa2c1d9e0 -> css/main.3fa2c1d9e0.css"""
+    base, ext = os.path.splitext(path)
+    return f"{base}.{digest}{ext}"
+
+
+class AssetManifest:
+    """Логические имена файлов -> URL с отпечатком и содержимое"""
+
+    def __init__(self, roots, placeholder=None):
+        # roots: URL-префикс ('static') -> каталог на диске
+        self.roots = roots
+        self.placeholder = placeholder
+        self.assets = {}
+        self._routes = {}
+
+    def build(self):
+        """Обходит каталоги и строит манифест (вызывается один раз при старте)"""
+        assets = {}
+        routes = {}
+        for prefix, root in self.roots.items():
+            for dirpath, _, filenames in os.walk(root):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    relative = os.path.relpath(path, root).replace(os.sep, '/')
+                    logical = f"{prefix}/{relative}"
+
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    digest = hashlib.sha256(data).hexdigest()[:10]
+                    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                    body = data if len(data) <= MAX_MEMORY_SIZE else None
+
+                    url = '/' + fingerprint(logical, digest)
+                    asset = Asset(logical, url, path, content_type, digest, body)
+                    assets[logical] = asset
+
+                    # Запрос по логическому имени требует перепроверки, по отпечатку - нет
+                    routes[logical] = (asset, REVALIDATE)
+                    routes[url[1:]] = (asset, IMMUTABLE)
+
+        self.assets = assets
+        self._routes = routes
+        logger.info(f"🧾 Манифест статики: {len(assets)} файлов")
+
+    def url(self, name):
+        """URL с отпечатком для логического имени (хелпер asset_url в шаблонах)"""
+        logical = name.lstrip('/')
+        asset = self.assets.get(logical)
+        return asset.url if asset is not None else '/' + logical
+
+    def resolve(self, prefix, path):
+        """(Asset, Cache-Control) по пути запроса или None"""
+        found = self._routes.get(f"{prefix}/{path}")
+        if found is None and self.placeholder and path.lower().endswith(IMAGE_EXTENSIONS):
+            # Для отсутствующих изображений отдаем placeholder
+            asset = self.assets.get(self.placeholder)
+            if asset is not None:
+                found = (asset, REVALIDATE)
+        return found
+
+    def respond(self, request, asset, cache_control):
+        """Ответ с нужным вариантом сжатия и кэшированием"""
+        headers = {'Cache-Control': cache_control}
+
+        if asset.body is None:
+            # Большие файлы: ETag и Range обрабатывает сам FileResponse
+            return web.FileResponse(asset.path, headers=headers)
+
+        headers['ETag'] = asset.etag
+
+        if not_modified(request, asset.etag):
+            return web.Response(status=304, headers=headers)
+
+        body = asset.body
+        if asset.gzip is not None:
+            headers['Vary'] = 'Accept-Encoding'
+            if asset.br is not None and 'br' in request.headers.get('Accept-Encoding', ''):
+                headers['Content-Encoding'] = 'br'
+                headers['ETag'] = encoded_etag(asset.etag, '-br"')
+                body = asset.br
+            elif accepts_gzip(request):
+                headers['Content-Encoding'] = 'gzip'
+                headers['ETag'] = encoded_etag(asset.etag, '-gz"')
+                body = asset.gzip
+
+        return web.Response(body=body, headers=headers, content_type=asset.content_type)
+
+
+ASSETS_KEY = web.AppKey('assets', AssetManifest)
+
+
+def setup_assets(app, roots, placeholder=None, jinja_env=None):
+    """Строит манифест при старте и регистрирует хелпер asset_url в Jinja2"""
+    manifest = AssetManifest(roots, placeholder=placeholder)
+    app[ASSETS_KEY] = manifest
+    if jinja_env is not None:
+        jinja_env.globals['asset_url'] = manifest.url
+
+    async def build_manifest(app):
+        manifest.build()
+
+    app.on_startup.append(build_manifest)
+    return manifest
@@ -0,0 +1,374 @@
+"""
+Серверные корзины покупателей.
+
+Корзины живут в памяти процесса: шарды по владельцу, в каждом шарде
+LRU-порядок и ограничение размера, неактивные корзины устаревают через
+ttl. Измененные корзины раз в snapshot_interval секунд записываются в
+таблицу carts одной транзакцией (и при остановке приложения), а при
+промахе корзина читается оттуда же. Цены и остатки берутся из модели
+каталога в памяти - без запросов к БД на каждую позицию.
+
+Снимки годятся, пока корзину меняет один процесс. При нескольких воркерах
+(SO_REUSEPORT) запросы одного покупателя попадают в разные процессы, и
+несохраненная правка одного затерлась бы снимком другого. Поэтому в
+режиме write_through (включается при STORE_WORKERS > 1) каждое изменение
+сразу читает корзину из БД, правит и записывает ее в одной транзакции, а
+память служит только кэшем для чтения. Когда carts меняет другой процесс,
+наблюдатель изменений сообщает об этом, и неизмененные корзины
+перечитываются из БД.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from aiohttp import web
+
+from core.catalog import CATALOG_KEY
+from core.changes import CHANGES_KEY
+from core.db import DB_KEY, on_db_close
+
+logger = logging.getLogger(__name__)
+
+MAX_ITEM_QUANTITY = 99
+MAX_CART_ITEMS = 100
+
+
+class CartError(ValueError):
+    """Операцию с корзиной нельзя выполнить (товар недоступен, нет остатка)"""
+
+
+class Cart:
+    __slots__ = ('owner', 'items', 'updated_at', 'touched')
+
+    def __init__(self, owner, items=None, updated_at=None):
+        self.owner = owner
+        # product_id -> количество, в порядке добавления
+        self.items = items or {}
+        self.updated_at = updated_at or time.time()
+        self.touched = time.monotonic()
+
+
+def _carts_version(conn):
+    return conn.execute("SELECT version FROM table_versions WHERE name = 'carts'").fetchone()[0]
+
+
+def _cart_from_row(owner, row, ttl):
+    if row is not None and row['updated_at'] >= time.time() - ttl:
+        try:
+            return Cart(owner, {int(pid): qty for pid, qty in json.loads(row['items']).items()},
+                        row['updated_at'])
+        except (TypeError, ValueError) as e:
+            logger.error(f"Ошибка чтения корзины {owner}: {e}")
+    return Cart(owner)
+
+
+def _clear(cart):
+    if not cart.items:
+        return False
+    cart.items = {}
+    return True
+
+
+def _write_snapshot(conn, upserts, deletes, expire_before):
+    # IMMEDIATE: версия до записи и сама запись - без вклинившихся процессов
+    conn.execute("BEGIN IMMEDIATE")
+    before = _carts_version(conn)
+    conn.executemany("""
+        INSERT INTO carts (owner, items, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT (owner) DO UPDATE SET items = excluded.items, updated_at = excluded.updated_at
+    """, upserts)
+    conn.executemany("DELETE FROM carts WHERE owner = ?", [(owner,) for owner in deletes])
+    conn.execute("DELETE FROM carts WHERE updated_at < ?", (expire_before,))
+    # Версия после собственной записи - чтобы не сбрасывать кэш из-за себя
+    return before, _carts_version(conn)
+
+
+def _change_stored(conn, owner, change, ttl):
+    """Режим write_through: корзина читается, меняется и записывается в одной транзакции"""
+    conn.execute("BEGIN IMMEDIATE")
+    before = _carts_version(conn)
+    row = conn.execute("SELECT items, updated_at FROM carts WHERE owner = ?", (owner,)).fetchone()
+    cart = _cart_from_row(owner, row, ttl)
+    if change(cart):
+        cart.updated_at = time.time()
+        if cart.items:
+            conn.execute("""
+                INSERT INTO carts (owner, items, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (owner) DO UPDATE SET items = excluded.items, updated_at = excluded.updated_at
+            """, (owner, json.dumps(cart.items), cart.updated_at))
+        else:
+            conn.execute("DELETE FROM carts WHERE owner = ?", (owner,))
+    return cart, before, _carts_version(conn)
+
+
+class CartStore:
+    """Шардированное хранилище корзин с TTL/LRU-вытеснением и пакетными снимками"""
+
+    def __init__(self, db, catalog, watcher, shards=16, max_carts=100_000, ttl=30 * 24 * 3600,
+                 snapshot_interval=10.0, write_through=False):
+        self.db = db
+        self.catalog = catalog
+        self.watcher = watcher
+        self.ttl = ttl
+        self.snapshot_interval = snapshot_interval
+        self.write_through = write_through
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._shard_size = max(1, max_carts // shards)
+        self._dirty = {}
+        self._loading = {}
+        self._own_version = None
+        self._task = None
+        self._snapshot_lock = asyncio.Lock()
+        watcher.subscribe(('carts',), self.on_change)
+
+    def _shard(self, owner):
+        return self._shards[hash(owner) % len(self._shards)]
+
+    # ---------- память ----------
+
+    def _remember(self, cart):
+        shard = self._shard(cart.owner)
+        shard[cart.owner] = cart
+        shard.move_to_end(cart.owner)
+
+        now = time.monotonic()
+        while shard:
+            owner, oldest = next(iter(shard.items()))
+            if len(shard) <= self._shard_size and now - oldest.touched <= self.ttl:
+                break
+            # Вытесняемая корзина с несохраненными изменениями уйдет ближайшим снимком
+            shard.popitem(last=False)
+
+    def _forget_clean(self):
+        # Неизмененные корзины перечитаются из БД при следующем обращении
+        for shard in self._shards:
+            for owner in [owner for owner in shard if owner not in self._dirty]:
+                del shard[owner]
+
+    def _wrote(self, before, after):
+        """
+        Учитывает собственную запись: версия carts до нее и после. False -
+        результат устарел (позже уже зафиксирована другая наша запись).
+        """
+        if self._own_version is not None and after < self._own_version:
+            return False
+        if before != self._own_version:
+            # Между нашими записями carts менял другой процесс
+            self._forget_clean()
+        self._own_version = after
+        return True
+
+    async def on_change(self, changed):
+        if self.watcher.version('carts') == self._own_version:
+            return
+        self._forget_clean()
+
+    async def get(self, owner):
+        cart = self._shard(owner).get(owner)
+        if cart is not None:
+            cart.touched = time.monotonic()
+            self._shard(owner).move_to_end(owner)
+            return cart
+        cart = self._dirty.get(owner)
+        if cart is not None:
+            self._remember(cart)
+            return cart
+
+        # Одновременные промахи ждут одно чтение, иначе изменения затрут друг друга
+        future = self._loading.get(owner)
+        if future is None:
+            future = asyncio.ensure_future(self._load(owner))
+            self._loading[owner] = future
+            future.add_done_callback(lambda _: self._loading.pop(owner, None))
+        return await asyncio.shield(future)
+
+    async def _load(self, owner):
+        row = await self.db.fetch_one("SELECT items, updated_at FROM carts WHERE owner = ?", (owner,))
+        cart = _cart_from_row(owner, row, self.ttl)
+        # Пока шло чтение, корзину могли изменить
+        current = self._shard(owner).get(owner) or self._dirty.get(owner)
+        if current is not None:
+            return current
+        self._remember(cart)
+        return cart
+
+    def _changed(self, cart):
+        cart.updated_at = time.time()
+        self._dirty[cart.owner] = cart
+
+    async def _change(self, owner, change):
+        """change(cart) правит корзину и возвращает True, если она изменилась"""
+        if self.write_through:
+            cart, before, after = await self.db.transaction(_change_stored, owner, change, self.ttl)
+            if self._wrote(before, after):
+                self._remember(cart)
+            return cart
+        cart = await self.get(owner)
+        if change(cart):
+            self._changed(cart)
+        return cart
+
+    # ---------- операции ----------
+
+    def _available(self, product_id):
+        view = self.catalog.get(product_id)
+        if view is None:
+            raise CartError('Товар недоступен')
+        return min(view.quantity or 0, MAX_ITEM_QUANTITY)
+
+    def _set(self, cart, product_id, quantity):
+        available = self._available(product_id)
+        if quantity > available:
+            raise CartError(f'Недостаточно товара на складе (доступно {available})')
+        if product_id not in cart.items and len(cart.items) >= MAX_CART_ITEMS:
+            raise CartError('Слишком много позиций в корзине')
+        cart.items[product_id] = quantity
+        return True
+
+    async def add(self, owner, product_id, quantity=1):
+        if quantity < 1:
+            raise CartError('Некорректное количество')
+        return await self._change(
+            owner, lambda cart: self._set(cart, product_id, cart.items.get(product_id, 0) + quantity))
+
+    async def update(self, owner, product_id, quantity):
+        if quantity <= 0:
+            return await self.remove(owner, product_id)
+        return await self._change(owner, lambda cart: self._set(cart, product_id, quantity))
+
+    async def remove(self, owner, product_id):
+        return await self._change(owner, lambda cart: cart.items.pop(product_id, None) is not None)
+
+    async def clear(self, owner):
+        return await self._change(owner, _clear)
+
+    async def merge(self, owner, items=(), source=None):
+        """
+        Добавляет в корзину owner позиции items [(product_id, quantity)] и
+        корзину владельца source (она очищается). Недоступные товары
+        пропускаются, количество ограничивается остатком.
+        """
+        items = list(items)
+        if source is not None and source != owner:
+            def take(cart):
+                items.extend(cart.items.items())
+                return _clear(cart)
+            await self._change(source, take)
+
+        def add_items(cart):
+            for product_id, quantity in items:
+                try:
+                    available = self._available(product_id)
+                except CartError:
+                    continue
+                merged = min(available, cart.items.get(product_id, 0) + max(0, quantity))
+                if merged <= 0:
+                    continue
+                if product_id not in cart.items and len(cart.items) >= MAX_CART_ITEMS:
+                    continue
+                cart.items[product_id] = merged
+            return True
+
+        return await self._change(owner, add_items)
+
+    def describe(self, cart):
+        """Корзина для API с актуальными ценами и остатками из каталога"""
+        items = []
+        total = 0
+        count = 0
+        for product_id, quantity in cart.items.items():
+            view = self.catalog.get(product_id)
+            if view is None:
+                items.append({'id': product_id, 'quantity': quantity, 'available': 0, 'unavailable': True})
+                continue
+            product = view.payload
+            line_total = view.price * quantity
+            items.append({
+                'id': product_id,
+                'name': product['name'],
+                'brand': product['brand'],
+                'image': product['main_image'],
+                'price': view.price,
+                'price_formatted': product['price_formatted'],
+                'quantity': quantity,
+                'available': view.quantity,
+                'line_total': line_total,
+            })
+            total += line_total
+            count += quantity
+        return {'items': items, 'total': total, 'count': count}
+
+    # ---------- снимки ----------
+
+    async def snapshot(self):
+        """Записывает измененные корзины одной транзакцией"""
+        async with self._snapshot_lock:
+            dirty, self._dirty = self._dirty, {}
+            upserts = []
+            deletes = []
+            for owner, cart in dirty.items():
+                if cart.items:
+                    upserts.append((owner, json.dumps(cart.items), cart.updated_at))
+                else:
+                    deletes.append(owner)
+            try:
+                before, after = await self.db.transaction(
+                    _write_snapshot, upserts, deletes, time.time() - self.ttl
+                )
+            except Exception as e:
+                logger.error(f"Ошибка сохранения корзин: {e}")
+                # Не теряем изменения: более свежие правки уже могли попасть в _dirty
+                for owner, cart in dirty.items():
+                    self._dirty.setdefault(owner, cart)
+                return 0
+            self._wrote(before, after)
+            return len(dirty)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            await self.snapshot()
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.snapshot()
+
+    def stats(self):
+        return {
+            'carts': sum(len(shard) for shard in self._shards),
+            'dirty': len(self._dirty),
+            'write_through': self.write_through,
+        }
+
+
+CARTS_KEY = web.AppKey('carts', CartStore)
+
+
+def setup_carts(app, ttl=30 * 24 * 3600, snapshot_interval=10.0, write_through=False):
+    """write_through=True обязательно, если корзины меняют несколько процессов"""
+    carts = CartStore(app[DB_KEY], app[CATALOG_KEY], app[CHANGES_KEY], ttl=ttl,
+                      snapshot_interval=snapshot_interval, write_through=write_through)
+    app[CARTS_KEY] = carts
+
+    async def start_carts(app):
+        carts.start()
+
+    async def stop_carts(app):
+        await carts.stop()
+
+    app.on_startup.append(start_carts)
+    # Последний снимок - после обработчиков запросов, но до закрытия пула БД
+    on_db_close(app, stop_carts)
+    return carts
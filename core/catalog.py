@@ -0,0 +1,354 @@
+"""
+Модель чтения каталога.
+
+Активные товары в наличии загружаются в память один раз вместе с уже
+посчитанными производными полями (placeholder, форматированные цены,
+скидка). При изменении таблицы products перечитываются только измененные
+строки; при изменении категорий модель перестраивается целиком.
+
+Выдача по категории включает товары всех ее подкатегорий: списки по
+категориям строятся сразу для каждого предка (см. core.categories).
+"""
+
+import asyncio
+import base64
+import json
+import logging
+
+from aiohttp import web
+
+from core.categories import CategoryTree, read_categories
+from core.changes import CHANGES_KEY
+from core.db import DB_KEY
+from core.facets import FacetIndex, mask_from_positions
+from core.images import variant_url
+from core.jsonenc import RawJSON, dumps, join_array
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_IMAGE = '/static/images/placeholder.jpg'
+# Размер превью в карточках каталога (0 - по пропорциям)
+THUMBNAIL_SIZE = (400, 0)
+
+PRODUCT_SELECT = """
+    SELECT p.id, p.name, p.slug, p.description, p.price, p.compare_at_price,
+           p.image_url, p.gallery, p.brand, p.discount_percent, p.quantity,
+           p.color, p.size, p.material, p.is_featured,
+           c.name as category_name,
+           c.slug as category_slug, p.category_id, p.sku, p.is_active,
+           p.views, p.created_at, p.updated_at
+    FROM products p
+    LEFT JOIN categories c ON p.category_id = c.id
+"""
+
+# Поля, которые отдаются клиенту в /api/products
+PAYLOAD_FIELDS = (
+    'id', 'name', 'slug', 'description', 'price', 'compare_at_price',
+    'image_url', 'gallery', 'brand', 'discount_percent', 'quantity',
+    'color', 'size', 'material', 'is_featured', 'category_name',
+)
+
+
+def build_payload(row):
+    """Готовит словарь товара для API (логика прежнего api_products)"""
+    product = {field: row[field] for field in PAYLOAD_FIELDS}
+
+    # Обработка изображений - используем placeholder если нет изображения
+    if not product.get('image_url') or product['image_url'] == 'None':
+        product['image_url'] = PLACEHOLDER_IMAGE
+
+    # Основное изображение и превью (внешние URL остаются как есть)
+    product['main_image'] = product['image_url']
+    product['thumbnail'] = variant_url(product['main_image'], *THUMBNAIL_SIZE)
+
+    # Форматируем цены
+    price = float(product.get('price') or 0)
+    product['price_formatted'] = f"${price:.0f}"
+
+    if product.get('compare_at_price'):
+        compare_price = float(product['compare_at_price'])
+        product['compare_price_formatted'] = f"${compare_price:.0f}"
+
+        # Рассчитываем скидку
+        if compare_price > price:
+            discount = ((compare_price - price) / compare_price) * 100
+            product['discount_percent'] = int(discount)
+
+    return product
+
+
+class ProductView:
+    """Компактное представление товара в памяти"""
+
+    __slots__ = (
+        'id', 'category_id', 'category_slug', 'brand', 'color', 'size',
+        'material', 'price', 'discount_percent', 'quantity', 'is_featured',
+        'views', 'created_at', 'payload', '_fragment',
+    )
+
+    def __init__(self, row):
+        self.id = row['id']
+        self.category_id = row['category_id']
+        self.category_slug = row['category_slug']
+        self.brand = row['brand']
+        self.color = row['color']
+        self.size = row['size']
+        self.material = row['material']
+        self.price = float(row['price'] or 0)
+        self.quantity = row['quantity']
+        self.is_featured = bool(row['is_featured'])
+        self.views = row['views'] or 0
+        self.created_at = row['created_at'] or ''
+        self.payload = build_payload(row)
+        self.discount_percent = self.payload['discount_percent'] or 0
+        self._fragment = None
+
+    @property
+    def fragment(self):
+        """payload, закодированный в JSON (кодируется при первом обращении)"""
+        if self._fragment is None:
+            self._fragment = RawJSON(dumps(self.payload))
+        return self._fragment
+
+    @property
+    def sort_key(self):
+        # ORDER BY is_featured DESC, created_at DESC, id DESC
+        return (self.is_featured, self.created_at, self.id)
+
+
+def encode_products(views):
+    """JSON-массив товаров, склеенный из готовых фрагментов"""
+    return join_array([view.fragment for view in views])
+
+
+def encode_cursor(view):
+    """Непрозрачный курсор keyset-пагинации по позиции товара в выдаче"""
+    raw = json.dumps([int(view.is_featured), view.created_at, view.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор; ValueError если курсор поврежден"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        is_featured, created_at, product_id = json.loads(raw)
+        return (bool(is_featured), str(created_at), int(product_id))
+    except Exception:
+        raise ValueError("Некорректный курсор")
+
+
+def _position_after(items, key):
+    """Индекс первого товара строго после key в списке, отсортированном по убыванию"""
+    lo, hi = 0, len(items)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if items[mid].sort_key < key:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+def _is_listed(row):
+    return bool(row['is_active']) and (row['quantity'] or 0) > 0
+
+
+def _read_all(conn):
+    return [dict(row) for row in conn.execute(PRODUCT_SELECT)], read_categories(conn)
+
+
+def _read_delta(conn, updated_since):
+    rows = conn.execute(PRODUCT_SELECT + " WHERE p.updated_at >= ?", (updated_since,))
+    total = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    return [dict(row) for row in rows], total
+
+
+class CatalogReadModel:
+    """Каталог активных товаров в памяти с инкрементальным обновлением"""
+
+    def __init__(self, db):
+        self.db = db
+        self.version = 0
+        # Меняется при обновлении просмотров (влияет только на сортировку popular)
+        self.views_version = 0
+        self.loaded = False
+        self.tree = CategoryTree()
+        self._by_id = {}
+        self._known_ids = set()
+        self._updated_at = ''
+        self._ordered = []
+        self._by_category = {}
+        self._featured_counts = {}
+        self._facets = None
+        self._facets_task = None
+        self._listeners = []
+
+    def __len__(self):
+        return len(self._ordered)
+
+    def subscribe(self, callback):
+        """callback(ids) после обновления: множество id измененных товаров или None при полной перезагрузке"""
+        self._listeners.append(callback)
+
+    def _notify(self, ids):
+        for callback in self._listeners:
+            callback(ids)
+
+    def get(self, product_id):
+        return self._by_id.get(product_id)
+
+    def products(self):
+        """Все товары в порядке выдачи"""
+        return self._ordered
+
+    async def facets(self):
+        """Битовый индекс фасетов для текущей версии каталога (строится в потоке)"""
+        if self._facets is not None and self._facets.version == self.version:
+            return self._facets
+
+        # Одновременные запросы ждут одну и ту же сборку
+        task = self._facets_task
+        if task is None or task.version != self.version:
+            task = asyncio.ensure_future(asyncio.to_thread(FacetIndex, self._ordered, self.version, self.tree))
+            task.version = self.version
+            self._facets_task = task
+        index = await task
+        if index.version == self.version:
+            self._facets = index
+        return index
+
+    # ---------- загрузка ----------
+
+    def _apply(self, rows):
+        for row in rows:
+            self._known_ids.add(row['id'])
+            if row['updated_at'] and row['updated_at'] > self._updated_at:
+                self._updated_at = row['updated_at']
+            if _is_listed(row):
+                self._by_id[row['id']] = ProductView(row)
+            else:
+                self._by_id.pop(row['id'], None)
+
+    def _rebuild(self):
+        ordered = sorted(self._by_id.values(), key=lambda v: v.sort_key, reverse=True)
+        # Товар попадает в списки своей категории и всех ее предков; порядок
+        # выдачи сохраняется, потому что товары перебираются уже отсортированными
+        lineage = self.tree.lineage
+        by_category = {}
+        for view in ordered:
+            if view.category_slug:
+                for slug in lineage(view.category_slug):
+                    by_category.setdefault(slug, []).append(view)
+
+        # Рекомендуемые товары идут первыми - достаточно знать длину префикса
+        featured_counts = {None: sum(1 for v in ordered if v.is_featured)}
+        for slug, views in by_category.items():
+            featured_counts[slug] = sum(1 for v in views if v.is_featured)
+
+        self._ordered = ordered
+        self._by_category = by_category
+        self._featured_counts = featured_counts
+        self.version += 1
+
+    async def reload(self):
+        """Полная перезагрузка каталога"""
+        rows, categories = await self.db.run(_read_all)
+        self.tree = CategoryTree(categories)
+        self._by_id = {}
+        self._known_ids = set()
+        self._updated_at = ''
+        self._apply(rows)
+        self._rebuild()
+        self.loaded = True
+        self._notify(None)
+        logger.info(f"📦 Каталог загружен в память: {len(self._ordered)} товаров, {len(self.tree)} категорий")
+
+    async def refresh(self):
+        """Перечитывает только измененные с прошлой загрузки товары"""
+        if not self.loaded:
+            return await self.reload()
+
+        rows, total = await self.db.run(_read_delta, self._updated_at)
+        self._apply(rows)
+        if total != len(self._known_ids):
+            # Строки удалялись - дельтой это не поймать
+            return await self.reload()
+        if rows:
+            self._rebuild()
+            # Все перечитанные строки: карточкам товаров важны и название, и
+            # описание, и снятые с продажи товары
+            self._notify({row['id'] for row in rows})
+
+    async def apply_views(self, totals):
+        """Новые значения просмотров {id: views} после сброса счетчика"""
+        for product_id, views in totals.items():
+            view = self._by_id.get(product_id)
+            if view is not None:
+                view.views = views
+
+        index = self._facets
+        if index is not None and index.version == self.version:
+            await asyncio.to_thread(index.resort, 'popular')
+        # Только после пересортировки: иначе ответ со старым порядком
+        # закэшировался бы под новой версией
+        self.views_version += 1
+
+    async def on_change(self, changed):
+        if 'categories' in changed:
+            await self.reload()
+        else:
+            await self.refresh()
+
+    # ---------- запросы ----------
+
+    def count(self, category=None):
+        """Число товаров в выдаче категории вместе с подкатегориями"""
+        return len(self._by_category.get(category, ())) if category else len(self._ordered)
+
+    def query(self, category=None, featured=False, limit=12, offset=0, after=None):
+        """
+        Страница товаров в порядке is_featured DESC, created_at DESC.
+        category - slug категории; в выдачу входят и ее подкатегории.
+
+        Если передан курсор after, offset отсчитывается от позиции курсора,
+        которая находится бинарным поиском - глубина страницы не важна.
+        Возвращает (ProductView страницы, курсор следующей страницы или None).
+        """
+        items = self._by_category.get(category, []) if category else self._ordered
+        if featured:
+            items = items[:self._featured_counts.get(category, 0)]
+        if after:
+            offset += _position_after(items, decode_cursor(after))
+
+        page = items[offset:offset + limit]
+        next_cursor = None
+        if page and offset + limit < len(items):
+            next_cursor = encode_cursor(page[-1])
+        return page, next_cursor
+
+    async def query_sorted(self, sort_by, category=None, featured=False, limit=12, offset=0):
+        """
+        Страница товаров в порядке SORTS[sort_by] из индекса фасетов (popular -
+        по просмотрам, пересортированным в apply_views). Курсоры считаются
+        по порядку выдачи по умолчанию, поэтому здесь только offset.
+        """
+        index = await self.facets()
+        mask = index.all
+        if category:
+            mask &= index.facet_mask('category', [category])
+        if featured:
+            mask &= mask_from_positions(
+                [pos for pos, view in enumerate(index.views) if view.is_featured], index.size
+            )
+        return index.page(mask, sort_by=sort_by, offset=offset, limit=limit)
+
+
+CATALOG_KEY = web.AppKey('catalog', CatalogReadModel)
+
+
+def setup_catalog(app):
+    """Подключает модель каталога; загрузка происходит при первой проверке изменений"""
+    catalog = CatalogReadModel(app[DB_KEY])
+    app[CATALOG_KEY] = catalog
+    app[CHANGES_KEY].subscribe(('products', 'categories'), catalog.on_change)
+    return catalog
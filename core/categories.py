@@ -0,0 +1,138 @@
+"""
+Дерево категорий в памяти.
+
+categories.parent_id задает дерево; обходом в глубину (дети по sort_order,
+name) каждая категория получает интервал [enter, leave) в эйлеровом
+порядке, и ее поддерево - это срез порядка по этому интервалу. Срезы,
+пути от корня (хлебные крошки) и глубины считаются при построении, так
+что на запросе потомки и предки категории - одно обращение к словарю,
+без рекурсивных CTE.
+
+Категорий единицы-сотни, поэтому при их изменении дерево строится заново
+целиком из одного SELECT - это дешевле, чем поддерживать интервалы при
+каждой вставке.
+"""
+
+CATEGORY_SELECT = "SELECT id, name, slug, parent_id, sort_order FROM categories"
+
+
+class CategoryNode:
+    __slots__ = ('id', 'name', 'slug', 'parent_id', 'sort_order', 'depth', 'enter', 'leave')
+
+    def __init__(self, row):
+        self.id = row['id']
+        self.name = row['name']
+        self.slug = row['slug']
+        self.parent_id = row['parent_id']
+        self.sort_order = row['sort_order'] or 0
+        self.depth = 0
+        self.enter = 0
+        self.leave = 0
+
+
+def read_categories(conn):
+    return [dict(row) for row in conn.execute(CATEGORY_SELECT)]
+
+
+class CategoryTree:
+    """Неизменяемый снимок дерева категорий"""
+
+    def __init__(self, rows=()):
+        nodes = {row['id']: CategoryNode(row) for row in rows}
+        children = {}
+        roots = []
+        for node in nodes.values():
+            if node.parent_id in nodes and node.parent_id != node.id:
+                children.setdefault(node.parent_id, []).append(node)
+            else:
+                roots.append(node)
+
+        def ordered(items):
+            return sorted(items, key=lambda n: (n.sort_order, n.name or '', n.id))
+
+        # Итеративный обход в глубину; узлы в цикле parent_id, недостижимые
+        # из корней, становятся корнями
+        order = []
+        visited = set()
+        root_ids = {node.id for node in roots}
+        pending = ordered(roots) + ordered(n for n in nodes.values() if n.id not in root_ids)
+        for root in pending:
+            if root.id in visited:
+                continue
+            root.depth = 0
+            stack = [(root, False)]
+            while stack:
+                node, done = stack.pop()
+                if done:
+                    node.leave = len(order)
+                    continue
+                if node.id in visited:
+                    continue
+                visited.add(node.id)
+                node.enter = len(order)
+                order.append(node)
+                stack.append((node, True))
+                for child in reversed(ordered(children.get(node.id, ()))):
+                    if child.id not in visited:
+                        child.depth = node.depth + 1
+                        stack.append((child, False))
+
+        self.order = order
+        self._by_slug = {node.slug: node for node in order}
+        self._by_id = nodes
+        # Слаги поддерева (включая саму категорию) и путь от корня
+        self._subtree = {node.slug: tuple(n.slug for n in order[node.enter:node.leave]) for node in order}
+        self._path = {}
+        for node in order:
+            # Глубина больше нуля - узел пришел в обход от родителя, путь родителя уже посчитан
+            prefix = self._path[nodes[node.parent_id].slug] if node.depth else ()
+            self._path[node.slug] = prefix + (node,)
+        self._lineage = {slug: tuple(n.slug for n in path) for slug, path in self._path.items()}
+        self._children = {}
+        for node in order:
+            if node.depth:
+                self._children.setdefault(nodes[node.parent_id].slug, []).append(node.slug)
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, slug):
+        return slug in self._by_slug
+
+    def get(self, slug):
+        return self._by_slug.get(slug)
+
+    def by_id(self, category_id):
+        return self._by_id.get(category_id)
+
+    def parent(self, slug):
+        """Слаг родительской категории или None"""
+        path = self._path.get(slug, ())
+        return path[-2].slug if len(path) > 1 else None
+
+    def children(self, slug):
+        """Слаги прямых подкатегорий в порядке сортировки"""
+        return self._children.get(slug, ())
+
+    def subtree(self, slug):
+        """Слаги категории и всех ее потомков (для неизвестной категории - только она сама)"""
+        return self._subtree.get(slug, (slug,))
+
+    def path(self, slug):
+        """Узлы от корня до категории включительно (хлебные крошки)"""
+        return self._path.get(slug, ())
+
+    def lineage(self, slug):
+        """Слаги от корня до категории включительно (для неизвестной категории - только она сама)"""
+        return self._lineage.get(slug, (slug,))
+
+    def is_descendant(self, slug, ancestor):
+        """slug лежит в поддереве ancestor (включая равенство)"""
+        node = self._by_slug.get(slug)
+        top = self._by_slug.get(ancestor)
+        if node is None or top is None:
+            return slug == ancestor
+        return top.enter <= node.enter < top.leave
+
+    def breadcrumbs(self, slug):
+        return [{'slug': node.slug, 'name': node.name} for node in self.path(slug)]
@@ -0,0 +1,155 @@
+"""
+Отслеживание изменений данных.
+
+Триггеры в БД увеличивают счетчик в table_versions при любом изменении
+отслеживаемых таблиц. Наблюдатель держит собственное соединение и дешево
+опрашивает PRAGMA data_version; счетчики перечитываются только когда
+другое соединение действительно что-то зафиксировало.
+"""
+
+import asyncio
+import logging
+import threading
+
+from aiohttp import web
+
+from core.db import DB_KEY, connect
+
+logger = logging.getLogger(__name__)
+
+TRACKED_TABLES = ('products', 'categories', 'web_widgets', 'carousel_items')
+
+# Колонки товара, изменение которых видно покупателю (views сюда не входит)
+PRODUCT_COLUMNS = (
+    'name', 'slug', 'description', 'price', 'compare_at_price', 'image_url',
+    'gallery', 'category_id', 'brand', 'sku', 'color', 'size', 'material',
+    'discount_percent', 'quantity', 'is_featured', 'is_active',
+)
+
+
+def track_table(cursor, table, columns=None):
+    """Триггеры версии для таблицы; columns - только эти колонки считаются изменением"""
+    cursor.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)", (table,))
+
+    bump = f"UPDATE table_versions SET version = version + 1 WHERE name = '{table}';"
+    update_of = f" OF {', '.join(columns)}" if columns else ''
+    for event in ('INSERT', f'UPDATE{update_of}', 'DELETE'):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_version_{event.split()[0].lower()}
+            AFTER {event} ON {table}
+            BEGIN {bump} END
+        """)
+
+
+def create_change_tracking(cursor):
+    """Создает таблицу версий и триггеры, поддерживающие ее в актуальном состоянии"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name VARCHAR(50) PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for table in TRACKED_TABLES:
+        track_table(cursor, table, PRODUCT_COLUMNS if table == 'products' else None)
+
+    # updated_at товара обновляется автоматически - по нему читается дельта
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS products_touch_updated_at
+        AFTER UPDATE OF {', '.join(PRODUCT_COLUMNS)} ON products
+        WHEN NEW.updated_at IS OLD.updated_at
+        BEGIN
+            UPDATE products SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+        END
+    """)
+
+
+class ChangeWatcher:
+    """Фоновый наблюдатель за версиями таблиц"""
+
+    def __init__(self, path, interval=0.5):
+        self.path = path
+        self.interval = interval
+        self.versions = {}
+        self._conn = None
+        self._data_version = None
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._task = None
+
+    def subscribe(self, tables, callback):
+        """Регистрирует async callback(changed_tables) на изменения таблиц"""
+        self._subscribers.append((frozenset(tables), callback))
+
+    def version(self, table):
+        return self.versions.get(table, 0)
+
+    def _poll(self, force):
+        with self._lock:
+            if self._conn is None:
+                self._conn = connect(self.path)
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if not force and data_version == self._data_version:
+                return None
+            self._data_version = data_version
+            return dict(self._conn.execute("SELECT name, version FROM table_versions").fetchall())
+
+    async def check(self, force=False):
+        """Проверяет изменения и уведомляет подписчиков; возвращает измененные таблицы"""
+        versions = await asyncio.to_thread(self._poll, force)
+        if versions is None:
+            return set()
+
+        changed = {name for name, version in versions.items() if self.versions.get(name) != version}
+        self.versions = versions
+        if changed:
+            for tables, callback in self._subscribers:
+                if tables & changed:
+                    try:
+                        await callback(changed)
+                    except Exception as e:
+                        logger.error(f"Ошибка обработчика изменений: {e}")
+        return changed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Ошибка проверки изменений БД: {e}")
+
+    async def start(self):
+        await self.check(force=True)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+CHANGES_KEY = web.AppKey('changes', ChangeWatcher)
+
+
+def setup_changes(app, interval=0.5):
+    """Подключает наблюдатель изменений к жизненному циклу приложения"""
+    watcher = ChangeWatcher(app[DB_KEY].path, interval=interval)
+    app[CHANGES_KEY] = watcher
+
+    async def start_watcher(app):
+        await watcher.start()
+
+    async def stop_watcher(app):
+        await watcher.stop()
+
+    app.on_startup.append(start_watcher)
+    app.on_shutdown.append(stop_watcher)
+    return watcher
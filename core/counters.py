@@ -0,0 +1,157 @@
+"""
+Счетчик просмотров товаров с отложенной записью.
+
+Просмотр только увеличивает счетчик в памяти: счетчики разбиты на шарды
+по id товара, у каждого шарда своя блокировка, а сброс забирает шард
+целиком заменой словаря. Накопленные приращения записываются одной
+транзакцией раз в interval секунд или как только набралось max_pending
+событий; при остановке приложения выполняется последний сброс.
+"""
+
+import asyncio
+import logging
+import threading
+
+from aiohttp import web
+
+from core.catalog import CATALOG_KEY
+from core.db import DB_KEY, on_db_close
+
+logger = logging.getLogger(__name__)
+
+UPDATE_VIEWS_SQL = "UPDATE products SET views = views + ? WHERE id = ? RETURNING views"
+
+
+def _write_views(conn, items):
+    """Одна транзакция на весь пакет; возвращает {id: итоговое значение views}"""
+    totals = {}
+    for product_id, count in items:
+        row = conn.execute(UPDATE_VIEWS_SQL, (count, product_id)).fetchone()
+        if row is not None:
+            totals[product_id] = row[0]
+    return totals
+
+
+class _Shard:
+    __slots__ = ('lock', 'counts')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+
+class ViewCounter:
+    """Агрегирует просмотры в памяти и пакетно сбрасывает их в БД"""
+
+    def __init__(self, db, shards=16, interval=5.0, max_pending=1000, on_flush=None):
+        self.db = db
+        self.interval = interval
+        self.max_pending = max_pending
+        # on_flush(totals) - получает итоговые значения views после записи
+        self.on_flush = on_flush
+        self._shards = [_Shard() for _ in range(shards)]
+        self._pending = 0
+        self._wakeup = None
+        self._task = None
+        self._flush_lock = asyncio.Lock()
+        self.flushed = 0
+        self.flushes = 0
+
+    def _add(self, product_id, count):
+        shard = self._shards[product_id % len(self._shards)]
+        with shard.lock:
+            shard.counts[product_id] = shard.counts.get(product_id, 0) + count
+        self._pending += count
+
+    def hit(self, product_id, count=1):
+        """Учитывает просмотр товара (без обращения к БД)"""
+        self._add(product_id, count)
+        if self._pending >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _drain(self):
+        """Забирает накопленные приращения из всех шардов"""
+        merged = {}
+        for shard in self._shards:
+            with shard.lock:
+                counts, shard.counts = shard.counts, {}
+            merged.update(counts)
+        self._pending = 0
+        return merged
+
+    async def flush(self):
+        """Записывает накопленные приращения одной транзакцией"""
+        async with self._flush_lock:
+            counts = self._drain()
+            if not counts:
+                return 0
+            try:
+                totals = await self.db.transaction(_write_views, sorted(counts.items()))
+            except Exception as e:
+                # Возвращаем приращения обратно - они уйдут следующим сбросом
+                logger.error(f"Ошибка записи просмотров: {e}")
+                for product_id, count in counts.items():
+                    self._add(product_id, count)
+                return 0
+
+            self.flushes += 1
+            self.flushed += sum(counts.values())
+            if self.on_flush is not None:
+                try:
+                    await self.on_flush(totals)
+                except Exception as e:
+                    # Записанное уже в БД; фоновый сброс не должен остановиться
+                    logger.error(f"Ошибка обработки сброса просмотров: {e}")
+            return len(counts)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Последний сброс при плавной остановке
+        await self.flush()
+
+    def stats(self):
+        return {
+            'pending': self._pending,
+            'flushed': self.flushed,
+            'flushes': self.flushes,
+        }
+
+
+VIEWS_KEY = web.AppKey('views', ViewCounter)
+
+
+def setup_views(app, interval=5.0, max_pending=1000):
+    """Счетчик просмотров; после сброса обновляет популярность в модели каталога"""
+    catalog = app[CATALOG_KEY]
+    counter = ViewCounter(app[DB_KEY], interval=interval, max_pending=max_pending, on_flush=catalog.apply_views)
+    app[VIEWS_KEY] = counter
+
+    async def start_views(app):
+        counter.start()
+
+    async def stop_views(app):
+        await counter.stop()
+
+    app.on_startup.append(start_views)
+    # Последний сброс - после обработчиков запросов, но до закрытия пула БД
+    on_db_close(app, stop_views)
+    return counter
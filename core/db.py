@@ -0,0 +1,252 @@
+"""
+Асинхронный слой доступа к SQLite.
+
+Запросы выполняются в отдельном пуле потоков на ограниченном наборе
+долгоживущих соединений (WAL), поэтому event loop aiohttp не блокируется.
+"""
+
+import asyncio
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Настройки соединения: WAL позволяет читателям не ждать писателя
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+)
+
+
+def connect(path, timeout=5.0):
+    """Открывает соединение с настроенными PRAGMA"""
+    conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+_TABLE_RE = re.compile(r'\b(?:from|join|into|update)\s+([a-z_][a-z0-9_]*)', re.IGNORECASE)
+_OPERATION_RE = re.compile(r'^\s*(?:with\b.*?\)\s*)?(\w+)', re.IGNORECASE | re.DOTALL)
+_labels_cache = {}
+
+
+def statement_label(sql):
+    """
+    Низкокардинальная метка запроса: операция и таблицы.
+
+    "SELECT ... FROM products p LEFT JOIN categories c ..." -> "SELECT products,categories"
+    """
+    label = _labels_cache.get(sql)
+    if label is None:
+        match = _OPERATION_RE.match(sql)
+        operation = match.group(1).upper() if match else 'SQL'
+        tables = []
+        for table in _TABLE_RE.findall(sql):
+            table = table.lower()
+            if table not in tables:
+                tables.append(table)
+        label = f"{operation} {','.join(tables)}".strip()
+        # Запросы задаются в коде, поэтому кэш ограничен их числом
+        if len(_labels_cache) < 4096:
+            _labels_cache[sql] = label
+    return label
+
+
+class Database:
+    """Пул соединений SQLite с асинхронным API"""
+
+    def __init__(self, path, pool_size=4, timeout=5.0):
+        self.path = path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._executor = None
+        self._lock = threading.Lock()
+
+        # Метрики насыщения пула
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._pending = 0
+        self._queries = 0
+        self._waits = 0
+        self._wait_time = 0.0
+
+        # on_query(label, seconds) - вызывается из потока БД после каждого запроса
+        self.on_query = None
+
+    @property
+    def is_open(self):
+        return self._executor is not None
+
+    def open(self):
+        """Открывает соединения и пул потоков"""
+        if self.is_open:
+            return
+        for _ in range(self.pool_size):
+            self._pool.put(connect(self.path, self.timeout))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.pool_size,
+            thread_name_prefix='stone-db'
+        )
+        logger.info(f"🗄️ Пул БД открыт: {self.pool_size} соединений ({self.path})")
+
+    async def close(self):
+        """Дожидается выполняющихся запросов и закрывает соединения"""
+        if not self.is_open:
+            return
+        executor, self._executor = self._executor, None
+        await asyncio.get_running_loop().run_in_executor(None, executor.shutdown, True)
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+        logger.info("🗄️ Пул БД закрыт")
+
+    # ---------- выполнение в пуле потоков ----------
+
+    def _acquire(self):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            started = time.perf_counter()
+            conn = self._pool.get(timeout=self.timeout)
+            with self._lock:
+                self._waits += 1
+                self._wait_time += time.perf_counter() - started
+        with self._lock:
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+        return conn
+
+    def _release(self, conn):
+        with self._lock:
+            self._in_use -= 1
+        self._pool.put(conn)
+
+    def _call(self, fn, args, label):
+        with self._lock:
+            self._pending -= 1
+        conn = self._acquire()
+        started = time.perf_counter()
+        try:
+            return fn(conn, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._release(conn)
+            if self.on_query is not None:
+                self.on_query(label or getattr(fn, '__name__', 'run'), elapsed)
+
+    async def run(self, fn, *args, label=None):
+        """
+        Выполняет fn(conn, *args) в потоке БД и возвращает результат.
+
+        label - метка для метрик (по умолчанию имя fn).
+        """
+        if not self.is_open:
+            raise RuntimeError("Пул БД не открыт")
+        with self._lock:
+            self._pending += 1
+            self._queries += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, args, label)
+
+    # ---------- удобные обертки ----------
+
+    async def fetch_all(self, sql, params=()):
+        """Возвращает все строки запроса списком словарей"""
+        def _fetch(conn):
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+        return await self.run(_fetch, label=statement_label(sql))
+
+    async def fetch_one(self, sql, params=()):
+        """Возвращает первую строку запроса словарем или None"""
+        def _fetch(conn):
+            row = conn.execute(sql, params).fetchone()
+            return dict(row) if row is not None else None
+        return await self.run(_fetch, label=statement_label(sql))
+
+    async def fetch_val(self, sql, params=(), default=None):
+        """Возвращает первое значение первой строки"""
+        def _fetch(conn):
+            row = conn.execute(sql, params).fetchone()
+            return row[0] if row is not None else default
+        return await self.run(_fetch, label=statement_label(sql))
+
+    async def execute(self, sql, params=()):
+        """Выполняет изменяющий запрос и фиксирует его, возвращает lastrowid"""
+        def _execute(conn):
+            with conn:
+                return conn.execute(sql, params).lastrowid
+        return await self.run(_execute, label=statement_label(sql))
+
+    async def executemany(self, sql, seq_of_params):
+        """Выполняет пакет изменений одной транзакцией, возвращает rowcount"""
+        def _execute(conn):
+            with conn:
+                return conn.executemany(sql, seq_of_params).rowcount
+        return await self.run(_execute, label=statement_label(sql))
+
+    async def transaction(self, fn, *args):
+        """Выполняет fn(conn, *args) внутри одной транзакции"""
+        def _transaction(conn):
+            with conn:
+                return fn(conn, *args)
+        return await self.run(_transaction, label=getattr(fn, '__name__', 'transaction'))
+
+    def stats(self):
+        """Метрики насыщения пула"""
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'in_use': self._in_use,
+                'idle': self._pool.qsize(),
+                'pending': self._pending,
+                'peak_in_use': self._peak_in_use,
+                'saturated': self._in_use >= self.pool_size,
+                'queries': self._queries,
+                'waits': self._waits,
+                'wait_time_ms': round(self._wait_time * 1000, 3),
+            }
+
+
+DB_KEY = web.AppKey('db', Database)
+DB_CLOSE_KEY = web.AppKey('db_close')
+
+
+def setup_db(app, path, pool_size=4):
+    """Подключает пул БД к жизненному циклу приложения"""
+    db = Database(path, pool_size=pool_size)
+    app[DB_KEY] = db
+
+    async def open_db(app):
+        db.open()
+
+    async def close_db(app):
+        await db.close()
+
+    app.on_startup.append(open_db)
+    app.on_cleanup.append(close_db)
+    app[DB_CLOSE_KEY] = close_db
+    return db
+
+
+def on_db_close(app, callback):
+    """
+    Регистрирует callback в on_cleanup перед закрытием пула БД.
+
+    on_shutdown выполняется до того, как сервер дождется обработчиков
+    запросов, поэтому очереди и буферы, которые пополняют обработчики,
+    сбрасываются здесь: после обработчиков, но пока пул еще открыт.
+    """
+    app.on_cleanup.insert(app.on_cleanup.index(app[DB_CLOSE_KEY]), callback)
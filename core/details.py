@@ -0,0 +1,119 @@
+"""
+Карточка товара для /api/product/{id}.
+
+Готовые ответы (JSON + gzip + ETag) лежат в ограниченном LRU-кэше с TTL.
+Модель каталога сообщает id измененных товаров - их записи удаляются сразу.
+Одновременные запросы одного товара ждут одну загрузку из БД, поэтому
+даже тысячи переходов по одной ссылке стоят одного чтения.
+"""
+
+import asyncio
+import json
+import logging
+
+from aiohttp import web
+
+from core.cache import TTLCache
+from core.catalog import CATALOG_KEY, PRODUCT_SELECT, build_payload
+from core.db import DB_KEY
+from core.http import json_body
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_LIMIT = 4
+
+
+def _gallery(value, image_url):
+    """gallery хранится JSON-строкой; на клиент уходит массив"""
+    try:
+        gallery = json.loads(value) if value else []
+    except (TypeError, ValueError):
+        gallery = []
+    if not isinstance(gallery, list):
+        gallery = []
+    return [image for image in gallery if image] or [image_url]
+
+
+class ProductDetails:
+    """Кэш карточек товаров с точечной инвалидацией и single-flight загрузкой"""
+
+    def __init__(self, db, catalog, maxsize=2048, ttl=300.0):
+        self.db = db
+        self.catalog = catalog
+        self.cache = TTLCache(maxsize, ttl)
+        self._loading = {}
+        # Увеличивается при инвалидации: загрузки, начатые раньше, не сохраняются
+        self._generation = 0
+        catalog.subscribe(self.invalidate)
+
+    def invalidate(self, ids=None):
+        """Удаляет карточки товаров ids (None - все)"""
+        self._generation += 1
+        if ids is None:
+            self.cache.clear()
+        else:
+            for product_id in ids:
+                self.cache.pop(product_id)
+
+    async def get(self, product_id):
+        """(статус, CachedBody) карточки товара"""
+        cached = self.cache.get(product_id)
+        if cached is not None:
+            return cached
+
+        future = self._loading.get(product_id)
+        if future is None:
+            future = asyncio.ensure_future(self._load(product_id, self._generation))
+            self._loading[product_id] = future
+            future.add_done_callback(lambda _: self._loading.pop(product_id, None))
+        return await asyncio.shield(future)
+
+    async def _load(self, product_id, generation):
+        row = await self.db.fetch_one(PRODUCT_SELECT + " WHERE p.id = ?", (product_id,))
+        if row is None:
+            result = (404, json_body({'success': False, 'error': 'Товар не найден'}))
+        else:
+            result = (200, json_body({'success': True, 'product': self._build(row)}))
+        if generation == self._generation:
+            self.cache.set(product_id, result)
+        return result
+
+    def _build(self, row):
+        product = build_payload(row)
+        product.update({
+            'sku': row['sku'],
+            'category_id': row['category_id'],
+            'category_slug': row['category_slug'],
+            'breadcrumbs': self.catalog.tree.breadcrumbs(row['category_slug']),
+            'gallery': _gallery(row['gallery'], product['image_url']),
+            'in_stock': bool(row['is_active']) and (row['quantity'] or 0) > 0,
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+        })
+        if product['compare_at_price'] and product['price']:
+            product['savings'] = max(0, float(product['compare_at_price']) - float(product['price']))
+
+        # Похожие товары - из той же категории, берутся из модели каталога в памяти
+        similar = []
+        if row['category_slug']:
+            views, _ = self.catalog.query(category=row['category_slug'], limit=SIMILAR_LIMIT + 1)
+            similar = [view.payload for view in views if view.id != row['id']][:SIMILAR_LIMIT]
+        product['similar_products'] = similar
+        return product
+
+    def stats(self):
+        return {
+            'size': len(self.cache),
+            'hits': self.cache.hits,
+            'misses': self.cache.misses,
+            'loading': len(self._loading),
+        }
+
+
+DETAILS_KEY = web.AppKey('product_details', ProductDetails)
+
+
+def setup_details(app, maxsize=2048, ttl=300.0):
+    details = ProductDetails(app[DB_KEY], app[CATALOG_KEY], maxsize=maxsize, ttl=ttl)
+    app[DETAILS_KEY] = details
+    return details
@@ -0,0 +1,210 @@
+"""
+Рассылка изменений открытым клиентам (Server-Sent Events, /api/stream).
+
+Один хаб на процесс: событие кодируется в кадр SSE один раз и
+раскладывается по очередям подписчиков. Очереди ограничены: если клиент
+не успевает читать и его очередь переполнилась, он отключается
+(EventSource переподключится сам и догонит пропущенное по Last-Event-ID),
+а остальные клиенты и источники событий его не ждут.
+
+Id события - "эпоха-номер": эпоха задается при запуске процесса, поэтому
+Last-Event-ID от другого воркера или до перезапуска не совпадет с
+нумерацией хаба и клиент получит reset, а не молча пропустит события.
+
+Источники событий - модель каталога (цена и остаток измененных товаров)
+и реестр виджетов. Поэтому нагрузка зависит от числа изменений, а не от
+числа открытых WebApp: клиентам больше не нужно опрашивать API.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+
+from aiohttp import web
+
+from core.catalog import CATALOG_KEY
+from core.widgets import WIDGETS_KEY
+
+logger = logging.getLogger(__name__)
+
+# Последние события для догоняющих клиентов (Last-Event-ID)
+REPLAY_SIZE = 256
+# Больше изменений за раз - клиенту дешевле перечитать список целиком
+MAX_PRODUCTS_PER_EVENT = 200
+
+# Кадр-сигнал подписчику: закрыть поток
+_CLOSE = None
+
+
+def sse_frame(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+class Subscriber:
+    """Очередь кадров одного клиента"""
+
+    __slots__ = ('queue', 'dropped')
+
+    def __init__(self, size):
+        self.queue = asyncio.Queue(size)
+        self.dropped = False
+
+    def close(self):
+        # Очередь могла быть заполнена: освобождаем место под сигнал закрытия
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(_CLOSE)
+
+
+class EventHub:
+    """Раздача событий подписчикам с ограниченными очередями"""
+
+    def __init__(self, queue_size=64, heartbeat=15.0, max_clients=10000):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_clients = max_clients
+        self.subscribers = set()
+        # Эпоха процесса: время запуска и pid (воркеры стартуют одновременно)
+        self.epoch = f'{int(time.time() * 1000):x}{os.getpid():x}'
+        self.last_id = 0
+        self._recent = deque(maxlen=REPLAY_SIZE)
+        self.published = 0
+        self.dropped = 0
+        self.closed = False
+        # Последние разосланные цена и остаток товаров (нет ключа - не в продаже)
+        self._products = {}
+
+    def subscribe(self):
+        """Новый подписчик или None, если достигнут предел клиентов"""
+        if self.closed or len(self.subscribers) >= self.max_clients:
+            return None
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def event_id(self, number):
+        return f'{self.epoch}-{number}'
+
+    def replay(self, last_event_id):
+        """
+        Кадры после Last-Event-ID; None, если клиенту надо перечитать данные
+        целиком: id другой эпохи (иной процесс), некорректный, из будущего
+        или часть событий уже вытеснена.
+        """
+        epoch, _, number = last_event_id.rpartition('-')
+        if epoch != self.epoch or not number.isdigit():
+            return None
+        last_id = int(number)
+        if last_id > self.last_id:
+            return None
+        if last_id == self.last_id:
+            return []
+        if not self._recent or self._recent[0][0] > last_id + 1:
+            return None
+        return [frame for event_id, frame in self._recent if event_id > last_id]
+
+    def publish(self, event, data):
+        """Кодирует событие один раз и кладет во все очереди (не блокирует)"""
+        self.last_id += 1
+        frame = sse_frame(event, data, self.event_id(self.last_id))
+        self._recent.append((self.last_id, frame))
+        self.published += 1
+
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Медленный клиент: отключаем, чтобы не копить для него память
+                subscriber.dropped = True
+                subscriber.close()
+                self.subscribers.discard(subscriber)
+                self.dropped += 1
+
+    def close(self):
+        """Закрывает все потоки (при остановке сервера)"""
+        self.closed = True
+        for subscriber in self.subscribers:
+            subscriber.close()
+        self.subscribers.clear()
+
+    # ---------- источники ----------
+
+    def on_products(self, catalog, ids):
+        """
+        Изменились товары: рассылаются только те, у кого поменялись цена,
+        остаток или наличие в продаже. Модель каталога сообщает все
+        перечитанные строки (в том числе правки описания и повторно
+        прочитанные дельтой), поэтому сравнение - с прошлой рассылкой.
+        """
+        if ids is None:
+            self._products = {view.id: (view.price, view.quantity) for view in catalog.products()}
+            self.publish('catalog', {'version': catalog.version, 'reload': True})
+            return
+
+        products = []
+        for product_id in sorted(ids):
+            view = catalog.get(product_id)
+            state = (view.price, view.quantity) if view is not None else None
+            if self._products.get(product_id) == state:
+                continue
+            if view is None:
+                # Снят с продажи или закончился
+                self._products.pop(product_id, None)
+                products.append({'id': product_id, 'in_stock': False})
+            else:
+                self._products[product_id] = state
+                products.append({
+                    'id': product_id,
+                    'price': view.price,
+                    'quantity': view.quantity,
+                    'in_stock': True,
+                })
+        if not products:
+            return
+        if len(products) > MAX_PRODUCTS_PER_EVENT:
+            self.publish('catalog', {'version': catalog.version, 'reload': True})
+            return
+        self.publish('products', {'version': catalog.version, 'products': products})
+
+    def on_widgets(self, registry, changed, removed):
+        self.publish('widgets', {'version': registry.version, 'changed': changed, 'removed': removed})
+
+    def stats(self):
+        return {
+            'clients': len(self.subscribers),
+            'last_id': self.event_id(self.last_id),
+            'published': self.published,
+            'dropped': self.dropped,
+        }
+
+
+EVENTS_KEY = web.AppKey('events', EventHub)
+
+
+def setup_events(app, queue_size=64, heartbeat=15.0, max_clients=10000):
+    """Хаб событий; подписывается на каталог и виджеты (вызывать после их setup)"""
+    hub = EventHub(queue_size=queue_size, heartbeat=heartbeat, max_clients=max_clients)
+    app[EVENTS_KEY] = hub
+
+    catalog = app[CATALOG_KEY]
+    catalog.subscribe(lambda ids: hub.on_products(catalog, ids))
+    registry = app[WIDGETS_KEY]
+    registry.subscribe(lambda changed, removed: hub.on_widgets(registry, changed, removed))
+
+    # Открытые потоки иначе задержали бы остановку до shutdown_timeout
+    async def close_streams(app):
+        hub.close()
+
+    app.on_shutdown.append(close_streams)
+    return hub
@@ -0,0 +1,199 @@
+"""
+Битовый индекс фасетов каталога.
+
+Каждый товар получает позицию в выдаче по умолчанию, а каждое значение
+фасета (категория, бренд, цвет, размер, материал) - битовую маску из
+позиций подходящих товаров (Python int). Фильтр - это AND по фасетам и OR
+внутри фасета, число товаров - popcount маски. Никаких COUNT(*) в БД.
+
+Маска категории - это OR масок всего ее поддерева, поэтому фильтр и
+счетчик родительской категории учитывают товары подкатегорий.
+"""
+
+from bisect import bisect_left, bisect_right
+
+# Фасет -> атрибут ProductView
+FACETS = {
+    'category': 'category_slug',
+    'brand': 'brand',
+    'color': 'color',
+    'size': 'size',
+    'material': 'material',
+}
+
+# Порядки сортировки: ключ и направление (None - порядок выдачи по умолчанию)
+SORTS = {
+    'new': (lambda v: (v.created_at, v.id), True),
+    'popular': (lambda v: (v.views, v.id), True),
+    'price_asc': (lambda v: (v.price, v.id), False),
+    'price_desc': (lambda v: (v.price, v.id), True),
+    'discount': (lambda v: (v.discount_percent, v.id), True),
+}
+
+PRICE_BUCKETS = 64
+
+# Номера установленных битов для каждого значения байта
+_BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+def mask_from_positions(positions, size):
+    """Собирает битовую маску из списка позиций"""
+    bits = bytearray((size + 7) // 8)
+    for pos in positions:
+        bits[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def iter_positions(mask, size):
+    """Позиции установленных битов в порядке возрастания"""
+    for byte_index, byte in enumerate(mask.to_bytes((size + 7) // 8, 'little')):
+        if byte:
+            base = byte_index << 3
+            for bit in _BYTE_BITS[byte]:
+                yield base + bit
+
+
+class FacetIndex:
+    """Неизменяемый снимок индекса для одной версии каталога"""
+
+    def __init__(self, views, version, tree=None):
+        self.version = version
+        self.views = views
+        self.size = size = len(views)
+        self.all = (1 << size) - 1
+
+        positions = {facet: {} for facet in FACETS}
+        self.labels = {}
+        for pos, view in enumerate(views):
+            for facet, attr in FACETS.items():
+                value = getattr(view, attr)
+                if value not in (None, ''):
+                    positions[facet].setdefault(value, []).append(pos)
+            if view.category_slug:
+                self.labels[view.category_slug] = view.payload.get('category_name')
+
+        self.masks = {
+            facet: {value: mask_from_positions(pos_list, size) for value, pos_list in values.items()}
+            for facet, values in positions.items()
+        }
+
+        if tree is not None:
+            # Дети идут в эйлеровом порядке после родителя, поэтому обход с конца
+            # собирает маску каждой категории из уже готовых масок детей
+            categories = self.masks['category']
+            for node in reversed(tree.order):
+                mask = categories.get(node.slug, 0)
+                for slug in tree.children(node.slug):
+                    mask |= categories.get(slug, 0)
+                if mask:
+                    categories[node.slug] = mask
+                    self.labels.setdefault(node.slug, node.name)
+
+        # Цены: позиции по возрастанию цены и маски-префиксы на границах корзин
+        self._by_price = sorted(range(size), key=lambda pos: views[pos].price)
+        self._prices = [views[pos].price for pos in self._by_price]
+        self._bucket = max(1, -(-size // PRICE_BUCKETS))
+        self._prefix = [0]
+        for start in range(0, size, self._bucket):
+            chunk = self._by_price[start:start + self._bucket]
+            self._prefix.append(self._prefix[-1] | mask_from_positions(chunk, size))
+
+        # Все порядки сортировки считаются заранее - индекс строится вне event loop
+        self._orders = {}
+        self._ranks = {}
+        for sort_by in SORTS:
+            self._orders[sort_by], self._ranks[sort_by] = self._sort(sort_by)
+
+    def _sort(self, sort_by):
+        key, reverse = SORTS[sort_by]
+        views = self.views
+        order = sorted(range(self.size), key=lambda pos: key(views[pos]), reverse=reverse)
+        rank = [0] * self.size
+        for i, pos in enumerate(order):
+            rank[pos] = i
+        return order, rank
+
+    def resort(self, sort_by):
+        """Пересчитывает один порядок, если его ключ изменился на месте (просмотры)"""
+        order, rank = self._sort(sort_by)
+        self._orders[sort_by] = order
+        self._ranks[sort_by] = rank
+
+    def _below(self, index):
+        """Маска товаров с рангом цены меньше index"""
+        full = index // self._bucket
+        rest = self._by_price[full * self._bucket:index]
+        return self._prefix[full] | mask_from_positions(rest, self.size)
+
+    def price_mask(self, min_price=None, max_price=None):
+        if min_price is None and max_price is None:
+            return self.all
+        upper = bisect_right(self._prices, max_price) if max_price is not None else self.size
+        lower = bisect_left(self._prices, min_price) if min_price is not None else 0
+        if lower >= upper:
+            return 0
+        return self._below(upper) & ~self._below(lower)
+
+    def price_range(self):
+        if not self._prices:
+            return None
+        return {'min': int(self._prices[0]), 'max': int(-(-self._prices[-1] // 1))}
+
+    def facet_mask(self, facet, values):
+        masks = self.masks[facet]
+        result = 0
+        for value in values:
+            result |= masks.get(value, 0)
+        return result
+
+    def search(self, filters, min_price=None, max_price=None):
+        """
+        Применяет фильтры {фасет: [значения]}.
+
+        Возвращает (итоговая маска, счетчики фасетов). Счетчик значения
+        фасета считается с учетом всех фильтров, кроме фильтра самого фасета,
+        чтобы можно было расширять выбор внутри фасета.
+        """
+        selected = {facet: self.facet_mask(facet, values) for facet, values in filters.items() if values}
+        base = self.price_mask(min_price, max_price)
+
+        result = base
+        for mask in selected.values():
+            result &= mask
+
+        counts = {}
+        for facet in FACETS:
+            scope = base
+            for other, mask in selected.items():
+                if other != facet:
+                    scope &= mask
+            counts[facet] = {
+                value: count
+                for value, mask in self.masks[facet].items()
+                if (count := (mask & scope).bit_count())
+            }
+        return result, counts
+
+    def page(self, mask, sort_by=None, offset=0, limit=24):
+        """Товары маски в нужном порядке, срез [offset, offset + limit)"""
+        need = offset + limit
+        if sort_by not in SORTS:
+            found = []
+            for pos in iter_positions(mask, self.size):
+                found.append(pos)
+                if len(found) >= need:
+                    break
+        elif mask == self.all:
+            found = self._orders[sort_by][:need]
+        elif mask.bit_count() * 16 < self.size:
+            # Узкий фильтр - дешевле отсортировать найденное по рангу
+            found = sorted(iter_positions(mask, self.size), key=self._ranks[sort_by].__getitem__)[:need]
+        else:
+            flags = mask.to_bytes((self.size + 7) // 8, 'little')
+            found = []
+            for pos in self._orders[sort_by]:
+                if flags[pos >> 3] >> (pos & 7) & 1:
+                    found.append(pos)
+                    if len(found) >= need:
+                        break
+        return [self.views[pos] for pos in found[offset:need]]
@@ -0,0 +1,98 @@
+"""
+Готовые HTTP-ответы: заранее сжатое тело, сильный ETag и 304
+"""
+
+import gzip
+import hashlib
+
+from aiohttp import web
+
+from core.jsonenc import encode_json
+
+GZIP_LEVEL = 6
+# Маленькие тела не сжимаем: выигрыш меньше накладных расходов
+GZIP_MIN_SIZE = 1024
+
+
+class CachedBody:
+    """Закодированное тело ответа вместе с gzip-вариантом и ETag"""
+
+    __slots__ = ('body', 'gzip', 'etag', 'content_type')
+
+    def __init__(self, body, content_type, compress=True):
+        self.body = body
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.gzip = gzip.compress(body, GZIP_LEVEL) if compress and len(body) >= GZIP_MIN_SIZE else None
+
+
+def json_body(payload):
+    """CachedBody с JSON-представлением payload (значения RawJSON вставляются как есть)"""
+    return CachedBody(encode_json(payload), 'application/json')
+
+
+def bad_request(error='Некорректные параметры запроса'):
+    return web.json_response({
+        'success': False,
+        'error': error
+    }, status=400)
+
+
+async def read_json(request):
+    """JSON-объект из тела запроса или None"""
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def accepts_gzip(request):
+    return 'gzip' in request.headers.get('Accept-Encoding', '')
+
+
+ENCODING_SUFFIXES = ('-gz"', '-br"')
+
+
+def encoded_etag(etag, suffix):
+    """ETag варианта тела: у сжатого варианта свои байты - значит и свой сильный ETag"""
+    return etag[:-1] + suffix
+
+
+def _base_etag(tag):
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+
+def not_modified(request, etag):
+    """True если клиент прислал If-None-Match с текущим ETag"""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in {_base_etag(tag.strip()) for tag in header.split(',')}
+
+
+def cached_response(request, cached, cache_control='no-cache', status=200):
+    """Отдает CachedBody с учетом If-None-Match и Accept-Encoding"""
+    headers = {'Cache-Control': cache_control}
+    if cached.gzip is not None:
+        headers['Vary'] = 'Accept-Encoding'
+
+    if status == 200 and not_modified(request, cached.etag):
+        headers['ETag'] = cached.etag
+        return web.Response(status=304, headers=headers)
+
+    if cached.gzip is not None and accepts_gzip(request):
+        headers['ETag'] = encoded_etag(cached.etag, '-gz"')
+        headers['Content-Encoding'] = 'gzip'
+        body = cached.gzip
+    else:
+        headers['ETag'] = cached.etag
+        body = cached.body
+
+    return web.Response(body=body, status=status, headers=headers, content_type=cached.content_type,
+                        charset='utf-8')
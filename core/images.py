@@ -0,0 +1,244 @@
+"""
+Варианты изображений под размер экрана.
+
+/img/<w>x<h>/<путь> отдает уменьшенную копию картинки из манифеста статики
+(0 в размере - сохранить пропорции). Ресайз идет в пуле процессов, готовые
+варианты лежат в дисковом кэше с LRU-вытеснением по суммарному размеру.
+Одновременные запросы одного варианта ждут один и тот же ресайз.
+При нескольких процессах сервера у каждого свой подкаталог кэша
+(pid-<pid>): LRU-индекс процесса видит только свои файлы и не удаляет
+чужие, а подкаталоги завершившихся процессов удаляются при старте.
+Клиенты, принимающие image/webp, получают WebP.
+
+Ресайзятся только локальные изображения (/static/...): внешние URL
+(фотохостинги, CDN) отдаются как есть - см. variant_url.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from aiohttp import web
+
+from core.assets import ASSETS_KEY
+
+logger = logging.getLogger(__name__)
+
+MAX_DIMENSION = 2000
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+# Только такие пути есть в манифесте статики и могут быть уменьшены
+LOCAL_IMAGE_PREFIX = '/static/'
+
+
+def resize_image(src, dst, width, height, fmt):
+    """Выполняется в процессе-воркере: ресайз src в dst"""
+    from PIL import Image, ImageOps
+
+    with Image.open(src) as image:
+        image = ImageOps.exif_transpose(image)
+        if width and height:
+            image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            image.thumbnail((width or MAX_DIMENSION, height or MAX_DIMENSION), Image.LANCZOS)
+
+        tmp = f"{dst}.{os.getpid()}.tmp"
+        if fmt == 'webp':
+            image.save(tmp, 'WEBP', quality=WEBP_QUALITY, method=4)
+        else:
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.save(tmp, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        os.replace(tmp, dst)
+    return os.path.getsize(dst)
+
+
+def pillow_available():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ImageVariants:
+    """Дисковый LRU-кэш вариантов и пул процессов для ресайза"""
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024, workers=2, per_process=False):
+        self.root = cache_dir
+        self.cache_dir = cache_dir
+        self.per_process = per_process
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.enabled = pillow_available()
+        self._files = OrderedDict()
+        self._total = 0
+        self._pool = None
+        self._inflight = {}
+
+    def start(self):
+        if not self.enabled:
+            logger.warning("⚠️ Pillow не установлен - изображения отдаются без ресайза")
+            return
+        if self.per_process:
+            self.cache_dir = os.path.join(self.root, f'pid-{os.getpid()}')
+            self._remove_stale()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Восстанавливаем LRU-порядок по времени последнего доступа
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_atime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._total += size
+        self._evict()
+
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def _remove_stale(self):
+        """Удаляет подкаталоги кэша завершившихся процессов"""
+        if not os.path.isdir(self.root):
+            return
+        for entry in os.scandir(self.root):
+            pid = entry.name[4:]
+            if not entry.is_dir() or not entry.name.startswith('pid-') or not pid.isdigit():
+                continue
+            try:
+                os.kill(int(pid), 0)
+                continue
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                # Процесс жив, но принадлежит другому пользователю
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _evict(self):
+        while self._total > self.max_bytes and self._files:
+            name, size = self._files.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+    async def variant(self, asset, width, height, fmt):
+        """Путь к готовому варианту (создается при первом запросе)"""
+        digest = asset.etag.strip('"')
+        name = f"{digest}_{width}x{height}.{fmt}"
+        path = os.path.join(self.cache_dir, name)
+
+        if name in self._files:
+            self._files.move_to_end(name)
+            return path
+        future = self._inflight.get(name)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._pool, resize_image, asset.path, path, width, height, fmt)
+            self._inflight[name] = future
+            future.add_done_callback(lambda done: self._finished(name, done))
+
+        # Отмена запроса (клиент ушел) не отменяет ресайз для остальных ждущих
+        await asyncio.shield(future)
+        return path
+
+    def _finished(self, name, future):
+        """Учет готового варианта - не зависит от того, дождался ли его запрос-инициатор"""
+        self._inflight.pop(name, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        size = future.result()
+        self._files[name] = size
+        self._total += size
+        self._evict()
+
+
+IMAGES_KEY = web.AppKey('images', ImageVariants)
+
+
+def _dimension(value):
+    size = int(value)
+    if size < 0 or size > MAX_DIMENSION:
+        raise ValueError(value)
+    return size
+
+
+async def serve_image_variant(request):
+    """GET /img/{w}x{h}/{path} - уменьшенная копия изображения"""
+    manifest = request.app[ASSETS_KEY]
+    images = request.app[IMAGES_KEY]
+
+    try:
+        width = _dimension(request.match_info['width'])
+        height = _dimension(request.match_info['height'])
+    except ValueError:
+        raise web.HTTPBadRequest(text='Некорректный размер изображения')
+
+    path = request.match_info['path']
+    prefix, _, rest = path.partition('/')
+    # Отсутствующие изображения заменяются placeholder, как и в /static
+    found = manifest.resolve(prefix, rest)
+    if found is None or not found[0].content_type.startswith('image/'):
+        raise web.HTTPNotFound()
+    asset, cache_control = found
+
+    if not images.enabled or (width == 0 and height == 0):
+        return manifest.respond(request, asset, cache_control)
+
+    fmt = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpg'
+    try:
+        variant = await images.variant(asset, width, height, fmt)
+    except Exception as e:
+        logger.error(f"Ошибка ресайза {asset.logical}: {e}")
+        return manifest.respond(request, asset, cache_control)
+
+    return web.FileResponse(variant, headers={
+        'Cache-Control': cache_control,
+        'Vary': 'Accept',
+        'Content-Type': 'image/webp' if fmt == 'webp' else 'image/jpeg',
+    })
+
+
+def variant_url(url, width=0, height=0):
+    """URL уменьшенной копии для локального /static/... пути; остальные URL - без изменений"""
+    if not url or not url.startswith(LOCAL_IMAGE_PREFIX):
+        return url
+    return f"/img/{int(width)}x{int(height)}{url}"
+
+
+def image_url(manifest, path, width=0, height=0):
+    """URL варианта изображения с отпечатком исходника (хелпер image_url в шаблонах)"""
+    if not path or '://' in path or path.startswith('//'):
+        return path
+    return variant_url(manifest.url(path), width, height)
+
+
+def setup_images(app, cache_dir, max_bytes, workers=2, per_process=False, jinja_env=None):
+    """per_process - отдельный подкаталог кэша на процесс (несколько воркеров сервера)"""
+    images = ImageVariants(cache_dir, max_bytes=max_bytes, workers=workers, per_process=per_process)
+    app[IMAGES_KEY] = images
+
+    if jinja_env is not None:
+        manifest = app[ASSETS_KEY]
+        jinja_env.globals['image_url'] = lambda path, width=0, height=0: image_url(manifest, path, width, height)
+
+    async def start_images(app):
+        images.start()
+
+    async def stop_images(app):
+        images.stop()
+
+    app.on_startup.append(start_images)
+    app.on_cleanup.append(stop_images)
+    return images
@@ -0,0 +1,381 @@
+"""
+Потоковый импорт каталога из фидов поставщиков (CSV или JSONL).
+
+Вход читается построчно, в памяти держится только текущая пачка из
+batch_size записей. Каждая пачка - одна короткая транзакция upsert по sku
+(и по slug для записей без sku), поэтому читатели (WAL) не ждут импорт,
+а остальные писатели встают между пачками. Неизмененные товары не
+перезаписываются: не трогаются триггеры версий, updated_at и индекс
+поиска, так что повторная загрузка того же фида почти бесплатна.
+
+Колонки, которых нет в записи, у существующих товаров не меняются.
+Категории указываются slug-ом (колонка category); неизвестные категории
+создаются. Галерея - список в JSONL или строка через "|" в CSV.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import re
+import sqlite3
+import time
+
+from core.db import connect
+from core.migrations import ensure_sku_index
+from core.textfold import fold_products
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+# Пауза между пачками: другие писатели успевают взять блокировку
+BATCH_PAUSE = 0.002
+MAX_ERROR_SAMPLES = 100
+
+FEED_FORMATS = ('csv', 'jsonl')
+
+TEXT_COLUMNS = ('name', 'slug', 'description', 'brand', 'sku', 'color', 'size', 'material')
+PRICE_COLUMNS = ('price', 'compare_at_price')
+INT_COLUMNS = ('discount_percent', 'quantity')
+BOOL_COLUMNS = ('is_featured', 'is_active')
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'да', '+')
+
+
+class FeedError(ValueError):
+    """Некорректная запись фида"""
+
+
+def slugify(value):
+    return re.sub(r'[^\w]+', '-', value.lower(), flags=re.UNICODE).strip('-_')[:200]
+
+
+# ---------- чтение фида ----------
+
+def detect_format(name):
+    return 'jsonl' if name.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_records(stream, fmt):
+    """(номер строки, dict) из текстового потока; ошибки разбора - вместо dict исключение"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for line_num, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_num, FeedError(f'некорректный JSON: {e}')
+                continue
+            yield line_num, record if isinstance(record, dict) else FeedError('ожидался JSON-объект')
+    else:
+        raise ValueError(f'Неизвестный формат фида: {fmt}')
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _gallery(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = value.split('|')
+    if not isinstance(value, list):
+        raise FeedError('gallery должна быть списком')
+    return [str(image).strip() for image in value if str(image).strip()]
+
+
+class CatalogImporter:
+    """Пакетный upsert товаров в одном соединении"""
+
+    def __init__(self, conn, batch_size=BATCH_SIZE, pause=BATCH_PAUSE):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.pause = pause
+        self._categories = {
+            slug: category_id for category_id, slug in conn.execute("SELECT id, slug FROM categories")
+        }
+        self._statements = {}
+        # Без уникального индекса по sku (повторы в базе) ON CONFLICT (sku) невозможен
+        self.sku_unique = ensure_sku_index(conn)
+        self.rows = 0
+        self.changed = 0
+        self.errors = 0
+        self.error_samples = []
+
+    # ---------- нормализация ----------
+
+    def _category_id(self, slug):
+        """id категории по slug (кэш на весь импорт); неизвестная категория создается"""
+        category_id = self._categories.get(slug)
+        if category_id is None:
+            name = slug.replace('-', ' ').replace('_', ' ').capitalize()
+            category_id = self.conn.execute(
+                "INSERT INTO categories (name, slug) VALUES (?, ?) "
+                "ON CONFLICT (slug) DO UPDATE SET slug = excluded.slug RETURNING id",
+                (name, slug)
+            ).fetchone()[0]
+            self._categories[slug] = category_id
+        return category_id
+
+    def normalize(self, record):
+        """Запись фида -> {колонка products: значение} только для присутствующих полей"""
+        row = {}
+        for column in TEXT_COLUMNS:
+            if column in record:
+                row[column] = _text(record[column])
+        # Пустая ячейка числа или флага - "нет данных": колонка не меняется
+        # (кроме compare_at_price, где пусто значит "без старой цены")
+        try:
+            for column in PRICE_COLUMNS:
+                value = _text(record.get(column))
+                if value is not None:
+                    row[column] = round(float(value.replace(',', '.')), 2)
+                elif column == 'compare_at_price' and column in record:
+                    row[column] = None
+            for column in INT_COLUMNS:
+                value = _text(record.get(column))
+                if value is not None:
+                    row[column] = int(float(value))
+        except ValueError:
+            raise FeedError('некорректное число')
+        for column in BOOL_COLUMNS:
+            value = record.get(column)
+            if isinstance(value, bool):
+                row[column] = value
+            elif _text(value) is not None:
+                row[column] = _text(value).lower() in TRUE_VALUES
+
+        if 'price' in row and row['price'] < 0:
+            raise FeedError('некорректная цена')
+        if 'quantity' in row and row['quantity'] < 0:
+            raise FeedError('отрицательный остаток')
+
+        category = _text(record.get('category'))
+        if category is not None:
+            row['category_id'] = self._category_id(slugify(category))
+
+        image = _text(record.get('image_url') or record.get('image'))
+        gallery = _gallery(record.get('gallery'))
+        if image is not None or gallery:
+            gallery = gallery or [image]
+            row['image_url'] = image or gallery[0]
+            row['gallery'] = json.dumps(gallery, ensure_ascii=False)
+
+        if not row.get('slug') and row.get('name'):
+            row['slug'] = slugify(f"{row['name']}-{row['sku']}" if row.get('sku') else row['name'])
+        if not row.get('sku') and not row.get('slug'):
+            raise FeedError('нужен sku, slug или name')
+        return row
+
+    # ---------- запись ----------
+
+    def _statement(self, columns):
+        """
+        (sql, upsert) для набора колонок.
+
+        Записи с name и price - upsert: сначала по sku, затем по slug. Без
+        них товар создать нельзя, поэтому это обновление существующего
+        (например, фид остатков sku + quantity).
+        """
+        statement = self._statements.get(columns)
+        if statement is None:
+            # Строка не переписывается, если ничего не изменилось
+            if 'name' in columns and 'price' in columns:
+                assign = ', '.join(f"{column} = excluded.{column}" for column in columns)
+                changed = f"({', '.join(columns)}) IS NOT ({', '.join('excluded.' + c for c in columns)})"
+                conflicts = ' '.join(
+                    f"ON CONFLICT ({target}) DO UPDATE SET {assign} WHERE {changed}"
+                    for target in ('sku', 'slug')
+                    if target in columns and (target == 'slug' or self.sku_unique)
+                )
+                sql = (
+                    f"INSERT INTO products ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' * len(columns))}) {conflicts}"
+                )
+                statement = (sql, True)
+            else:
+                statement = (self._update_sql(columns), False)
+            self._statements[columns] = statement
+        return statement
+
+    def _update_sql(self, columns):
+        key = 'sku' if 'sku' in columns else 'slug'
+        # Ключ - последний параметр, поэтому набор колонок переставляется
+        updates = [column for column in columns if column != key]
+        assign = ', '.join(f"{column} = ?" for column in updates)
+        changed = f"({', '.join(updates)}) IS NOT ({', '.join('?' * len(updates))})"
+        return f"UPDATE products SET {assign} WHERE {key} = ? AND {changed}"
+
+    def _update_params(self, columns, values):
+        key = 'sku' if 'sku' in columns else 'slug'
+        updates = [value for column, value in zip(columns, values) if column != key]
+        return (*updates, values[columns.index(key)], *updates)
+
+    def _update(self, columns, rows):
+        """Построчное обновление: отличаем отсутствующий товар от неизмененного"""
+        sql, _ = self._statement(columns)
+        key = 'sku' if 'sku' in columns else 'slug'
+        for line_num, values in rows:
+            try:
+                changed = self.conn.execute(sql, self._update_params(columns, values)).rowcount
+            except sqlite3.IntegrityError as e:
+                self._error(line_num, str(e))
+                continue
+            if changed:
+                self.changed += changed
+            elif self.conn.execute(
+                f"SELECT 1 FROM products WHERE {key} = ?", (values[columns.index(key)],)
+            ).fetchone() is None:
+                self._error(line_num, 'товар не найден (для нового товара нужны name и price)')
+
+    def _upsert_by_sku(self, columns, rows):
+        """Upsert без уникального индекса по sku: UPDATE по артикулу, иначе INSERT"""
+        update_sql = self._update_sql(columns)
+        insert_sql, _ = self._statement(columns)
+        for line_num, values in rows:
+            try:
+                changed = self.conn.execute(update_sql, self._update_params(columns, values)).rowcount
+                if not changed and self.conn.execute(
+                    "SELECT 1 FROM products WHERE sku = ?", (values[columns.index('sku')],)
+                ).fetchone() is None:
+                    changed = self.conn.execute(insert_sql, values).rowcount
+            except sqlite3.IntegrityError as e:
+                self._error(line_num, str(e))
+                continue
+            self.changed += changed
+
+    def _error(self, line_num, message):
+        self.errors += 1
+        if len(self.error_samples) < MAX_ERROR_SAMPLES:
+            self.error_samples.append({'line': line_num, 'error': message})
+
+    def _write(self, batch):
+        """Одна транзакция на пачку; при конфликте пачка повторяется построчно"""
+        groups = {}
+        for line_num, row in batch:
+            groups.setdefault(tuple(row), []).append((line_num, tuple(row.values())))
+
+        # Транзакция уже может быть открыта вставкой новой категории
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN IMMEDIATE")
+        # Измененные пачкой товары - по updated_at (его ставит триггер)
+        since = self.conn.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+        try:
+            for columns, rows in groups.items():
+                if len(columns) == 1:
+                    # Только ключ (например, строка остатков с пустым количеством) -
+                    # менять нечего, запись считается неизмененной
+                    continue
+                sql, upsert = self._statement(columns)
+                if not upsert:
+                    self._update(columns, rows)
+                    continue
+                if 'sku' in columns and not self.sku_unique:
+                    self._upsert_by_sku(columns, rows)
+                    continue
+                try:
+                    self.conn.execute("SAVEPOINT stone_import")
+                    self.changed += self.conn.executemany(sql, [values for _, values in rows]).rowcount
+                    self.conn.execute("RELEASE stone_import")
+                except sqlite3.IntegrityError:
+                    self.conn.execute("ROLLBACK TO stone_import")
+                    self.conn.execute("RELEASE stone_import")
+                    for line_num, values in rows:
+                        try:
+                            self.changed += self.conn.execute(sql, values).rowcount
+                        except sqlite3.IntegrityError as e:
+                            self._error(line_num, str(e))
+            # Свертки для поиска - в той же транзакции, что и сами товары
+            fold_products(self.conn, since)
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+    def run(self, records):
+        """Импортирует записи [(номер строки, dict)], возвращает отчет"""
+        started = time.perf_counter()
+        before = self.conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+        batch = []
+        for line_num, record in records:
+            self.rows += 1
+            if isinstance(record, Exception):
+                self._error(line_num, str(record))
+                continue
+            try:
+                batch.append((line_num, self.normalize(record)))
+            except FeedError as e:
+                self._error(line_num, str(e))
+                continue
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+                if self.pause:
+                    time.sleep(self.pause)
+        if batch:
+            self._write(batch)
+        # Новые категории, созданные вне пачек
+        if self.conn.in_transaction:
+            self.conn.commit()
+
+        inserted = self.conn.execute("SELECT COUNT(*) FROM products").fetchone()[0] - before
+        elapsed = time.perf_counter() - started
+        return {
+            'rows': self.rows,
+            'inserted': inserted,
+            'updated': self.changed - inserted,
+            'unchanged': self.rows - self.errors - self.changed,
+            'errors': self.errors,
+            'error_samples': self.error_samples,
+            'elapsed': round(elapsed, 3),
+            'rows_per_sec': round(self.rows / elapsed) if elapsed else self.rows,
+        }
+
+
+def import_stream(db_path, stream, fmt, batch_size=BATCH_SIZE):
+    """Импорт из текстового потока в отдельном соединении (вызывать вне event loop)"""
+    conn = connect(db_path)
+    try:
+        return CatalogImporter(conn, batch_size=batch_size).run(read_records(stream, fmt))
+    finally:
+        conn.close()
+
+
+def import_file(db_path, path, fmt=None, batch_size=BATCH_SIZE):
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        return import_stream(db_path, stream, fmt or detect_format(path), batch_size=batch_size)
+
+
+class BodyReader(io.RawIOBase):
+    """
+    Синхронное чтение тела запроса aiohttp из потока импорта.
+
+    Тело не буферизуется целиком: каждый read ждет очередной кусок из
+    event loop, поэтому память ограничена размером буфера.
+    """
+
+    def __init__(self, content, loop):
+        self.content = content
+        self.loop = loop
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = asyncio.run_coroutine_threadsafe(self.content.read(len(buffer)), self.loop).result()
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def text_stream(content, loop, buffer_size=64 * 1024):
+    return io.TextIOWrapper(io.BufferedReader(BodyReader(content, loop), buffer_size),
+                            encoding='utf-8-sig', newline='')
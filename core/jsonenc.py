@@ -0,0 +1,38 @@
+"""
+Сборка JSON-ответов из заранее закодированных фрагментов.
+
+Товар кодируется в JSON один раз (фрагмент хранится в ProductView и
+пересоздается только вместе с ним), а ответ API собирается склейкой
+байтовых фрагментов: bytes.join считает итоговую длину заранее и
+копирует фрагменты в один выделенный буфер без повторной сериализации.
+"""
+
+import json
+
+
+class RawJSON(bytes):
+    """Уже закодированный JSON - вставляется в ответ как есть"""
+
+    __slots__ = ()
+
+
+def dumps(value):
+    """Компактный JSON в UTF-8"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def join_array(fragments):
+    """[фрагмент, ...] -> RawJSON массива"""
+    return RawJSON(b'[' + b','.join(fragments) + b']')
+
+
+def encode_json(value):
+    """
+    Кодирует value в JSON; значения RawJSON на верхнем уровне словаря
+    вставляются без повторной сериализации.
+    """
+    if isinstance(value, RawJSON):
+        return value
+    if isinstance(value, dict) and any(isinstance(item, RawJSON) for item in value.values()):
+        return b'{' + b','.join(dumps(key) + b':' + encode_json(item) for key, item in value.items()) + b'}'
+    return dumps(value)
@@ -0,0 +1,240 @@
+"""
+Метрики в формате Prometheus (text exposition 0.0.4) без внешних зависимостей.
+
+Middleware считает по каждому маршруту (шаблону пути, а не конкретному
+URL) гистограмму задержек, ответы по кодам и запросы в обработке. Пул БД
+сообщает время каждого запроса с меткой - нормализованным выражением
+(операция и таблицы); медленные запросы пишутся в лог. Время рендера
+считается по каждому шаблону. Все доступно на /metrics.
+
+Запись метрики - несколько операций со словарем и bisect по границам
+корзин, поэтому на запрос это единицы микросекунд. Метрики считаются в
+каждом процессе отдельно: при нескольких воркерах /metrics отдает
+данные того процесса, который принял запрос.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from aiohttp import web
+
+from core.db import DB_KEY
+from core.templates import TEMPLATES_KEY
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Наблюдения приходят и из event loop, и из потоков пула БД
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, *labelvalues, value):
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                # Счетчики по корзинам (последняя - +Inf), сумма
+                state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted((labelvalues, (list(counts), total)) for labelvalues, (counts, total) in self._values.items())
+        for labelvalues, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Набор метрик; collectors обновляют значения перед отдачей /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Ошибка сбора метрик: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# ---------- метрики приложения ----------
+
+class AppMetrics:
+    """Метрики HTTP и БД одного процесса"""
+
+    def __init__(self, slow_query=0.1):
+        self.slow_query = slow_query
+        self.registry = Registry()
+        self.started = time.time()
+        register = self.registry.register
+
+        self.requests = register(Counter(
+            'stone_http_requests_total', 'HTTP-ответы по маршрутам и кодам', ('method', 'route', 'status')))
+        self.latency = register(Histogram(
+            'stone_http_request_duration_seconds', 'Время обработки запроса', ('method', 'route')))
+        self.in_flight = register(Gauge(
+            'stone_http_requests_in_flight', 'Запросы в обработке'))
+        self.queries = register(Histogram(
+            'stone_db_query_duration_seconds', 'Время запросов к БД', ('statement',), QUERY_BUCKETS))
+        self.slow_queries = register(Counter(
+            'stone_db_slow_queries_total', 'Запросы к БД дольше порога', ('statement',)))
+        self.renders = register(Histogram(
+            'stone_template_render_seconds', 'Время рендера шаблонов', ('template',), QUERY_BUCKETS))
+        self.pool = register(Gauge(
+            'stone_db_pool', 'Состояние пула соединений БД', ('state',)))
+        self.uptime = register(Gauge(
+            'stone_process_uptime_seconds', 'Время работы процесса'))
+        self._in_flight = 0
+
+    def observe_query(self, label, elapsed):
+        """Вызывается из потоков пула БД после каждого запроса"""
+        self.queries.observe(elapsed, label)
+        if elapsed >= self.slow_query:
+            self.slow_queries.inc(label)
+            logger.warning(f"🐢 Медленный запрос {label}: {elapsed * 1000:.1f} мс")
+
+    def observe_render(self, name, elapsed):
+        self.renders.observe(elapsed, name)
+
+    def collect_pool(self, db):
+        stats = db.stats()
+        for state in ('in_use', 'idle', 'pending', 'peak_in_use'):
+            self.pool.set(state, value=stats[state])
+        self.uptime.set(value=round(time.time() - self.started, 3))
+
+    def middleware(self):
+        @web.middleware
+        async def metrics_middleware(request, handler):
+            resource = request.match_info.route.resource
+            # Шаблон маршрута ("/api/product/{id}"), а не URL - иначе метки не ограничены
+            route = resource.canonical if resource is not None else 'unmatched'
+            self._in_flight += 1
+            self.in_flight.set(value=self._in_flight)
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status
+                return response
+            except web.HTTPException as e:
+                status = e.status
+                raise
+            finally:
+                self.latency.observe(time.perf_counter() - started, request.method, route)
+                self.requests.inc(request.method, route, status)
+                self._in_flight -= 1
+                self.in_flight.set(value=self._in_flight)
+        return metrics_middleware
+
+
+METRICS_KEY = web.AppKey('metrics', AppMetrics)
+
+
+async def metrics_handler(request):
+    """GET /metrics - текстовый формат Prometheus"""
+    return web.Response(
+        body=request.app[METRICS_KEY].registry.render().encode('utf-8'),
+        headers={'Content-Type': CONTENT_TYPE}
+    )
+
+
+def setup_metrics(app, slow_query_ms=100):
+    """Middleware метрик, хронометраж запросов к БД и рендера шаблонов (вызывать после setup_db)"""
+    metrics = AppMetrics(slow_query=slow_query_ms / 1000)
+    app[METRICS_KEY] = metrics
+    app.middlewares.append(metrics.middleware())
+
+    db = app[DB_KEY]
+    db.on_query = metrics.observe_query
+    templates = app.get(TEMPLATES_KEY)
+    if templates is not None:
+        templates.on_render = metrics.observe_render
+    metrics.registry.add_collector(lambda: metrics.collect_pool(db))
+    return metrics
@@ -0,0 +1,473 @@
+"""
+Версионированные миграции схемы.
+
+Текущая версия схемы хранится в PRAGMA user_version. Каждая миграция
+выполняется в своей транзакции и применяется ровно один раз.
+"""
+
+import logging
+import re
+
+from core.changes import create_change_tracking, track_table
+from core.textfold import TRANSLIT_TABLE, fold_products
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Регистрирует функцию migrate(cursor) под номером версии"""
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return decorator
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def latest_version():
+    return max((m[0] for m in MIGRATIONS), default=0)
+
+
+def apply_migrations(conn):
+    """Применяет недостающие миграции, возвращает итоговую версию схемы"""
+    current = schema_version(conn)
+    if current >= latest_version():
+        return current
+
+    for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version <= current:
+            continue
+        cursor = conn.cursor()
+        # IMMEDIATE: несколько процессов могут стартовать одновременно -
+        # миграцию выполнит тот, кто первым возьмет блокировку записи
+        cursor.execute("BEGIN IMMEDIATE")
+        if schema_version(conn) >= version:
+            conn.rollback()
+            current = schema_version(conn)
+            continue
+        try:
+            fn(cursor)
+            cursor.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+        logger.info(f"🧱 Миграция {version}: {description}")
+    return current
+
+
+@migration(1, "базовая схема магазина")
+def base_schema(cursor):
+    # Таблица веб-виджетов
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS web_widgets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            widget_type VARCHAR(50) NOT NULL,
+            title VARCHAR(255),
+            content TEXT,
+            config TEXT,
+            is_active BOOLEAN DEFAULT TRUE,
+            position INTEGER DEFAULT 0,
+            sort_order INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Таблица категорий
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(100) NOT NULL,
+            slug VARCHAR(100) UNIQUE,
+            parent_id INTEGER DEFAULT NULL,
+            sort_order INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Таблица товаров
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(255) NOT NULL,
+            slug VARCHAR(255) UNIQUE,
+            description TEXT,
+            price DECIMAL(10, 2) NOT NULL,
+            compare_at_price DECIMAL(10, 2),
+            image_url TEXT,
+            gallery TEXT,  -- JSON array of images
+            category_id INTEGER,
+            brand VARCHAR(100),
+            sku VARCHAR(100),
+            color VARCHAR(50),
+            size VARCHAR(50),
+            material VARCHAR(100),
+            discount_percent INTEGER DEFAULT 0,
+            quantity INTEGER DEFAULT 0,
+            is_featured BOOLEAN DEFAULT FALSE,
+            is_active BOOLEAN DEFAULT TRUE,
+            views INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        )
+    """)
+
+    # Таблица карусели
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS carousel_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title VARCHAR(255),
+            subtitle VARCHAR(255),
+            image_url TEXT NOT NULL,
+            link_url VARCHAR(500),
+            button_text VARCHAR(100),
+            is_active BOOLEAN DEFAULT TRUE,
+            sort_order INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Версии таблиц и триггеры для инвалидации кэшей
+    create_change_tracking(cursor)
+
+
+# Колонки, которых может не быть в старых базах магазина: таблицы создавались
+# раньше миграций, и CREATE TABLE IF NOT EXISTS их не меняет. ADD COLUMN
+# допускает только постоянные значения по умолчанию, поэтому время создания
+# и изменения заполняется отдельно
+LEGACY_COLUMNS = {
+    'products': (
+        ('slug', 'VARCHAR(255)'),
+        ('description', 'TEXT'),
+        ('compare_at_price', 'DECIMAL(10, 2)'),
+        ('image_url', 'TEXT'),
+        ('gallery', 'TEXT'),
+        ('category_id', 'INTEGER'),
+        ('brand', 'VARCHAR(100)'),
+        ('sku', 'VARCHAR(100)'),
+        ('color', 'VARCHAR(50)'),
+        ('size', 'VARCHAR(50)'),
+        ('material', 'VARCHAR(100)'),
+        ('discount_percent', 'INTEGER DEFAULT 0'),
+        ('quantity', 'INTEGER DEFAULT 0'),
+        ('is_featured', 'BOOLEAN DEFAULT FALSE'),
+        ('is_active', 'BOOLEAN DEFAULT TRUE'),
+        ('views', 'INTEGER DEFAULT 0'),
+        ('created_at', 'TIMESTAMP'),
+        ('updated_at', 'TIMESTAMP'),
+    ),
+    'categories': (
+        ('slug', 'VARCHAR(100)'),
+        ('parent_id', 'INTEGER DEFAULT NULL'),
+        ('sort_order', 'INTEGER DEFAULT 0'),
+        ('created_at', 'TIMESTAMP'),
+    ),
+}
+
+
+def _column_names(cursor, table):
+    return {row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+def _category_slug(name, category_id, taken):
+    slug = re.sub(r'[^\w]+', '-', (name or '').lower().translate(TRANSLIT_TABLE)).strip('-_')[:90]
+    slug = slug or f'category-{category_id}'
+    if slug in taken:
+        slug = f'{slug}-{category_id}'
+    taken.add(slug)
+    return slug
+
+
+def _upgrade_legacy_tables(cursor):
+    """Добавляет недостающие колонки products и categories (старые базы до миграций)"""
+    added = {}
+    for table, columns in LEGACY_COLUMNS.items():
+        existing = _column_names(cursor, table)
+        added[table] = [name for name, _ in columns if name not in existing]
+        for name, definition in columns:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+        if not added[table]:
+            continue
+        logger.info(f"🧱 {table}: добавлены колонки {', '.join(added[table])}")
+
+        for name in ('created_at', 'updated_at'):
+            if name in added[table]:
+                cursor.execute(f"UPDATE {table} SET {name} = CURRENT_TIMESTAMP WHERE {name} IS NULL")
+        if 'slug' in added[table]:
+            # UNIQUE нельзя добавить через ADD COLUMN - уникальность держит индекс
+            cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_slug ON {table} (slug)")
+
+    if 'updated_at' in added['products']:
+        # Сторонние писатели старой базы не знают о created_at/updated_at,
+        # а по updated_at читается дельта каталога
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS products_insert_timestamps
+            AFTER INSERT ON products
+            WHEN NEW.updated_at IS NULL
+            BEGIN
+                UPDATE products
+                SET created_at = COALESCE(NEW.created_at, CURRENT_TIMESTAMP), updated_at = CURRENT_TIMESTAMP
+                WHERE id = NEW.id;
+            END
+        """)
+
+    # Категории без slug не попадают в дерево и фильтры каталога
+    rows = cursor.execute("SELECT id, name, slug FROM categories ORDER BY id").fetchall()
+    taken = {row[2] for row in rows if row[2]}
+    cursor.executemany("UPDATE categories SET slug = ? WHERE id = ?", [
+        (_category_slug(row[1], row[0], taken), row[0]) for row in rows if not row[2]
+    ])
+
+
+@migration(2, "индексы для выдачи товаров, категорий и рекомендуемых")
+def listing_indexes(cursor):
+    # Старая база (таблицы созданы до миграций): сначала недостающие колонки,
+    # затем индексы по ним. Здесь, а не в миграции 1: такие базы могли
+    # остановиться на версии 1
+    _upgrade_legacy_tables(cursor)
+
+    # Основная выдача: частичный индекс в порядке сортировки,
+    # поэтому ни OFFSET, ни курсор не сортируют таблицу заново
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_products_listing
+        ON products (is_featured DESC, created_at DESC, id DESC)
+        WHERE is_active = TRUE AND quantity > 0
+    """)
+
+    # Выдача по категории (slug -> id через UNIQUE-индекс categories.slug)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_products_category_listing
+        ON products (category_id, is_featured DESC, created_at DESC, id DESC)
+        WHERE is_active = TRUE AND quantity > 0
+    """)
+
+    # Только рекомендуемые товары
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_products_featured
+        ON products (created_at DESC, id DESC)
+        WHERE is_active = TRUE AND quantity > 0 AND is_featured = TRUE
+    """)
+
+    # Дельта для модели каталога
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_products_updated_at
+        ON products (updated_at)
+    """)
+
+    # Виджеты и карусель на главной
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_web_widgets_active
+        ON web_widgets (is_active, position, sort_order)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_carousel_items_active
+        ON carousel_items (is_active, sort_order)
+    """)
+
+
+# Поля товара, попадающие в полнотекстовый индекс
+FTS_COLUMNS = ('name', 'description', 'brand', 'color', 'material', 'sku')
+
+# Сначала сырые поля, затем свертки (скелет и транслит) из колонки search_folded.
+# Свертки пишет приложение (core.textfold.fold_products): триггеры не должны
+# зависеть от SQL-функций, которых нет у sqlite3 CLI и сторонних скриптов
+FTS_VALUES = (
+    "NEW.id, NEW.name, NEW.description, NEW.brand, NEW.color, NEW.material, NEW.sku, "
+    "NEW.search_folded"
+)
+
+
+def _add_search_folded(cursor):
+    """Колонка сверток для поиска, заполненная для всех товаров"""
+    if 'search_folded' not in _column_names(cursor, 'products'):
+        cursor.execute("ALTER TABLE products ADD COLUMN search_folded TEXT")
+    fold_products(cursor)
+
+
+def _create_fts_triggers(cursor):
+    """Триггеры синхронизации products_fts; запись переиндексируется только при изменении текста"""
+    cursor.execute("DROP TRIGGER IF EXISTS products_fts_insert")
+    cursor.execute("DROP TRIGGER IF EXISTS products_fts_update")
+    cursor.execute("DROP TRIGGER IF EXISTS products_fts_delete")
+
+    indexed = FTS_COLUMNS + ('search_folded',)
+    cursor.execute(f"""
+        CREATE TRIGGER products_fts_insert
+        AFTER INSERT ON products
+        BEGIN
+            INSERT INTO products_fts (rowid, {', '.join(FTS_COLUMNS)}, folded)
+            VALUES ({FTS_VALUES});
+        END
+    """)
+    # Импорт перезаписывает все колонки фида; обновление цены или остатка
+    # не должно пересобирать запись полнотекстового индекса
+    changed = ' OR '.join(f"OLD.{column} IS NOT NEW.{column}" for column in indexed)
+    cursor.execute(f"""
+        CREATE TRIGGER products_fts_update
+        AFTER UPDATE OF {', '.join(indexed)} ON products
+        WHEN {changed}
+        BEGIN
+            DELETE FROM products_fts WHERE rowid = OLD.id;
+            INSERT INTO products_fts (rowid, {', '.join(FTS_COLUMNS)}, folded)
+            VALUES ({FTS_VALUES});
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER products_fts_delete
+        AFTER DELETE ON products
+        BEGIN
+            DELETE FROM products_fts WHERE rowid = OLD.id;
+        END
+    """)
+
+
+def _index_products(cursor):
+    """Заново заполняет products_fts по всем товарам"""
+    cursor.execute("DELETE FROM products_fts")
+    cursor.execute(f"""
+        INSERT INTO products_fts (rowid, {', '.join(FTS_COLUMNS)}, folded)
+        SELECT id, {', '.join(FTS_COLUMNS)}, search_folded
+        FROM products
+    """)
+
+
+@migration(3, "полнотекстовый поиск FTS5 по товарам")
+def products_fts(cursor):
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            {', '.join(FTS_COLUMNS)}, folded,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+
+    # Ранжирование BM25: название и артикул важнее описания
+    cursor.execute("""
+        INSERT INTO products_fts (products_fts, rank)
+        VALUES ('rank', 'bm25(10.0, 1.0, 4.0, 2.0, 2.0, 8.0, 6.0)')
+    """)
+
+    _add_search_folded(cursor)
+    _create_fts_triggers(cursor)
+    # Индексируем уже существующие товары
+    _index_products(cursor)
+
+
+@migration(4, "снимки корзин покупателей")
+def carts(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS carts (
+            owner VARCHAR(100) PRIMARY KEY,  -- tg:<user id> или s:<токен сессии>
+            items TEXT NOT NULL,             -- JSON {product_id: quantity}
+            updated_at REAL NOT NULL         -- unix time последнего изменения
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_carts_updated_at
+        ON carts (updated_at)
+    """)
+
+    # Снимки других процессов сбрасывают закэшированные корзины
+    track_table(cursor, 'carts')
+
+
+@migration(5, "заказы и резервирование остатков")
+def orders(cursor):
+    # Имена shop_* - в старых базах уже бывают свои таблицы orders/order_items
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS shop_orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            owner VARCHAR(100) NOT NULL,     -- владелец корзины (tg:... или s:...)
+            status VARCHAR(20) NOT NULL,     -- reserved, confirmed, cancelled, expired
+            total DECIMAL(10, 2) NOT NULL,
+            customer TEXT,                   -- JSON с контактами покупателя
+            created_at REAL NOT NULL,
+            expires_at REAL,                 -- до этого времени держится резерв
+            updated_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS shop_order_items (
+            order_id INTEGER NOT NULL REFERENCES shop_orders (id),
+            product_id INTEGER NOT NULL REFERENCES products (id),
+            quantity INTEGER NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            PRIMARY KEY (order_id, product_id)
+        ) WITHOUT ROWID
+    """)
+
+    # Поиск просроченных резервов и заказов покупателя
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_shop_orders_reserved
+        ON shop_orders (expires_at)
+        WHERE status = 'reserved'
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_shop_orders_owner
+        ON shop_orders (owner, created_at DESC)
+    """)
+
+
+def ensure_sku_index(conn):
+    """
+    Уникальный индекс по sku, по которому импорт делает ON CONFLICT; True,
+    если он есть. Пока в базе есть повторяющиеся артикулы, индекс не
+    создается и старт не блокируется: импорт сопоставляет такие товары
+    обычным UPDATE, а индекс появится, когда повторы будут исправлены.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_products_sku'").fetchone():
+        return True
+    duplicates = conn.execute("""
+        SELECT sku FROM products
+        WHERE sku IS NOT NULL
+        GROUP BY sku HAVING COUNT(*) > 1
+        LIMIT 10
+    """).fetchall()
+    if duplicates:
+        logger.warning(
+            "⚠️ Повторяющиеся артикулы товаров: " + ', '.join(row[0] for row in duplicates)
+            + " - уникальный индекс по sku не создан"
+        )
+        return False
+
+    # Пустой sku не ограничивается
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_products_sku
+        ON products (sku)
+    """)
+    return True
+
+
+@migration(6, "импорт фидов: уникальный артикул, переиндексация поиска только при изменении текста")
+def feed_import(cursor):
+    # Импорт обновляет товары по sku (ON CONFLICT); при повторах в данных
+    # индекс создаст импорт после их исправления
+    ensure_sku_index(cursor)
+
+    # Триггер products_fts_update с условием WHEN создается в _create_fts_triggers
+
+
+@migration(7, "выгрузка заказов по времени изменения")
+def orders_updated_at(cursor):
+    # Инкрементальная выгрузка в ERP: WHERE updated_at >= ? ORDER BY updated_at
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_shop_orders_updated_at
+        ON shop_orders (updated_at)
+    """)
+
+
+@migration(8, "свертки для поиска в колонке products.search_folded вместо SQL-функции")
+def search_folded(cursor):
+    # Прежние триггеры вызывали stone_fold(), зарегистрированную только в
+    # соединениях приложения, и любая другая запись в products падала
+    _add_search_folded(cursor)
+    _create_fts_triggers(cursor)
+    _index_products(cursor)
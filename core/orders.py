@@ -0,0 +1,336 @@
+"""
+Заказы и резервирование остатков.
+
+Все изменения заказов проходят через одного писателя: операции встают в
+очередь, писатель забирает сразу все накопившиеся (до max_batch) и
+выполняет их одной транзакцией. Пока идет фиксация одного пакета, в
+очереди собирается следующий, поэтому при наплыве покупателей сотни
+заказов стоят одной записи в журнал. Каждая операция внутри пакета -
+отдельный SAVEPOINT: если товара не хватило, откатывается только она.
+
+Остаток списывается условным UPDATE ... WHERE quantity >= ?, поэтому
+продать больше, чем есть на складе, нельзя и при нескольких процессах.
+Заказ держит резерв reservation_ttl секунд; неподтвержденные заказы
+после этого помечаются expired, а товар возвращается на склад.
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+from aiohttp import web
+
+from core.db import DB_KEY, on_db_close
+
+logger = logging.getLogger(__name__)
+
+RESERVE_SQL = """
+    UPDATE products SET quantity = quantity - ?
+    WHERE id = ? AND is_active = TRUE AND quantity >= ?
+    RETURNING price
+"""
+RELEASE_SQL = "UPDATE products SET quantity = quantity + ? WHERE id = ?"
+
+# Сколько просроченных заказов освобождается за одну операцию
+EXPIRE_LIMIT = 500
+
+
+class OrderError(ValueError):
+    """Операцию с заказом нельзя выполнить (нет остатка, неверный статус)"""
+
+
+class OrderNotFound(OrderError):
+    """Заказ не найден или принадлежит другому покупателю"""
+
+
+class OrdersUnavailable(OrderError):
+    """Писатель не запущен или останавливается - заказы не принимаются"""
+
+
+# ---------- операции писателя: fn(conn, now, *args), выполняются в транзакции пакета ----------
+
+def _place(conn, now, owner, lines, customer, ttl):
+    total = 0
+    prices = []
+    # Строки в порядке id товара - одинаковый порядок блокировок во всех заказах
+    for product_id, quantity in lines:
+        row = conn.execute(RESERVE_SQL, (quantity, product_id, quantity)).fetchone()
+        if row is None:
+            left = conn.execute(
+                "SELECT quantity FROM products WHERE id = ? AND is_active = TRUE", (product_id,)
+            ).fetchone()
+            if left is None:
+                raise OrderError(f'Товар {product_id} недоступен')
+            raise OrderError(f'Недостаточно товара {product_id} на складе (доступно {left[0] or 0})')
+        prices.append(row[0])
+        total += row[0] * quantity
+
+    total = round(total, 2)
+    expires_at = now + ttl
+    order_id = conn.execute("""
+        INSERT INTO shop_orders (owner, status, total, customer, created_at, expires_at, updated_at)
+        VALUES (?, 'reserved', ?, ?, ?, ?, ?)
+        RETURNING id
+    """, (owner, total, customer, now, expires_at, now)).fetchone()[0]
+    conn.executemany(
+        "INSERT INTO shop_order_items (order_id, product_id, quantity, price) VALUES (?, ?, ?, ?)",
+        [(order_id, product_id, quantity, price) for (product_id, quantity), price in zip(lines, prices)]
+    )
+    return {
+        'id': order_id,
+        'status': 'reserved',
+        'total': total,
+        'expires_at': expires_at,
+        'items': [
+            {'id': product_id, 'quantity': quantity, 'price': price}
+            for (product_id, quantity), price in zip(lines, prices)
+        ],
+    }
+
+
+def _release(conn, now, order_ids, status):
+    """Возвращает товар заказов на склад и переводит их в status"""
+    marks = ', '.join('?' * len(order_ids))
+    conn.executemany(RELEASE_SQL, conn.execute(
+        f"SELECT quantity, product_id FROM shop_order_items WHERE order_id IN ({marks})", order_ids
+    ).fetchall())
+    conn.execute(
+        f"UPDATE shop_orders SET status = ?, expires_at = NULL, updated_at = ? WHERE id IN ({marks})",
+        (status, now, *order_ids)
+    )
+
+
+def _reserved(conn, order_id, owner):
+    row = conn.execute(
+        "SELECT status, expires_at FROM shop_orders WHERE id = ? AND owner = ?", (order_id, owner)
+    ).fetchone()
+    if row is None:
+        raise OrderNotFound('Заказ не найден')
+    if row['status'] != 'reserved':
+        raise OrderError(f"Заказ уже в статусе {row['status']}")
+    return row
+
+
+def _confirm(conn, now, owner, order_id):
+    if _reserved(conn, order_id, owner)['expires_at'] < now:
+        # Резерв освободит ближайшая проверка просроченных заказов
+        raise OrderError('Время резерва истекло')
+    conn.execute(
+        "UPDATE shop_orders SET status = 'confirmed', expires_at = NULL, updated_at = ? WHERE id = ?",
+        (now, order_id)
+    )
+    return {'id': order_id, 'status': 'confirmed'}
+
+
+def _cancel(conn, now, owner, order_id):
+    _reserved(conn, order_id, owner)
+    _release(conn, now, [order_id], 'cancelled')
+    return {'id': order_id, 'status': 'cancelled'}
+
+
+def _expire(conn, now, limit):
+    order_ids = [row[0] for row in conn.execute(
+        "SELECT id FROM shop_orders WHERE status = 'reserved' AND expires_at < ? LIMIT ?", (now, limit)
+    )]
+    if order_ids:
+        _release(conn, now, order_ids, 'expired')
+    return len(order_ids)
+
+
+def _apply_batch(conn, ops, now):
+    """
+    Выполняет пакет операций одной транзакцией.
+
+    Результат - список значений или исключений по операциям: ошибка одной
+    операции откатывает только ее SAVEPOINT.
+    """
+    results = []
+    # IMMEDIATE сразу берет блокировку записи: ожидание другого процесса
+    # укладывается в busy_timeout, а не заканчивается ошибкой при повышении
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for fn, args in ops:
+            conn.execute("SAVEPOINT stone_op")
+            try:
+                results.append(fn(conn, now, *args))
+            except Exception as e:
+                conn.execute("ROLLBACK TO stone_op")
+                results.append(e)
+            conn.execute("RELEASE stone_op")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return results
+
+
+class OrderService:
+    """Заказы с резервированием остатков через единственного писателя"""
+
+    def __init__(self, db, reservation_ttl=15 * 60, max_batch=256, expire_interval=30.0):
+        self.db = db
+        self.reservation_ttl = reservation_ttl
+        self.max_batch = max_batch
+        self.expire_interval = expire_interval
+        self._queue = None
+        self._writer = None
+        self._expirer = None
+        self._stopping = False
+
+        # Метрики group commit
+        self.batches = 0
+        self.operations = 0
+        self.largest_batch = 0
+        self.expired = 0
+
+    # ---------- писатель ----------
+
+    async def _submit(self, fn, *args):
+        if self._writer is None or self._stopping:
+            raise OrdersUnavailable('Прием заказов временно остановлен')
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((fn, args, future))
+        return await future
+
+    async def _run_writer(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            # Все, что накопилось, пока фиксировался прошлый пакет
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._commit(batch)
+            if stop:
+                return
+
+    async def _commit(self, batch):
+        try:
+            results = await self.db.run(_apply_batch, [(fn, args) for fn, args, _ in batch], time.time())
+        except Exception as e:
+            logger.error(f"Ошибка записи пакета заказов: {e}")
+            results = [e] * len(batch)
+        else:
+            self.batches += 1
+            self.operations += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+        for (_, _, future), result in zip(batch, results):
+            # Покупатель мог не дождаться ответа - заказ все равно записан
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    # ---------- операции ----------
+
+    async def place(self, owner, lines, customer=None):
+        """
+        Резервирует товар и создает заказ.
+
+        lines - [(product_id, quantity)] без повторов id. Цены берутся из БД
+        в момент списания остатка.
+        """
+        lines = sorted(lines)
+        customer = json.dumps(customer, ensure_ascii=False) if customer else None
+        return await self._submit(_place, owner, lines, customer, self.reservation_ttl)
+
+    async def confirm(self, owner, order_id):
+        return await self._submit(_confirm, owner, order_id)
+
+    async def cancel(self, owner, order_id):
+        return await self._submit(_cancel, owner, order_id)
+
+    async def expire(self):
+        """Освобождает просроченные резервы, возвращает число заказов"""
+        count = await self._submit(_expire, EXPIRE_LIMIT)
+        self.expired += count
+        return count
+
+    async def get(self, owner, order_id):
+        """Заказ покупателя с позициями (чтение идет мимо писателя)"""
+        order = await self.db.fetch_one("""
+            SELECT id, status, total, created_at, expires_at, updated_at
+            FROM shop_orders WHERE id = ? AND owner = ?
+        """, (order_id, owner))
+        if order is None:
+            raise OrderNotFound('Заказ не найден')
+        order['items'] = await self.db.fetch_all("""
+            SELECT oi.product_id AS id, oi.quantity, oi.price, p.name
+            FROM shop_order_items oi
+            LEFT JOIN products p ON p.id = oi.product_id
+            WHERE oi.order_id = ?
+        """, (order_id,))
+        return order
+
+    # ---------- жизненный цикл ----------
+
+    async def _run_expirer(self):
+        while True:
+            await asyncio.sleep(self.expire_interval)
+            try:
+                count = await self.expire()
+                if count:
+                    logger.info(f"⏳ Снят резерв с просроченных заказов: {count}")
+            except Exception as e:
+                logger.error(f"Ошибка снятия просроченных резервов: {e}")
+
+    def start(self):
+        self._stopping = False
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.ensure_future(self._run_writer())
+        self._expirer = asyncio.ensure_future(self._run_expirer())
+
+    async def stop(self):
+        # Новые операции отклоняются, уже принятые дописываются
+        self._stopping = True
+        if self._expirer is not None:
+            self._expirer.cancel()
+            try:
+                await self._expirer
+            except asyncio.CancelledError:
+                pass
+            self._expirer = None
+        if self._writer is not None:
+            # Заказы, уже стоящие в очереди, записываются до остановки
+            self._queue.put_nowait(None)
+            await self._writer
+            self._writer = None
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'batches': self.batches,
+            'operations': self.operations,
+            'largest_batch': self.largest_batch,
+            'avg_batch': round(self.operations / self.batches, 2) if self.batches else 0,
+            'expired': self.expired,
+        }
+
+
+ORDERS_KEY = web.AppKey('orders', OrderService)
+
+
+def setup_orders(app, reservation_ttl=15 * 60, max_batch=256):
+    orders = OrderService(app[DB_KEY], reservation_ttl=reservation_ttl, max_batch=max_batch)
+    app[ORDERS_KEY] = orders
+
+    async def start_orders(app):
+        orders.start()
+
+    async def stop_orders(app):
+        await orders.stop()
+
+    app.on_startup.append(start_orders)
+    # Очередь дописывается после обработчиков запросов, но до закрытия пула БД
+    on_db_close(app, stop_orders)
+    return orders
@@ -0,0 +1,71 @@
+"""
+Кэш отрендеренных страниц.
+
+Ключ записи включает версии таблиц, из которых собрана страница, поэтому
+устаревшая версия никогда не отдается. Кроме того, при изменении этих
+таблиц наблюдатель сразу очищает кэш, чтобы не держать мертвые записи.
+"""
+
+import asyncio
+import logging
+
+from aiohttp import web
+
+from core.changes import CHANGES_KEY
+from core.http import CachedBody
+
+logger = logging.getLogger(__name__)
+
+
+class PageCache:
+    """Отрендеренные страницы вместе с gzip-вариантом и ETag"""
+
+    def __init__(self, watcher, tables):
+        self.watcher = watcher
+        self.tables = tuple(tables)
+        self._pages = {}
+        self._rendering = {}
+        self.hits = 0
+        self.misses = 0
+        watcher.subscribe(self.tables, self.invalidate)
+
+    def key(self, name, *extra):
+        return (name,) + tuple(self.watcher.version(table) for table in self.tables) + extra
+
+    async def invalidate(self, changed=None):
+        if self._pages:
+            logger.info(f"♻️ Кэш страниц сброшен ({', '.join(sorted(changed or ()))})")
+        self._pages.clear()
+
+    async def get(self, key, render, content_type='text/html'):
+        """Возвращает CachedBody; render() - корутина, возвращающая str"""
+        page = self._pages.get(key)
+        if page is not None:
+            self.hits += 1
+            return page
+
+        # Одновременные промахи ждут один рендер
+        future = self._rendering.get(key)
+        if future is None:
+            self.misses += 1
+            future = asyncio.ensure_future(self._render(key, render, content_type))
+            self._rendering[key] = future
+            future.add_done_callback(lambda _: self._rendering.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _render(self, key, render, content_type):
+        html = await render()
+        page = CachedBody(html.encode('utf-8'), content_type)
+        # Пока шел рендер, данные могли измениться - такую версию не сохраняем
+        if key[1:1 + len(self.tables)] == tuple(self.watcher.version(t) for t in self.tables):
+            self._pages[key] = page
+        return page
+
+
+PAGE_CACHE_KEY = web.AppKey('page_cache', PageCache)
+
+
+def setup_page_cache(app, tables=('web_widgets', 'products', 'carousel_items')):
+    cache = PageCache(app[CHANGES_KEY], tables)
+    app[PAGE_CACHE_KEY] = cache
+    return cache
@@ -0,0 +1,215 @@
+"""
+Профилирование работающего воркера по запросу администратора.
+
+Два режима на заданное окно времени:
+- sample - выборочный профилировщик: отдельный поток раз в interval
+  снимает стек потока event loop (sys._current_frames) и считает
+  одинаковые стеки. Накладные расходы - обход стека несколько сотен раз
+  в секунду, результат - collapsed stacks ("a;b;c 42") для flamegraph.pl
+  и speedscope;
+- cprofile - детерминированный cProfile на потоке event loop, результат -
+  отчет pstats или дамп для snakeviz. Точнее по числу вызовов, но
+  заметно замедляет воркер на время окна.
+
+В режиме sample можно ограничиться одним маршрутом: в отчет попадают
+только стеки, внутри которых выполняется обработчик этого маршрута.
+Фильтр работает по объекту кода обработчика, без middleware, поэтому
+пока профилирование выключено, запросы не платят ничего.
+
+Профилируется тот процесс, который принял запрос; одновременно может
+идти только одна сессия.
+"""
+
+import asyncio
+import cProfile
+import io
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MAX_SECONDS = 120
+MIN_INTERVAL = 0.001
+PROFILE_MODES = ('sample', 'cprofile')
+
+
+class ProfilerBusy(RuntimeError):
+    """Сессия профилирования уже идет"""
+
+
+def _where(code):
+    """Подпись кадра: функция и файл относительно проекта (или библиотеки)"""
+    path = code.co_filename
+    if path.startswith(ROOT + os.sep):
+        path = os.path.relpath(path, ROOT)
+    else:
+        path = '/'.join(path.split(os.sep)[-2:])
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+def _unwrap(handler):
+    """Исходная функция за functools.partial, связанным методом или декоратором с @wraps"""
+    while True:
+        inner = getattr(handler, 'func', None) or getattr(handler, '__func__', None) \
+            or getattr(handler, '__wrapped__', None)
+        if inner is None:
+            return handler
+        handler = inner
+
+
+def route_codes(app, path):
+    """Объекты кода обработчиков маршрута с шаблоном path ("/api/product/{id}")"""
+    codes = set()
+    for resource in app.router.resources():
+        if resource.canonical != path:
+            continue
+        for route in resource:
+            code = getattr(_unwrap(route.handler), '__code__', None)
+            if code is not None:
+                codes.add(code)
+    return codes
+
+
+class Sampler(threading.Thread):
+    """Поток, снимающий стеки потоков процесса раз в interval секунд"""
+
+    def __init__(self, thread_id, interval, codes=None, all_threads=False):
+        super().__init__(name='stone-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.codes = codes
+        self.all_threads = all_threads
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                if thread_id != self.thread_id and not self.all_threads:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                if self.codes is not None:
+                    # Только стеки, в которых выполняется обработчик маршрута
+                    if thread_id != self.thread_id or self.codes.isdisjoint(stack):
+                        continue
+                if self.all_threads:
+                    if thread_id not in names:
+                        names[thread_id] = next(
+                            (t.name for t in threading.enumerate() if t.ident == thread_id), str(thread_id))
+                    stack.append(names[thread_id])
+                self.stacks[tuple(stack)] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        """Стеки в формате collapsed (от корня к листу), самые частые первыми"""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            frames = [frame if isinstance(frame, str) else _where(frame) for frame in reversed(stack)]
+            lines.append(f"{';'.join(frames)} {count}")
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def top(self, limit=30):
+        """Функции с наибольшим собственным временем (доля выборок на вершине стека)"""
+        total = sum(self.stacks.values()) or 1
+        own = Counter()
+        for stack, count in self.stacks.items():
+            leaf = next((frame for frame in stack if not isinstance(frame, str)), None)
+            if leaf is not None:
+                own[leaf] += count
+        return [
+            {'function': _where(code), 'samples': count, 'percent': round(count / total * 100, 2)}
+            for code, count in own.most_common(limit)
+        ]
+
+
+class Profiler:
+    """Сессии профилирования одного процесса (не более одной одновременно)"""
+
+    def __init__(self):
+        self.running = None
+        self.sessions = 0
+
+    def _begin(self, mode):
+        if self.running is not None:
+            raise ProfilerBusy(f'Уже идет профилирование ({self.running})')
+        if mode == 'cprofile' and sys.getprofile() is not None:
+            raise ProfilerBusy('В процессе уже работает другой профилировщик')
+        self.running = mode
+        self.sessions += 1
+
+    async def sample(self, seconds, interval=0.005, codes=None, all_threads=False):
+        """Выборочное профилирование потока event loop в течение seconds"""
+        self._begin('sample')
+        sampler = Sampler(threading.get_ident(), interval, codes=codes, all_threads=all_threads)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+            self.running = None
+        logger.info(
+            f"🔬 Профилирование (sample): {sampler.samples} выборок за "
+            f"{time.perf_counter() - started:.1f} с, {len(sampler.stacks)} стеков"
+        )
+        return sampler
+
+    async def cprofile(self, seconds):
+        """cProfile потока event loop в течение seconds; возвращает pstats.Stats"""
+        self._begin('cprofile')
+        # enable в обработчике включает профилировщик для потока event loop,
+        # то есть для всех задач, которые он выполняет в это окно
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+            self.running = None
+        stats = pstats.Stats(profile)
+        logger.info(f"🔬 Профилирование (cprofile): {stats.total_calls} вызовов за {seconds} с")
+        return stats
+
+    def stats(self):
+        return {'running': self.running, 'sessions': self.sessions}
+
+
+def pstats_text(stats, sort='cumulative', limit=60):
+    buffer = io.StringIO()
+    stats.stream = buffer
+    stats.sort_stats(sort).print_stats(limit)
+    return buffer.getvalue()
+
+
+def pstats_dump(stats):
+    """Двоичный дамп как у Stats.dump_stats (открывается snakeviz и pstats)"""
+    return marshal.dumps(stats.stats)
+
+
+PROFILER_KEY = web.AppKey('profiler', Profiler)
+
+
+def setup_profiler(app):
+    app[PROFILER_KEY] = Profiler()
+    return app[PROFILER_KEY]
@@ -0,0 +1,104 @@
+"""
+Поиск товаров через FTS5.
+
+Каждое слово запроса превращается в группу вариантов (исходное слово,
+скелет, транслит) с префиксным поиском, группы объединяются через AND.
+Ранжирование - BM25 с весами, заданными в миграции products_fts.
+
+Свертки товаров (products.search_folded) пишут импорт и демо-данные; для
+товаров, измененных в обход приложения (sqlite3 CLI, админские скрипты),
+их пересчитывает сервис поиска, как только наблюдатель заметит изменение.
+"""
+
+import logging
+
+from aiohttp import web
+
+from core.cache import LRUCache
+from core.catalog import CATALOG_KEY
+from core.changes import CHANGES_KEY
+from core.db import DB_KEY
+from core.textfold import fold_products, fold_word, words
+
+logger = logging.getLogger(__name__)
+
+MAX_QUERY_WORDS = 8
+
+SEARCH_SQL = """
+    SELECT f.rowid
+    FROM products_fts f
+    JOIN products p ON p.id = f.rowid
+    WHERE products_fts MATCH ? AND p.is_active = TRUE AND p.quantity > 0
+    ORDER BY f.rank
+    LIMIT ?
+"""
+
+
+def build_match(query):
+    """Строит выражение MATCH; None если искать нечего"""
+    groups = []
+    for word in words(query)[:MAX_QUERY_WORDS]:
+        variants = ' OR '.join(f'"{variant}"*' for variant in sorted(fold_word(word)))
+        groups.append(f'({variants})')
+    return ' AND '.join(groups) or None
+
+
+class SearchService:
+    """Поиск по каталогу с LRU-кэшем популярных запросов"""
+
+    def __init__(self, db, catalog, cache_size=512):
+        self.db = db
+        self.catalog = catalog
+        self.cache = LRUCache(cache_size)
+        self._cache_version = None
+        # Время БД последнего пересчета сверток
+        self._folded_at = None
+
+    async def search(self, query, limit=10):
+        """Товары (ProductView модели каталога) в порядке релевантности"""
+        match = build_match(query)
+        if match is None:
+            return []
+
+        # Кэш действителен для одной версии каталога
+        if self._cache_version != self.catalog.version:
+            self.cache.clear()
+            self._cache_version = self.catalog.version
+
+        key = (match, limit)
+        ids = self.cache.get(key)
+        if ids is None:
+            rows = await self.db.fetch_all(SEARCH_SQL, (match, limit))
+            ids = [row['rowid'] for row in rows]
+            self.cache.set(key, ids)
+
+        products = []
+        for product_id in ids:
+            view = self.catalog.get(product_id)
+            if view is not None:
+                products.append(view)
+        return products
+
+    async def on_change(self, changed):
+        """Пересчитывает свертки товаров, измененных с прошлой проверки"""
+        def _fold(conn, since):
+            now = conn.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+            return fold_products(conn, since), now
+
+        try:
+            folded, self._folded_at = await self.db.transaction(_fold, self._folded_at)
+        except Exception as e:
+            logger.error(f"Ошибка пересчета сверток поиска: {e}")
+            return
+        if folded:
+            self.cache.clear()
+
+
+SEARCH_KEY = web.AppKey('search', SearchService)
+
+
+def setup_search(app):
+    search = SearchService(app[DB_KEY], app[CATALOG_KEY])
+    app[SEARCH_KEY] = search
+    app[CHANGES_KEY].subscribe(('products',), search.on_change)
+    return search
@@ -0,0 +1,95 @@
+"""
+Демо-данные витрины: виджеты, категории, товары и карусель.
+
+Каждая таблица заполняется только если она пуста, поэтому повторный
+запуск ничего не меняет.
+"""
+
+import logging
+
+from core.textfold import fold_products
+
+logger = logging.getLogger(__name__)
+
+
+def seed_demo_data(conn):
+    """Заполняет пустые таблицы тестовыми данными"""
+    cursor = conn.cursor()
+
+    # Добавляем тестовые виджеты если таблица пуста
+    cursor.execute("SELECT COUNT(*) FROM web_widgets")
+    if cursor.fetchone()[0] == 0:
+        test_widgets = [
+            ('marquee', None, 'STONE | PREMIUM SNEAKERS | BETWEEN 11/20/2025 AND 12/15/2025 MAY BE RETURNED',
+             '{"speed": 30, "color": "#000000", "bgColor": "#ffffff"}', 1, 0),
+            ('hero', 'STONE', 'between 11/20/2025 and 12/15/2025 may be returned', '{}', 2, 0),
+            ('info', 'INFORMATION #LINDON', 'money model options, four, savings', '{}', 3, 0),
+            ('collection', 'New Collection',
+             'Explore our carefully curated selection of premium sneakers. Each pair is designed with meticulous attention to detail and crafted from the finest materials.',
+             '{"buttonText": "VIEW COLLECTION"}', 4, 0)
+        ]
+
+        cursor.executemany("""
+            INSERT INTO web_widgets (widget_type, title, content, config, position, sort_order)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, test_widgets)
+        logger.info("✅ Добавлены тестовые виджеты")
+
+    # Добавляем тестовые категории
+    cursor.execute("SELECT COUNT(*) FROM categories")
+    if cursor.fetchone()[0] == 0:
+        categories = [
+            ('Sneakers', 'sneakers', None),
+            ('Boots', 'boots', None),
+            ('Sandals', 'sandals', None),
+            ('Accessories', 'accessories', None)
+        ]
+
+        cursor.executemany("""
+            INSERT INTO categories (name, slug, parent_id)
+            VALUES (?, ?, ?)
+        """, categories)
+        logger.info("✅ Добавлены тестовые категории")
+
+    # Добавляем тестовые товары
+    cursor.execute("SELECT COUNT(*) FROM products")
+    if cursor.fetchone()[0] == 0:
+        products = [
+            ('KPOCCOBKM', 'kpoccobkm-1', 'Premium sneakers with unique design', 120.00, 150.00,
+             '/static/images/placeholder.jpg', '["/static/images/placeholder.jpg"]', 1, 'STONE', 'STN-001', 'Black',
+             '42', 'Leather', 20, 10, True),
+            ('KPOCCOBKM Pro', 'kpoccobkm-pro', 'Advanced version with better materials', 140.00, 180.00,
+             '/static/images/placeholder.jpg', '["/static/images/placeholder.jpg"]', 1, 'STONE', 'STN-002', 'White',
+             '40-45', 'Suede', 22, 8, True),
+            ('KPOCCOBKM Lite', 'kpoccobkm-lite', 'Lightweight version for everyday wear', 130.00, None,
+             '/static/images/placeholder.jpg', '["/static/images/placeholder.jpg"]', 1, 'STONE', 'STN-003', 'Gray',
+             '39-44', 'Mesh', 0, 15, True),
+            ('KPOCCOBKM Ultra', 'kpoccobkm-ultra', 'Ultimate performance sneakers', 150.00, 200.00,
+             '/static/images/placeholder.jpg', '["/static/images/placeholder.jpg"]', 1, 'STONE', 'STN-004',
+             'Black/White', '41-43', 'Leather/Mesh', 25, 5, True)
+        ]
+
+        cursor.executemany("""
+            INSERT INTO products (name, slug, description, price, compare_at_price, image_url, gallery, category_id, brand, sku, color, size, material, discount_percent, quantity, is_featured)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, products)
+        fold_products(cursor)
+        logger.info("✅ Добавлены тестовые товары")
+
+    # Добавляем карусель
+    cursor.execute("SELECT COUNT(*) FROM carousel_items")
+    if cursor.fetchone()[0] == 0:
+        carousel_items = [
+            ('New Collection 2024', 'Discover the latest designs', '/static/images/placeholder.jpg', '/catalog',
+             'SHOP NOW'),
+            ('Limited Edition', 'Exclusive items available', '/static/images/placeholder.jpg',
+             '/catalog?filter=limited', 'VIEW'),
+            ('Summer Sale', 'Up to 50% off selected items', '/static/images/placeholder.jpg',
+             '/catalog?filter=sale', 'SHOP SALE')
+        ]
+
+        cursor.executemany("""
+            INSERT INTO carousel_items (title, subtitle, image_url, link_url, button_text)
+            VALUES (?, ?, ?, ?, ?)
+        """, carousel_items)
+        logger.info("✅ Добавлены карусельные элементы")
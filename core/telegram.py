@@ -0,0 +1,51 @@
+"""
+Проверка initData Telegram WebApp.
+
+Клиент передает строку initData как есть (заголовок X-Telegram-Init-Data).
+Подпись проверяется по алгоритму из документации Telegram: секрет -
+HMAC-SHA256 токена бота с ключом "WebAppData", подпись - HMAC-SHA256
+отсортированных пар key=value, кроме hash.
+"""
+
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+INIT_DATA_HEADER = 'X-Telegram-Init-Data'
+MAX_AGE = 24 * 60 * 60
+
+# Токен бота для проверки подписи (пустой - вход через Telegram отключен)
+BOT_TOKEN_KEY = web.AppKey('telegram_bot_token', str)
+
+
+def verify_init_data(init_data, bot_token, max_age=MAX_AGE):
+    """Пользователь Telegram (dict) из подписанной initData или None"""
+    if not init_data or not bot_token:
+        return None
+    try:
+        fields = dict(parse_qsl(init_data, strict_parsing=True))
+    except ValueError:
+        return None
+
+    received = fields.pop('hash', None)
+    if not received:
+        return None
+    check_string = '\n'.join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+    expected = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, received):
+        return None
+
+    try:
+        if time.time() - int(fields.get('auth_date', 0)) > max_age:
+            return None
+        user = json.loads(fields.get('user', 'null'))
+    except ValueError:
+        return None
+    if not isinstance(user, dict) or 'id' not in user:
+        return None
+    return user
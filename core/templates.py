@@ -0,0 +1,139 @@
+"""
+Окружение Jinja2.
+
+Шаблоны рендерятся асинхронно (enable_async): render_async для страниц,
+которые целиком кладутся в кэш, и stream - потоковая отдача по мере
+рендера для страниц без кэша. Время рендера каждого шаблона передается
+в on_render (метрики, см. core.metrics).
+
+Режим production:
+- auto_reload выключен - шаблон не проверяется на диске при каждом
+  обращении;
+- скомпилированный байткод хранится в каталоге на диске
+  (FileSystemBytecodeCache) и общий для всех воркеров: свежий воркер
+  загружает готовый код вместо разбора шаблонов;
+- все шаблоны компилируются при старте, а не на первом запросе.
+В режиме development шаблоны перечитываются при изменении файлов.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+import aiohttp_jinja2
+import jinja2
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_MODES = ('development', 'production')
+TEMPLATE_EXTENSIONS = ('html',)
+STREAM_CHUNK = 16 * 1024
+
+
+class Templates:
+    """Рендер шаблонов с замером времени"""
+
+    def __init__(self, env, production=False):
+        self.env = env
+        self.production = production
+        # Вызывается как on_render(имя шаблона, секунды)
+        self.on_render = None
+        self.precompiled = 0
+
+    def _observe(self, name, started):
+        if self.on_render is not None:
+            self.on_render(name, time.perf_counter() - started)
+
+    def precompile(self):
+        """Компилирует все шаблоны (байткод попадает в кэш на диске); вызывать вне event loop"""
+        started = time.perf_counter()
+        compiled = 0
+        for name in self.env.list_templates(extensions=TEMPLATE_EXTENSIONS):
+            try:
+                self.env.get_template(name)
+                compiled += 1
+            except jinja2.TemplateError as e:
+                logger.error(f"Ошибка компиляции шаблона {name}: {e}")
+        self.precompiled = compiled
+        logger.info(f"🧱 Шаблоны скомпилированы: {compiled} за {time.perf_counter() - started:.2f} с")
+        return compiled
+
+    async def render(self, name, context):
+        """Шаблон целиком в строку"""
+        started = time.perf_counter()
+        try:
+            return await self.env.get_template(name).render_async(context)
+        finally:
+            self._observe(name, started)
+
+    async def stream(self, request, name, context, status=200):
+        """
+        Отдает шаблон потоком: куски по STREAM_CHUNK пишутся в ответ по мере
+        рендера, поэтому браузер начинает получать страницу раньше.
+        """
+        template = self.env.get_template(name)
+        response = web.StreamResponse(status=status)
+        response.content_type = 'text/html'
+        response.charset = 'utf-8'
+        response.enable_compression()
+
+        started = time.perf_counter()
+        try:
+            await response.prepare(request)
+            buffer = []
+            size = 0
+            async for chunk in template.generate_async(context):
+                buffer.append(chunk)
+                size += len(chunk)
+                if size >= STREAM_CHUNK:
+                    await response.write(''.join(buffer).encode('utf-8'))
+                    buffer = []
+                    size = 0
+            if buffer:
+                await response.write(''.join(buffer).encode('utf-8'))
+            await response.write_eof()
+        finally:
+            self._observe(name, started)
+        return response
+
+    def stats(self):
+        return {
+            'production': self.production,
+            'auto_reload': self.env.auto_reload,
+            'bytecode_cache': self.env.bytecode_cache is not None,
+            'precompiled': self.precompiled,
+        }
+
+
+TEMPLATES_KEY = web.AppKey('templates', Templates)
+
+
+def setup_templates(app, templates_dir, mode='development', cache_dir=None):
+    """Окружение Jinja2 (доступно и через aiohttp_jinja2); возвращает jinja2.Environment"""
+    if mode not in TEMPLATE_MODES:
+        raise ValueError(f"Неизвестный режим шаблонов: {mode}")
+    production = mode == 'production'
+
+    bytecode_cache = None
+    if production and cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(cache_dir)
+
+    env = aiohttp_jinja2.setup(
+        app,
+        loader=jinja2.FileSystemLoader(templates_dir),
+        enable_async=True,
+        auto_reload=not production,
+        bytecode_cache=bytecode_cache
+    )
+    templates = Templates(env, production=production)
+    app[TEMPLATES_KEY] = templates
+
+    if production:
+        async def precompile_templates(app):
+            await asyncio.to_thread(templates.precompile)
+
+        app.on_startup.append(precompile_templates)
+    return env
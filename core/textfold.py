@@ -0,0 +1,99 @@
+"""
+Нормализация текста для поиска по кириллице и латинице.
+
+У каждого слова несколько сверток:
+- скелет: кириллица заменяется похожими латинскими буквами, поэтому
+  стилизованное "KPOCCOBKM" и "кроссовки" дают один и тот же "kpoccobkm";
+- транслит: фонетическая запись кириллицы латиницей ("krossovki");
+- скелет обратного транслита: "krossovki" -> "кроссовки" -> "kpoccobkm".
+"""
+
+import re
+from functools import lru_cache
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Кириллица -> похожая латинская буква (как в названиях вида KPOCCOBKM)
+# Буквы без латинского двойника записываются транслитом
+_SKELETON = {
+    'а': 'a', 'б': 'b', 'в': 'b', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'm', 'й': 'm', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'h', 'о': 'o', 'п': 'n', 'р': 'p', 'с': 'c', 'т': 't', 'у': 'y',
+    'ф': 'f', 'х': 'x', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '',
+    'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+# Кириллица -> фонетический транслит
+_TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '',
+    'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+# Латиница -> кириллица для запросов, набранных транслитом ("krossovki")
+_LATIN_TO_CYRILLIC = {
+    'a': 'а', 'b': 'б', 'c': 'ц', 'd': 'д', 'e': 'е', 'f': 'ф', 'g': 'г',
+    'h': 'х', 'i': 'и', 'j': 'й', 'k': 'к', 'l': 'л', 'm': 'м', 'n': 'н',
+    'o': 'о', 'p': 'п', 'r': 'р', 's': 'с', 't': 'т', 'u': 'у', 'v': 'в',
+    'w': 'в', 'x': 'кс', 'y': 'ы', 'z': 'з',
+}
+
+SKELETON_TABLE = str.maketrans(_SKELETON)
+TRANSLIT_TABLE = str.maketrans(_TRANSLIT)
+LATIN_TO_CYRILLIC_TABLE = str.maketrans(_LATIN_TO_CYRILLIC)
+
+
+def words(text):
+    return WORD_RE.findall((text or '').lower())
+
+
+@lru_cache(maxsize=65536)
+def fold_word(word):
+    """Множество вариантов слова: исходное, скелет, транслит и скелет обратного транслита"""
+    word = word.lower()
+    # Кэш: при импорте фидов одни и те же бренды, цвета и материалы повторяются в каждой строке
+    return frozenset({
+        word,
+        word.translate(SKELETON_TABLE),
+        word.translate(TRANSLIT_TABLE),
+        word.translate(LATIN_TO_CYRILLIC_TABLE).translate(SKELETON_TABLE),
+    } - {''})
+
+
+def fold_document(*fields):
+    """Свертки всех слов полей одной строкой (колонка products.search_folded)"""
+    variants = set()
+    for field in fields:
+        if field is None:
+            continue
+        for word in words(str(field)):
+            variants.update(fold_word(word))
+    return ' '.join(sorted(variants))
+
+
+# Поля товара, из которых строятся свертки для поиска
+FOLD_COLUMNS = ('name', 'brand', 'color', 'material', 'sku')
+
+
+def fold_products(conn, since=None):
+    """
+    Пересчитывает products.search_folded у товаров с updated_at >= since
+    (без since - у всех); возвращает число измененных строк. Свертки
+    считаются здесь, а не SQL-функцией: триггеры поискового индекса только
+    копируют колонку и работают в любом клиенте SQLite.
+    """
+    sql = f"SELECT id, search_folded, {', '.join(FOLD_COLUMNS)} FROM products"
+    params = ()
+    if since is not None:
+        sql += " WHERE updated_at >= ?"
+        params = (since,)
+    updates = []
+    for row in conn.execute(sql, params).fetchall():
+        folded = fold_document(*tuple(row)[2:])
+        if folded != row[1]:
+            updates.append((folded, row[0]))
+    if updates:
+        conn.executemany("UPDATE products SET search_folded = ? WHERE id = ?", updates)
+    return len(updates)
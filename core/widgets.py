@@ -0,0 +1,322 @@
+"""
+Реестр виджетов витрины.
+
+Виджеты читаются из web_widgets один раз и перечитываются только при
+изменении таблицы. Конфигурация каждого виджета проверяется по схеме его
+типа: при сохранении через API некорректный виджет отклоняется, а
+испорченная строка в БД (правка в обход API) пишется в лог и не
+показывается, вместо того чтобы молча получить пустую конфигурацию.
+
+Каждый виджет заранее рендерится в HTML-фрагмент (templates/widgets/
+<тип>.html) и кодируется в JSON. Фрагменты хранятся по (id, версия), где
+версия - хэш содержимого, поэтому при изменении одного виджета остальные
+не перерисовываются, а ответы API и главная страница склеиваются из
+готовых кусков.
+"""
+
+import hashlib
+import json
+import logging
+import re
+
+from aiohttp import web
+from markupsafe import Markup
+
+from core.changes import CHANGES_KEY
+from core.db import DB_KEY
+from core.jsonenc import RawJSON, dumps, join_array
+from core.templates import TEMPLATES_KEY
+
+logger = logging.getLogger(__name__)
+
+WIDGET_SELECT = """
+    SELECT id, widget_type, title, content, config, is_active, position, sort_order
+    FROM web_widgets
+    ORDER BY position, sort_order, id
+"""
+
+MAX_TITLE = 255
+MAX_CONTENT = 5000
+
+_COLOR = re.compile(r'#(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{4}|[0-9a-fA-F]{6}|[0-9a-fA-F]{8})')
+_LENGTH = re.compile(r'\d{1,3}(?:\.\d+)?(?:px|rem|em|%)')
+
+
+class WidgetError(ValueError):
+    """Виджет не соответствует схеме своего типа"""
+
+
+# ---------- схемы конфигурации ----------
+
+def number(low, high):
+    def check(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+            raise WidgetError(f'ожидалось число от {low} до {high}')
+        return value
+    return check
+
+
+def pattern(regex, description):
+    def check(value):
+        if not isinstance(value, str) or not regex.fullmatch(value):
+            raise WidgetError(f'ожидался {description}')
+        return value
+    return check
+
+
+def text(max_length):
+    def check(value):
+        if not isinstance(value, str) or len(value) > max_length:
+            raise WidgetError(f'ожидалась строка до {max_length} символов')
+        return value
+    return check
+
+
+def link(value):
+    # Только относительные пути и http(s): значение попадает в href
+    if not isinstance(value, str) or not (value.startswith('/') or re.match(r'https?://', value)):
+        raise WidgetError('ожидался путь "/..." или http(s)-ссылка')
+    return value
+
+
+color = pattern(_COLOR, 'цвет #rgb/#rrggbb')
+length = pattern(_LENGTH, 'размер вида 11px')
+
+# Тип виджета -> {ключ конфигурации: (проверка, значение по умолчанию)}
+WIDGET_TYPES = {
+    'marquee': {
+        'speed': (number(1, 600), 20),
+        'color': (color, '#fff'),
+        'bgColor': (color, '#000'),
+        'fontSize': (length, '11px'),
+    },
+    'hero': {
+        'buttonText': (text(50), 'SHOP NOW'),
+        'link': (link, '/catalog'),
+    },
+    'info': {},
+    'collection': {
+        'buttonText': (text(50), 'VIEW COLLECTION'),
+        'link': (link, '/catalog'),
+    },
+}
+
+
+def validate_config(widget_type, config):
+    """Проверяет конфигурацию по схеме типа; возвращает ее с подставленными значениями по умолчанию"""
+    schema = WIDGET_TYPES.get(widget_type)
+    if schema is None:
+        raise WidgetError(f'неизвестный тип виджета: {widget_type}')
+    if config is None:
+        config = {}
+    if not isinstance(config, dict):
+        raise WidgetError('config должен быть объектом')
+    unknown = set(config) - set(schema)
+    if unknown:
+        raise WidgetError(f'неизвестные параметры {widget_type}: {", ".join(sorted(unknown))}')
+
+    result = {}
+    for key, (check, default) in schema.items():
+        if config.get(key) is None:
+            result[key] = default
+            continue
+        try:
+            result[key] = check(config[key])
+        except WidgetError as e:
+            raise WidgetError(f'{key}: {e}')
+    return result
+
+
+def validate_widget(data):
+    """Тело запроса сохранения -> значения колонок web_widgets (config - JSON)"""
+    widget_type = data.get('widget_type')
+    config = validate_config(widget_type, data.get('config'))
+    row = {'widget_type': widget_type, 'config': json.dumps(config, ensure_ascii=False)}
+    for column, max_length in (('title', MAX_TITLE), ('content', MAX_CONTENT)):
+        value = data.get(column)
+        if value is not None and (not isinstance(value, str) or len(value) > max_length):
+            raise WidgetError(f'{column}: ожидалась строка до {max_length} символов')
+        row[column] = value
+    for column in ('position', 'sort_order'):
+        value = data.get(column, 0)
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise WidgetError(f'{column}: ожидалось целое число')
+        row[column] = value
+    row['is_active'] = bool(data.get('is_active', True))
+    return row
+
+
+# ---------- реестр ----------
+
+class Widget:
+    """Проверенный виджет с готовым HTML-фрагментом и JSON"""
+
+    __slots__ = ('id', 'widget_type', 'title', 'content', 'config', 'is_active',
+                 'position', 'sort_order', 'version', 'html', 'fragment')
+
+    def __init__(self, row, config):
+        self.id = row['id']
+        self.widget_type = row['widget_type']
+        self.title = row['title']
+        self.content = row['content']
+        self.config = config
+        self.is_active = bool(row['is_active'])
+        self.position = row['position']
+        self.sort_order = row['sort_order']
+        self.version = hashlib.sha1(dumps(
+            [self.widget_type, self.title, self.content, config, self.position]
+        )).hexdigest()[:12]
+        self.html = None
+        self.fragment = None
+
+    def payload(self):
+        return {
+            'id': self.id,
+            'widget_type': self.widget_type,
+            'title': self.title,
+            'content': self.content,
+            'config': self.config,
+            'position': self.position,
+            'version': self.version,
+            'html': str(self.html),
+        }
+
+
+class WidgetRegistry:
+    """Все виджеты в памяти; перечитываются при изменении web_widgets"""
+
+    def __init__(self, db, watcher, templates):
+        self.db = db
+        self.watcher = watcher
+        self.templates = templates
+        self.version = 0
+        self.loaded = False
+        self.widgets = []
+        self.active = []
+        self.invalid = []
+        self._rendered = {}
+        self._listeners = []
+
+    def subscribe(self, callback):
+        """callback(changed, removed) после перечитывания: id измененных/новых и удаленных виджетов"""
+        self._listeners.append(callback)
+
+    async def _render(self, widget):
+        key = (widget.id, widget.version)
+        cached = self._rendered.get(key)
+        if cached is None:
+            html = await self.templates.render(
+                f'widgets/{widget.widget_type}.html', {'widget': widget, 'config': widget.config})
+            widget.html = Markup(html.strip())
+            cached = (widget.html, RawJSON(dumps(widget.payload())))
+        widget.html, widget.fragment = cached
+        return key, cached
+
+    async def load(self):
+        rows = await self.db.fetch_all(WIDGET_SELECT)
+        widgets = []
+        invalid = []
+        rendered = {}
+        for row in rows:
+            try:
+                try:
+                    config = json.loads(row['config']) if row['config'] else {}
+                except ValueError as e:
+                    raise WidgetError(f'некорректный JSON в config: {e}')
+                widget = Widget(row, validate_config(row['widget_type'], config))
+            except WidgetError as e:
+                # Виджет не показывается, но и не теряется молча
+                problem = {'id': row['id'], 'widget_type': row['widget_type'], 'error': str(e)}
+                if problem not in self.invalid:
+                    logger.error(f"⚠️ Виджет {row['id']} ({row['widget_type']}) пропущен: {e}")
+                invalid.append(problem)
+                continue
+            key, cached = await self._render(widget)
+            rendered[key] = cached
+            widgets.append(widget)
+
+        before = {(widget.id, widget.version, widget.is_active) for widget in self.active}
+        after = {(widget.id, widget.version, widget.is_active) for widget in widgets if widget.is_active}
+
+        self.widgets = widgets
+        self.active = [widget for widget in widgets if widget.is_active]
+        self.invalid = invalid
+        # Фрагменты удаленных и измененных виджетов больше не нужны
+        self._rendered = rendered
+        self.version += 1
+        self.loaded = True
+        logger.info(f"🧩 Виджеты загружены: {len(self.active)} активных из {len(rows)}")
+
+        # Клиентам важны только видимые виджеты
+        if before != after:
+            active_ids = {widget.id for widget in self.active}
+            changed = sorted({key[0] for key in after - before})
+            removed = sorted({key[0] for key in before - after} - active_ids)
+            for callback in self._listeners:
+                callback(changed, removed)
+
+    async def on_change(self, changed):
+        await self.load()
+
+    async def ensure_loaded(self):
+        if not self.loaded:
+            await self.load()
+
+    def encode(self, active_only=True):
+        """JSON-массив виджетов, склеенный из готовых фрагментов"""
+        return join_array([widget.fragment for widget in (self.active if active_only else self.widgets)])
+
+    def html(self):
+        """HTML всех активных виджетов подряд (для вставки в страницу)"""
+        return Markup('\n').join(widget.html for widget in self.active)
+
+    async def save(self, data, widget_id=None):
+        """Создает (widget_id=None) или заменяет виджет; WidgetError если он не прошел проверку"""
+        row = validate_widget(data)
+        columns = list(row)
+
+        def _save(conn):
+            if widget_id is None:
+                return conn.execute(
+                    f"INSERT INTO web_widgets ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    tuple(row.values())
+                ).lastrowid
+            changed = conn.execute(
+                f"UPDATE web_widgets SET {', '.join(c + ' = ?' for c in columns)}, "
+                f"updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (*row.values(), widget_id)
+            ).rowcount
+            return widget_id if changed else None
+
+        saved = await self.db.transaction(_save)
+        # Реестр и кэши страниц видят изменение сразу, не дожидаясь опроса
+        await self.watcher.check()
+        return saved
+
+    async def delete(self, widget_id):
+        def _delete(conn):
+            return conn.execute("DELETE FROM web_widgets WHERE id = ?", (widget_id,)).rowcount
+
+        deleted = await self.db.transaction(_delete)
+        await self.watcher.check()
+        return bool(deleted)
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'widgets': len(self.widgets),
+            'active': len(self.active),
+            'invalid': self.invalid,
+            'fragments': len(self._rendered),
+        }
+
+
+WIDGETS_KEY = web.AppKey('widgets', WidgetRegistry)
+
+
+def setup_widgets(app):
+    """Реестр виджетов (вызывать после setup_templates); загрузка - при первой проверке изменений"""
+    registry = WidgetRegistry(app[DB_KEY], app[CHANGES_KEY], app[TEMPLATES_KEY])
+    app[WIDGETS_KEY] = registry
+    app[CHANGES_KEY].subscribe(('web_widgets',), registry.on_change)
+    return registry
@@ -0,0 +1,195 @@
+"""
+Многопроцессный запуск.
+
+Мастер-процесс форкает N воркеров; каждый воркер открывает свой сокет с
+SO_REUSEPORT на тот же порт, и ядро распределяет соединения между ними.
+Мастер перезапускает упавших воркеров (с паузой при частых падениях),
+по SIGHUP по одному заменяет воркеров на новые: новый воркер стартует,
+и только после его готовности старый получает SIGTERM и дообрабатывает
+начатые запросы. Приложение собирает фабрика в самом воркере, поэтому
+новый воркер перечитывает настройки, а не наследует приложение мастера. SIGTERM/SIGINT мастеру - плавная остановка всех воркеров.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+READY_TIMEOUT = 30.0
+# Воркер, проживший меньше, считается упавшим при старте
+MIN_UPTIME = 5.0
+MAX_RESPAWN_DELAY = 30.0
+
+
+def reuseport_supported():
+    return hasattr(socket, 'SO_REUSEPORT')
+
+
+def listen_socket(host, port, backlog=1024):
+    """Слушающий сокет с SO_REUSEPORT"""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+async def _run_worker(app_factory, sock, ready, shutdown_timeout, access_log):
+    app = app_factory()
+    runner = web.AppRunner(app, access_log=access_log, shutdown_timeout=shutdown_timeout)
+    await runner.setup()
+    site = web.SockSite(runner, sock)
+    await site.start()
+    ready.set()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    # Закрываем сокет и ждем завершения начатых запросов
+    logger.info(f"⏳ Воркер {os.getpid()} завершает работу")
+    await runner.cleanup()
+
+
+def _worker_main(app_factory, host, port, ready, shutdown_timeout, access_log):
+    # Обработчики сигналов мастера воркеру не нужны, SIGHUP адресован мастеру
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    sock = listen_socket(host, port)
+    asyncio.run(_run_worker(app_factory, sock, ready, shutdown_timeout, access_log))
+
+
+class Worker:
+    __slots__ = ('process', 'ready', 'started')
+
+    def __init__(self, process, ready):
+        self.process = process
+        self.ready = ready
+        self.started = time.monotonic()
+
+
+class Supervisor:
+    """Мастер-процесс: запуск, перезапуск и остановка воркеров"""
+
+    def __init__(self, app_factory, host, port, workers, shutdown_timeout=30.0, access_log=None):
+        self.app_factory = app_factory
+        self.host = host
+        self.port = port
+        self.size = workers
+        self.shutdown_timeout = shutdown_timeout
+        self.access_log = access_log
+        # fork: воркеры стартуют без повторного импорта модулей
+        self._context = multiprocessing.get_context('fork')
+        self._workers = []
+        self._failures = 0
+        self._reload = False
+        self._stopping = False
+
+    def _spawn(self):
+        ready = self._context.Event()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.app_factory, self.host, self.port, ready, self.shutdown_timeout, self.access_log),
+            daemon=False
+        )
+        process.start()
+        worker = Worker(process, ready)
+        self._workers.append(worker)
+        return worker
+
+    def _stop_worker(self, worker):
+        """SIGTERM и ожидание плавного завершения; по таймауту - SIGKILL"""
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(self.shutdown_timeout + 5)
+        if worker.process.is_alive():
+            logger.warning(f"⚠️ Воркер {worker.process.pid} не завершился вовремя - SIGKILL")
+            worker.process.kill()
+            worker.process.join()
+        if worker in self._workers:
+            self._workers.remove(worker)
+
+    def _rolling_restart(self):
+        logger.info(f"🔄 Поочередный перезапуск {len(self._workers)} воркеров")
+        for old in list(self._workers):
+            if self._stopping:
+                return
+            new = self._spawn()
+            if not new.ready.wait(READY_TIMEOUT):
+                logger.error(f"Ошибка перезапуска: воркер {new.process.pid} не запустился, оставляем старый")
+                self._stop_worker(new)
+                continue
+            self._stop_worker(old)
+        logger.info("✅ Перезапуск воркеров завершен")
+
+    def _reap(self):
+        """Заменяет упавших воркеров; при частых падениях увеличивает паузу"""
+        for worker in list(self._workers):
+            if worker.process.is_alive():
+                continue
+            worker.process.join()
+            self._workers.remove(worker)
+            uptime = time.monotonic() - worker.started
+            logger.error(f"Воркер {worker.process.pid} завершился (код {worker.process.exitcode}, "
+                         f"работал {uptime:.1f} с)")
+
+            if uptime < MIN_UPTIME:
+                self._failures += 1
+                delay = min(MAX_RESPAWN_DELAY, 2 ** (self._failures - 1))
+                logger.warning(f"⚠️ Повторный запуск воркера через {delay} с")
+                time.sleep(delay)
+            else:
+                self._failures = 0
+            if not self._stopping:
+                self._spawn()
+
+    def _on_signal(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self._reload = True
+        else:
+            self._stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGHUP, self._on_signal)
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+
+        for _ in range(self.size):
+            self._spawn()
+        logger.info(f"👷 Запущено {self.size} воркеров на {self.host}:{self.port} (мастер {os.getpid()})")
+
+        while not self._stopping:
+            if self._reload:
+                self._reload = False
+                self._rolling_restart()
+            self._reap()
+            time.sleep(0.5)
+
+        logger.info("🛑 Остановка воркеров")
+        for worker in self._workers:
+            if worker.process.is_alive():
+                worker.process.terminate()
+        for worker in list(self._workers):
+            self._stop_worker(worker)
+
+
+def serve(app_factory, host, port, workers, shutdown_timeout=30.0, access_log=None):
+    """Запускает приложение app_factory() в workers процессах на одном порту"""
+    if not reuseport_supported():
+        logger.warning("⚠️ SO_REUSEPORT не поддерживается - запуск в одном процессе")
+        web.run_app(app_factory(), host=host, port=port, access_log=access_log, shutdown_timeout=shutdown_timeout)
+        return
+    Supervisor(app_factory, host, port, workers, shutdown_timeout=shutdown_timeout, access_log=access_log).run()
@@ -0,0 +1,77 @@
+"""
+Общие фикстуры тестов.
+
+Каждый тест получает свою БД во временном каталоге: миграции и демо-данные
+(4 товара STN-001..STN-004 в категории sneakers), без обращения к
+data/shop.db. Асинхронный код выполняется через asyncio.run.
+"""
+
+import contextlib
+import os
+import sys
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.db import connect  # noqa: E402
+from core.migrations import apply_migrations  # noqa: E402
+from core.seed import seed_demo_data  # noqa: E402
+
+ADMIN_TOKEN = 'test-admin'
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'shop.db')
+    conn = connect(path)
+    try:
+        apply_migrations(conn)
+        seed_demo_data(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+
+@pytest.fixture
+def sql(db_path):
+    """Выполняет SQL отдельным соединением (как сторонний писатель) и фиксирует"""
+    def execute(query, params=()):
+        conn = connect(db_path)
+        try:
+            rows = conn.execute(query, params).fetchall()
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+    return execute
+
+
+@pytest.fixture
+def app_client(db_path, tmp_path):
+    """Фабрика: async with app_client(**config) as client - приложение на тестовой БД"""
+    import StoneWeb
+
+    @contextlib.asynccontextmanager
+    async def factory(**config):
+        app = StoneWeb.create_app({
+            'db_path': db_path,
+            'admin_token': ADMIN_TOKEN,
+            'image_cache_dir': str(tmp_path / 'img'),
+            'image_workers': 1,
+            **config,
+        })
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        try:
+            yield client
+        finally:
+            await client.close()
+
+    return factory
+
+
+def admin_headers():
+    return {'Authorization': f'Bearer {ADMIN_TOKEN}'}
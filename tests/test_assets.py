@@ -0,0 +1,23 @@
+import asyncio
+
+from core.assets import ASSETS_KEY, IMMUTABLE
+from core.templates import TEMPLATES_KEY
+
+
+def test_templates_link_fingerprinted_assets(app_client):
+    async def scenario():
+        async with app_client() as client:
+            app = client.server.app
+            url = app[ASSETS_KEY].url('static/images/placeholder.jpg')
+            assert url != '/static/images/placeholder.jpg'
+
+            for name in ('catalog.html', 'product.html'):
+                html = await app[TEMPLATES_KEY].render(name, {})
+                assert f"this.src='{url}'" in html
+                assert "'/static/images/placeholder.jpg'" not in html
+
+            response = await client.get(url)
+            assert response.status == 200
+            assert response.headers['Cache-Control'] == IMMUTABLE
+
+    asyncio.run(scenario())
@@ -0,0 +1,48 @@
+import asyncio
+import json
+
+import pytest
+
+from core.carts import CARTS_KEY, CartError
+from core.changes import CHANGES_KEY
+
+
+def _product_ids(sql):
+    return [row[0] for row in sql("SELECT id FROM products WHERE quantity > 1 ORDER BY id LIMIT 2")]
+
+
+def test_snapshot_persists_carts_on_shutdown(app_client, sql):
+    first, _ = _product_ids(sql)
+
+    async def scenario():
+        async with app_client(cart_snapshot_interval=3600) as client:
+            carts = client.server.app[CARTS_KEY]
+            await carts.add('buyer', first, 2)
+            assert not sql("SELECT 1 FROM carts WHERE owner = 'buyer'")
+            with pytest.raises(CartError):
+                await carts.add('buyer', first, 10_000)
+
+    asyncio.run(scenario())
+    assert json.loads(sql("SELECT items FROM carts WHERE owner = 'buyer'")[0][0]) == {str(first): 2}
+
+
+def test_write_through_between_processes(app_client, sql):
+    first, second = _product_ids(sql)
+
+    async def scenario():
+        # Два воркера на одной БД: каждый со своей памятью
+        async with app_client(workers=2) as one, app_client(workers=2) as two:
+            carts_one = one.server.app[CARTS_KEY]
+            carts_two = two.server.app[CARTS_KEY]
+            assert carts_one.write_through and carts_two.write_through
+
+            await carts_one.add('buyer', first, 1)
+            await carts_two.add('buyer', second, 1)
+            await carts_one.add('buyer', first, 1)
+            assert (await carts_one.get('buyer')).items == {first: 2, second: 1}
+
+            await two.server.app[CHANGES_KEY].check()
+            assert (await carts_two.get('buyer')).items == {first: 2, second: 1}
+
+    asyncio.run(scenario())
+    assert json.loads(sql("SELECT items FROM carts WHERE owner = 'buyer'")[0][0]) == {str(first): 2, str(second): 1}
@@ -0,0 +1,59 @@
+import asyncio
+
+from core.changes import CHANGES_KEY
+from core.counters import VIEWS_KEY
+
+
+def _ids(data):
+    return [product['id'] for product in data['products']]
+
+
+def test_products_sort_popular_follows_views(app_client, sql):
+    async def scenario():
+        async with app_client() as client:
+            response = await client.get('/api/products?sort=popular')
+            assert response.status == 200
+            ids = _ids(await response.json())
+            assert len(ids) == 4
+
+            # Просмотры попадают в выдачу после сброса счетчика (apply_views)
+            least = ids[-1]
+            client.server.app[VIEWS_KEY].hit(least, count=50)
+            await client.server.app[VIEWS_KEY].flush()
+            data = await (await client.get('/api/products?sort=popular')).json()
+            popular = _ids(data)
+            assert popular[0] == least
+            assert data['next_cursor'] is None
+
+            data = await (await client.get('/api/products?sort=popular&limit=2&offset=1')).json()
+            assert _ids(data) == popular[1:3]
+
+    asyncio.run(scenario())
+
+
+def test_external_writes_invalidate_catalog(app_client, sql):
+    product_id = sql("SELECT id FROM products ORDER BY id LIMIT 1")[0][0]
+
+    async def listing(client):
+        data = await (await client.get('/api/products?limit=100')).json()
+        return {product['id']: product for product in data['products']}
+
+    async def scenario():
+        async with app_client() as client:
+            watcher = client.server.app[CHANGES_KEY]
+            assert (await listing(client))[product_id]['price'] != 777
+
+            # Сторонний писатель: изменения приходят через ChangeWatcher
+            sql("UPDATE products SET price = 777 WHERE id = ?", (product_id,))
+            await watcher.check()
+            assert (await listing(client))[product_id]['price'] == 777
+
+            sql("UPDATE products SET is_active = FALSE WHERE id = ?", (product_id,))
+            await watcher.check()
+            assert product_id not in await listing(client)
+
+            sql("DELETE FROM products WHERE id = ?", (product_id,))
+            await watcher.check()
+            assert len(await listing(client)) == 3
+
+    asyncio.run(scenario())
@@ -0,0 +1,46 @@
+import asyncio
+
+from core.changes import CHANGES_KEY
+from core.details import DETAILS_KEY
+
+
+def test_product_card_follows_external_writes(app_client, sql):
+    product_id = sql("SELECT id FROM products ORDER BY id LIMIT 1")[0][0]
+
+    async def card(client):
+        response = await client.get(f'/api/product/{product_id}')
+        return response.status, await response.json()
+
+    async def scenario():
+        async with app_client() as client:
+            app = client.server.app
+            status, data = await card(client)
+            assert status == 200
+
+            # Правка только названия: цена и остаток те же, карточка все равно перечитывается
+            sql("UPDATE products SET name = 'Новое название' WHERE id = ?", (product_id,))
+            await app[CHANGES_KEY].check()
+            status, data = await card(client)
+            assert data['product']['name'] == 'Новое название'
+
+            sql("UPDATE products SET is_active = FALSE WHERE id = ?", (product_id,))
+            await app[CHANGES_KEY].check()
+            status, data = await card(client)
+            assert status == 200 and data['product']['in_stock'] is False
+
+            sql("DELETE FROM products WHERE id = ?", (product_id,))
+            await app[CHANGES_KEY].check()
+            status, data = await card(client)
+            assert status == 404 and not data['success']
+            assert app[DETAILS_KEY].stats()['size'] == 1
+
+    asyncio.run(scenario())
+
+
+def test_unknown_product(app_client):
+    async def scenario():
+        async with app_client() as client:
+            assert (await client.get('/api/product/999999')).status == 404
+            assert (await client.get('/api/product/abc')).status in (400, 404)
+
+    asyncio.run(scenario())
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+from core.events import REPLAY_SIZE, EventHub
+
+
+def _ids(frames):
+    return [frame.decode().split('\n')[0] for frame in frames]
+
+
+def test_replay_after_last_seen_event():
+    hub = EventHub()
+    for number in range(3):
+        hub.publish('widgets', {'n': number})
+
+    assert _ids(hub.replay(hub.event_id(1))) == [f'id: {hub.event_id(2)}', f'id: {hub.event_id(3)}']
+    assert hub.replay(hub.event_id(3)) == []
+
+
+def test_replay_requires_reset():
+    hub = EventHub()
+    hub.publish('widgets', {})
+
+    # id из будущего, другой эпохи (другой воркер или до перезапуска) и мусор
+    assert hub.replay(hub.event_id(5)) is None
+    assert hub.replay('other-1') is None
+    assert hub.replay('1') is None
+    assert hub.replay('garbage') is None
+
+    # Пропущенные события уже вытеснены из буфера
+    for _ in range(REPLAY_SIZE + 1):
+        hub.publish('widgets', {})
+    assert hub.replay(hub.event_id(1)) is None
+
+
+def test_restarted_process_forces_reset():
+    before = EventHub()
+    before.publish('widgets', {})
+    after = EventHub()
+    after.epoch = before.epoch + 'x'
+    after.publish('widgets', {})
+    after.publish('widgets', {})
+    assert after.replay(before.event_id(1)) is None
+
+
+class _Catalog:
+    version = 1
+
+    def __init__(self, products):
+        self.items = {product.id: product for product in products}
+
+    def get(self, product_id):
+        return self.items.get(product_id)
+
+    def products(self):
+        return list(self.items.values())
+
+
+def test_on_products_publishes_only_price_and_stock_changes():
+    hub = EventHub()
+    catalog = _Catalog([SimpleNamespace(id=1, price=100, quantity=2), SimpleNamespace(id=2, price=50, quantity=1)])
+    hub.on_products(catalog, None)
+    subscriber = hub.subscribe()
+
+    # Правка описания: цена и остаток те же
+    hub.on_products(catalog, {1, 2})
+    assert subscriber.queue.empty()
+
+    catalog.items[1] = SimpleNamespace(id=1, price=90, quantity=2)
+    del catalog.items[2]
+    hub.on_products(catalog, {1, 2})
+    frame = subscriber.queue.get_nowait().decode()
+    assert 'event: products' in frame
+    assert '{"id":1,"price":90,"quantity":2,"in_stock":true}' in frame
+    assert '{"id":2,"in_stock":false}' in frame
@@ -0,0 +1,55 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from api.export import _since
+from conftest import admin_headers
+
+
+def test_since_formats():
+    utc = datetime(2026, 10, 17, 9, 0, tzinfo=timezone.utc)
+    assert _since('') is None
+    assert _since(str(utc.timestamp())) == utc
+    assert _since('2026-10-17T09:00:00') == utc
+    assert _since('2026-10-17T09:00:00Z') == utc
+    with pytest.raises(ValueError):
+        _since('вчера')
+
+
+def test_since_offset_is_converted_to_utc():
+    since = _since('2026-10-17T12:00:00+03:00')
+    assert since == datetime(2026, 10, 17, 9, 0, tzinfo=timezone.utc)
+    # В запрос к БД попадает время UTC, а не местное время клиента
+    assert since.strftime('%Y-%m-%d %H:%M:%S') == '2026-10-17 09:00:00'
+
+
+def _export(app_client, query):
+    async def main():
+        async with app_client() as client:
+            response = await client.get('/api/export/products', params=query, headers=admin_headers())
+            assert response.status == 200
+            text = await response.text()
+            return [json.loads(line) for line in text.splitlines() if line]
+    return asyncio.run(main())
+
+
+def test_products_updated_since_with_offset(app_client, sql):
+    sql("UPDATE products SET updated_at = '2026-10-17 08:00:00'")
+    sql("UPDATE products SET updated_at = '2026-10-17 09:30:00' WHERE sku = 'STN-002'")
+
+    # 12:00+03:00 = 09:00 UTC: изменение в 09:30 UTC не должно пропасть
+    rows = _export(app_client, {'updated_since': '2026-10-17T12:00:00+03:00'})
+    assert [row['sku'] for row in rows] == ['STN-002']
+
+    rows = _export(app_client, {'updated_since': '2026-10-17T12:31:00+03:00'})
+    assert rows == []
+
+
+def test_export_requires_admin(app_client):
+    async def main():
+        async with app_client() as client:
+            response = await client.get('/api/export/products')
+            return response.status
+    assert asyncio.run(main()) == 403
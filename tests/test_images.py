@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+from core.images import ImageVariants, variant_url
+
+
+def test_variant_url_rewrites_only_local_images():
+    assert variant_url('/static/images/a.jpg', 400) == '/img/400x0/static/images/a.jpg'
+    assert variant_url('https://i.ibb.co/a.jpg', 400) == 'https://i.ibb.co/a.jpg'
+    assert variant_url('', 400) == ''
+
+
+def test_per_process_cache_dirs(tmp_path):
+    # Подкаталог завершившегося процесса
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    stale = tmp_path / f'pid-{process.pid}'
+    stale.mkdir()
+    (stale / 'a_400x0.jpg').write_bytes(b'x')
+    alive = tmp_path / f'pid-{os.getppid()}'
+    alive.mkdir()
+
+    images = ImageVariants(str(tmp_path), per_process=True)
+    images._remove_stale()
+    assert not stale.exists()
+    assert alive.exists()
@@ -0,0 +1,73 @@
+import io
+
+from core.db import connect
+from core.importer import import_stream
+from core.migrations import apply_migrations, latest_version
+
+FEED = """sku,name,price,quantity,category
+STN-001,Stone Runner,15990,5,sneakers
+NEW-1,Новая куртка,9990,2,jackets
+"""
+
+
+def _import(db_path, text, fmt='csv'):
+    return import_stream(db_path, io.StringIO(text), fmt)
+
+
+def test_upsert_and_unchanged(db_path, sql):
+    report = _import(db_path, FEED)
+    assert report['errors'] == 0
+    assert report['inserted'] == 1
+    assert report['updated'] == 1
+    assert tuple(sql("SELECT price, quantity FROM products WHERE sku = 'STN-001'")[0]) == (15990, 5)
+    assert sql("SELECT slug FROM categories WHERE id = (SELECT category_id FROM products WHERE sku = 'NEW-1')")[0][0] \
+        == 'jackets'
+
+    # Повторная загрузка того же фида ничего не переписывает
+    updated_at = sql("SELECT updated_at FROM products WHERE sku = 'STN-001'")[0][0]
+    report = _import(db_path, FEED)
+    assert (report['inserted'], report['updated'], report['unchanged']) == (0, 0, 2)
+    assert sql("SELECT updated_at FROM products WHERE sku = 'STN-001'")[0][0] == updated_at
+
+
+def test_stock_feed_updates_existing_only(db_path, sql):
+    report = _import(db_path, '{"sku": "STN-002", "quantity": 7}\n{"sku": "MISSING", "quantity": 1}\n'
+                              '{"sku": "STN-003", "quantity": ""}\n', 'jsonl')
+    assert (report['updated'], report['unchanged'], report['errors']) == (1, 1, 1)
+    assert report['error_samples'][0]['line'] == 2
+    assert sql("SELECT quantity FROM products WHERE sku = 'STN-002'")[0][0] == 7
+    assert not sql("SELECT 1 FROM products WHERE sku = 'MISSING'")
+
+
+def test_invalid_rows_are_reported(db_path):
+    report = _import(db_path, 'sku,name,price\nBAD-1,Товар,abc\nBAD-2,Товар,-5\n')
+    assert report['errors'] == 2
+    assert [sample['line'] for sample in report['error_samples']] == [2, 3]
+
+
+def test_import_search_sees_new_product(db_path, sql):
+    _import(db_path, FEED)
+    assert sql("SELECT rowid FROM products_fts WHERE products_fts MATCH 'куртка'")
+
+
+def test_duplicate_skus_do_not_block_migrations(db_path, sql):
+    # Старая база с повторяющимися артикулами: индекс по sku создать нельзя
+    sql("DROP INDEX idx_products_sku")
+    sql("UPDATE products SET sku = 'DUP' WHERE sku IN ('STN-003', 'STN-004')")
+    sql("PRAGMA user_version = 5")
+    conn = connect(db_path)
+    assert apply_migrations(conn) == latest_version()
+    conn.close()
+    assert not sql("SELECT 1 FROM sqlite_master WHERE name = 'idx_products_sku'")
+
+    # Импорт по-прежнему сопоставляет товары по sku без ON CONFLICT
+    report = _import(db_path, FEED)
+    assert (report['inserted'], report['updated'], report['errors']) == (1, 1, 0)
+    assert sql("SELECT price FROM products WHERE sku = 'STN-001'")[0][0] == 15990
+    report = _import(db_path, FEED)
+    assert (report['inserted'], report['updated'], report['unchanged']) == (0, 0, 2)
+
+    # После исправления повторов индекс создается при следующем импорте
+    sql("UPDATE products SET sku = 'STN-004' WHERE slug = (SELECT MAX(slug) FROM products WHERE sku = 'DUP')")
+    _import(db_path, FEED)
+    assert sql("SELECT 1 FROM sqlite_master WHERE name = 'idx_products_sku'")
@@ -0,0 +1,79 @@
+import sqlite3
+
+from core.db import connect
+from core.migrations import apply_migrations, latest_version
+
+# Схема products/categories из старой базы магазина (data/shop.db до миграций)
+LEGACY_SCHEMA = """
+    CREATE TABLE categories (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        parent_id INTEGER
+    , discount_percent INTEGER, discount_end_date TEXT);
+    CREATE TABLE products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        sku TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        price INTEGER NOT NULL CHECK (price > 0),
+        discount_price INTEGER,
+        size_id INTEGER,
+        quantity INTEGER NOT NULL DEFAULT 0 CHECK (quantity >= 0),
+        image_url TEXT NOT NULL DEFAULT '[]',
+        discount_percent INTEGER,
+        cost_price INTEGER,
+        brand TEXT
+    );
+    INSERT INTO categories (name, parent_id) VALUES ('Кроссовки', NULL), ('Одежда', NULL), ('Футболки', 2);
+    INSERT INTO products (name, sku, category_id, price, quantity, image_url, brand)
+    VALUES ('Кроссовки Nike Dunk Low', 'DV7212-300', 1, 12990, 2, 'https://i.ibb.co/a.jpg', 'Nike'),
+           ('Футболка Stone Island', 'SI-100', 3, 7990, 0, 'https://i.ibb.co/b.jpg', 'Stone Island');
+"""
+
+
+def _legacy_db(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.close()
+    return path
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def test_legacy_schema_is_upgraded(tmp_path):
+    conn = connect(_legacy_db(tmp_path))
+    assert apply_migrations(conn) == latest_version()
+
+    assert {'slug', 'description', 'is_featured', 'is_active', 'views', 'created_at', 'updated_at'} \
+        <= _columns(conn, 'products')
+    rows = conn.execute("SELECT is_active, is_featured, views, updated_at FROM products").fetchall()
+    assert all(row['is_active'] and not row['is_featured'] and row['views'] == 0 for row in rows)
+    assert all(row['updated_at'] for row in rows)
+
+    slugs = [row[0] for row in conn.execute("SELECT slug FROM categories ORDER BY id")]
+    assert slugs == ['krossovki', 'odezhda', 'futbolki']
+    conn.close()
+
+
+def test_legacy_writer_gets_timestamps(tmp_path):
+    path = _legacy_db(tmp_path)
+    conn = connect(path)
+    apply_migrations(conn)
+    conn.close()
+
+    # Сторонний писатель со старым набором колонок
+    raw = sqlite3.connect(path)
+    raw.execute("INSERT INTO products (name, sku, category_id, price, quantity) VALUES ('Кепка', 'CAP-1', 1, 990, 3)")
+    raw.commit()
+    created_at, updated_at = raw.execute("SELECT created_at, updated_at FROM products WHERE sku = 'CAP-1'").fetchone()
+    raw.close()
+    assert created_at and updated_at
+
+
+def test_migrations_are_idempotent(db_path):
+    conn = connect(db_path)
+    assert apply_migrations(conn) == latest_version()
+    conn.close()
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from core.orders import ORDERS_KEY, OrderError, OrdersUnavailable
+
+
+def _stock(sql, product_id):
+    return sql("SELECT quantity FROM products WHERE id = ?", (product_id,))[0][0]
+
+
+def test_reservation_under_contention(app_client, sql):
+    product_id = sql("SELECT id FROM products ORDER BY id LIMIT 1")[0][0]
+    sql("UPDATE products SET quantity = 3 WHERE id = ?", (product_id,))
+
+    async def scenario():
+        async with app_client() as client:
+            orders = client.server.app[ORDERS_KEY]
+            results = await asyncio.gather(
+                *(orders.place(f'buyer-{n}', [(product_id, 1)]) for n in range(10)),
+                return_exceptions=True
+            )
+            placed = [result for result in results if isinstance(result, dict)]
+            assert len(placed) == 3
+            assert all(isinstance(result, OrderError) for result in results if not isinstance(result, dict))
+            # Очередь записана меньшим числом транзакций, чем заказов
+            assert orders.batches < len(results)
+            return placed
+
+    placed = asyncio.run(scenario())
+    assert _stock(sql, product_id) == 0
+    assert sql("SELECT COUNT(*) FROM shop_orders WHERE status = 'reserved'")[0][0] == len(placed)
+
+
+def test_cancel_and_expire_return_stock(app_client, sql):
+    product_id = sql("SELECT id FROM products ORDER BY id LIMIT 1")[0][0]
+    sql("UPDATE products SET quantity = 5 WHERE id = ?", (product_id,))
+
+    async def scenario():
+        async with app_client() as client:
+            orders = client.server.app[ORDERS_KEY]
+            order = await orders.place('buyer', [(product_id, 2)])
+            assert _stock(sql, product_id) == 3
+            assert (await orders.cancel('buyer', order['id']))['status'] == 'cancelled'
+            assert _stock(sql, product_id) == 5
+            with pytest.raises(OrderError):
+                await orders.confirm('buyer', order['id'])
+
+            orders.reservation_ttl = -1
+            await orders.place('buyer', [(product_id, 4)])
+            assert _stock(sql, product_id) == 1
+            assert await orders.expire() == 1
+            assert _stock(sql, product_id) == 5
+
+    asyncio.run(scenario())
+
+
+def test_checkout_rejected_while_stopping(app_client, sql):
+    product_id = sql("SELECT id FROM products ORDER BY id LIMIT 1")[0][0]
+
+    async def scenario():
+        async with app_client() as client:
+            orders = client.server.app[ORDERS_KEY]
+            await orders.stop()
+            with pytest.raises(OrdersUnavailable):
+                await orders.place('buyer', [(product_id, 1)])
+
+            response = await client.post('/api/checkout', json={'cart': {'items': [{'id': product_id}]}})
+            assert response.status == 503
+            assert response.headers['Retry-After'] == '1'
+
+    asyncio.run(scenario())
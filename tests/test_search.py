@@ -0,0 +1,39 @@
+import asyncio
+import sqlite3
+
+from core.changes import CHANGES_KEY
+from core.search import build_match
+
+
+def _ids(data):
+    return [product['id'] for product in data['products']]
+
+
+def test_build_match():
+    assert build_match('  ') is None
+    match = build_match('кроссовки nike')
+    assert '"krossovki"*' in match and '"kpoccobkm"*' in match
+    assert ' AND ' in match
+
+
+def test_search_sees_writes_from_plain_sqlite(app_client, db_path, sql):
+    product_id = sql("SELECT id FROM products WHERE quantity > 0 ORDER BY id LIMIT 1")[0][0]
+
+    async def search(client, query):
+        response = await client.get('/api/search', params={'q': query})
+        assert response.status == 200
+        return _ids(await response.json())
+
+    async def scenario():
+        async with app_client() as client:
+            # Обычный sqlite3 без функций приложения: триггеры FTS не должны падать
+            conn = sqlite3.connect(db_path)
+            conn.execute("UPDATE products SET name = 'Кроссовки Зефир' WHERE id = ?", (product_id,))
+            conn.commit()
+            conn.close()
+            await client.server.app[CHANGES_KEY].check()
+
+            for query in ('зефир', 'zefir', 'ЗЕФ', 'krossovki zefir'):
+                assert product_id in await search(client, query), query
+
+    asyncio.run(scenario())